@@ -0,0 +1,249 @@
+# ann_index.py
+"""
+Approximate nearest neighbours over the node2vec embeddings, so the
+recommendation pages can find structurally similar songs anywhere in the
+catalogue rather than only where the random walks reach.
+
+An inverted-file (IVF) index: spherical k-means splits the unit vectors into
+N_LISTS cells and each cell keeps the row numbers of its songs in the feature
+store, so the index holds no vectors of its own. A query scores the rows of
+the N_PROBE cells with the nearest centroids on the store's codes (int8, PQ,
+float16 or float32, see feature_store.py), the way the store scores any other
+candidates. Only the k-means sample and one block of rows at a time are
+decoded, while training and assigning cells. New rows are assigned to their
+nearest centroid and appended, so inserts need no retraining. The index is
+saved next to the feature store it was built from and rebuilt when that
+store's graph_version changes.
+
+    KG_FEATURES=snapshot/features python ann_index.py   # recall and latency against exact search
+"""
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from feature_store import FeatureStore, load_feature_store
+
+N_PROBE = 8
+KMEANS_ITERATIONS = 15
+TRAIN_SAMPLE = 100_000  # rows decoded for k-means
+ASSIGN_BLOCK = 8192  # rows decoded at a time to find their cells
+INDEX_FILE = "n2v.{encoding}.ivf.npz"
+
+
+def _unit(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _nearest(vectors, centroids, block=ASSIGN_BLOCK):
+    return np.concatenate([np.argmax(vectors[i:i + block] @ centroids.T, axis=1)
+                           for i in range(0, len(vectors), block)] or [np.empty(0, dtype=np.int64)])
+
+
+def _assign(vectors, rows, centroids, block=ASSIGN_BLOCK):
+    """Nearest centroid of each of `rows` of an encoded vector set, decoding a block at a time."""
+    return np.concatenate([np.argmax(_unit(vectors[rows[i:i + block]]) @ centroids.T, axis=1)
+                           for i in range(0, len(rows), block)] or [np.empty(0, dtype=np.int64)])
+
+
+def default_lists(n):
+    return max(1, int(round(np.sqrt(n))))
+
+
+class IVFIndex:
+    def __init__(self, centroids, vectors, graph_version=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        # The feature store's encoded n2v vectors (DenseVectors, Int8Vectors or PQVectors)
+        self.vectors = vectors
+        self.graph_version = graph_version
+        self.ids = np.empty(0, dtype=np.int64)
+        self.rows = np.empty(0, dtype=np.int64)
+        self.cells = np.empty(0, dtype=np.int64)
+        # Inserts wait here until the next search puts them in their cells
+        self._pending = []
+        self._offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+
+    @classmethod
+    def train(cls, vectors, rows, n_lists=None, iterations=KMEANS_ITERATIONS, seed=0, graph_version=None,
+              sample=TRAIN_SAMPLE):
+        """Spherical k-means centroids over (a sample of) `rows` of `vectors`; add the rows separately."""
+        rng = np.random.default_rng(seed)
+        rows = np.asarray(rows)
+        if len(rows) > sample:
+            rows = np.sort(rng.choice(rows, sample, replace=False))
+        data = _unit(vectors[rows])
+        n_lists = min(n_lists or default_lists(len(data)), len(data))
+        centroids = data[rng.choice(len(data), n_lists, replace=False)]
+        for _ in range(iterations):
+            cells = _nearest(data, centroids)
+            order = np.argsort(cells, kind="stable")
+            used, starts = np.unique(cells[order], return_index=True)
+            sums = np.add.reduceat(data[order], starts, axis=0)
+            # Cells left empty keep their centroid
+            centroids[used] = _unit(sums)
+        return cls(centroids, vectors, graph_version)
+
+    def __len__(self):
+        return len(self.ids) + sum(len(ids) for ids, _ in self._pending)
+
+    def add(self, ids, rows):
+        """Index these rows of the vector set, under these ids."""
+        self._pending.append((np.asarray(ids, dtype=np.int64), np.asarray(rows, dtype=np.int64)))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        ids = np.concatenate([self.ids] + [ids for ids, _ in self._pending])
+        rows = np.concatenate([self.rows] + [rows for _, rows in self._pending])
+        cells = np.concatenate([self.cells] + [_assign(self.vectors, r, self.centroids) for _, r in self._pending])
+        self._pending = []
+        order = np.argsort(cells, kind="stable")
+        self.ids, self.rows, self.cells = ids[order], rows[order], cells[order]
+        self._offsets = np.searchsorted(self.cells, np.arange(len(self.centroids) + 1))
+
+    def search(self, query, k=10, n_probe=N_PROBE):
+        """Ids and cosine scores of the (approximately) k nearest vectors, best first."""
+        self._flush()
+        query = _unit(query)[0]
+        n_probe = min(n_probe, len(self.centroids))
+        cells = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        members = np.concatenate([np.arange(self._offsets[c], self._offsets[c + 1]) for c in cells])
+        scores = np.asarray(self.vectors.dot(self.rows[members], query), dtype=np.float32)
+        k = min(k, len(members))
+        if not k:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.ids[members[top]], scores[top]
+
+    def nbytes(self):
+        self._flush()
+        return self.centroids.nbytes + self.ids.nbytes + self.rows.nbytes + self.cells.nbytes
+
+    def save(self, path):
+        """Write to a temporary file and rename it, so workers sharing the directory never read half a file."""
+        self._flush()
+        path = Path(path)
+        fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".npz", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, centroids=self.centroids, ids=self.ids, rows=self.rows, cells=self.cells,
+                         graph_version=np.array(self.graph_version or ""))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path, vectors):
+        """The index saved in `path`, over `vectors` (the same encoded set it was built on)."""
+        with np.load(path) as data:
+            index = cls(data["centroids"], vectors, str(data["graph_version"]) or None)
+            index.ids, index.rows, index.cells = data["ids"], data["rows"], data["cells"]
+        index._offsets = np.searchsorted(index.cells, np.arange(len(index.centroids) + 1))
+        return index
+
+
+def build_index(store, **kwargs):
+    """An index over every song of a FeatureStore with an n2v vector."""
+    rows = np.flatnonzero(store.has_n2v)
+    index = IVFIndex.train(store.n2v, rows, graph_version=store.graph_version, **kwargs)
+    index.add(store.node_ids[rows], rows)
+    return index
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def load_ann_index(conn):
+    """
+    The index for this connection's feature store: loaded from INDEX_FILE when
+    it matches the store's graph_version and n2v encoding, otherwise built
+    (and saved if the store has a directory). Reloaded when the store is.
+    """
+    store = load_feature_store(conn)
+    with _lock:
+        index = _indexes.get(id(conn))
+        if index is None or index.graph_version != store.graph_version:
+            path = store.path / INDEX_FILE.format(encoding=store.n2v_encoding) if store.path is not None else None
+            index = None
+            if path is not None and path.exists():
+                try:
+                    index = IVFIndex.load(path, store.n2v)
+                except (OSError, KeyError, ValueError):
+                    # Unreadable, or saved by an older version that kept the vectors
+                    index = None
+                if index is not None and index.graph_version != store.graph_version:
+                    index = None
+            if index is None:
+                index = build_index(store)
+                if path is not None:
+                    try:
+                        index.save(path)
+                    except OSError:
+                        pass
+            _indexes[id(conn)] = index
+        return _indexes[id(conn)]
+
+
+def similar_songs(conn, node_id, k=10, n_probe=N_PROBE):
+    """Node ids and cosines of the k songs nearest to this one in n2v space, itself excluded."""
+    store = load_feature_store(conn)
+    row = store.rows([node_id])[0]
+    if row < 0 or not store.has_n2v[row]:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    ids, scores = load_ann_index(conn).search(store.n2v[row], k + 1, n_probe)
+    keep = ids != node_id
+    return ids[keep][:k], scores[keep][:k]
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def benchmark(store, queries=500, k=10, probes=(1, 2, 4, 8, 16, 32), held_out=0.1, seed=0):
+    """
+    Recall@k and latency against exact search on the same codes, with a share
+    of the songs inserted after training.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.flatnonzero(store.has_n2v)
+    ids = store.node_ids[rows]
+    late = rng.random(len(rows)) < held_out
+
+    start = time.perf_counter()
+    index = IVFIndex.train(store.n2v, rows[~late])
+    index.add(ids[~late], rows[~late])
+    index._flush()
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    index.add(ids[late], rows[late])
+    index._flush()
+    inserted = time.perf_counter() - start
+    print(f"{len(rows):,} {store.n2v_encoding} vectors, {len(index.centroids)} lists: trained on "
+          f"{(~late).sum():,} in {built:.2f}s, inserted {late.sum():,} in {inserted * 1e3:.1f}ms; "
+          f"index {index.nbytes() / 2**20:.2f} MiB (float32 copies would be "
+          f"{len(rows) * index.centroids.shape[1] * 4 / 2**20:.2f} MiB)")
+
+    sample = rng.choice(len(rows), size=min(queries, len(rows)), replace=False)
+    queries = [_unit(store.n2v[rows[i]])[0] for i in sample]
+    start = time.perf_counter()
+    exact = [store.n2v.dot(rows, q) for q in queries]
+    kth = [-np.partition(-scores, k - 1)[k - 1] for scores in exact]
+    exact_ms = (time.perf_counter() - start) / len(sample) * 1e3
+    print(f"exact search: {exact_ms:.3f}ms per query")
+    for n_probe in probes:
+        start = time.perf_counter()
+        found = [index.search(q, k, n_probe)[0] for q in queries]
+        latency = (time.perf_counter() - start) / len(sample) * 1e3
+        # Many songs share a vector, so a result counts if it is as close as the exact k-th
+        recall = np.mean([np.sum(e[np.searchsorted(ids, f)] >= t - 1e-6) / k for e, f, t in zip(exact, found, kth)])
+        print(f"n_probe={n_probe:<3} recall@{k}={recall:.3f}  {latency:.3f}ms per query")
+
+
+if __name__ == "__main__":
+    benchmark(FeatureStore.from_directory(os.environ.get("KG_FEATURES", "features")))
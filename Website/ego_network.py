@@ -0,0 +1,73 @@
+# ego_network.py
+"""
+The "Sampling Network" around a song, grown one hop at a time.
+
+Each level is a single query over the new frontier only, so a network of
+depth d costs d queries and work proportional to what it returns, and moving
+the slider from d to d + 1 just expands the last frontier. Hubs are kept in
+check with a cap on the songs in the network and on the relationships read
+per song; when one is hit, the network is marked as truncated.
+"""
+from collections import Counter
+
+import queries
+
+MAX_NODES = 500
+MAX_EDGES_PER_NODE = 100
+
+
+class EgoNetwork:
+    def __init__(self, conn, title, artist_filters=None, max_nodes=MAX_NODES,
+                 max_edges_per_node=MAX_EDGES_PER_NODE):
+        self.conn = conn
+        self.max_nodes = max_nodes
+        self.max_edges_per_node = max_edges_per_node
+        # id -> {"title", "artists", "depth"}
+        self.nodes = {}
+        self.edges = set()
+        self.truncated = False
+        self.depth = 0
+        roots = conn.query(queries.EGO_ROOTS, {"title": title, "artist_filters": artist_filters})
+        for rec in roots:
+            self.nodes[rec["id"]] = {"title": rec["title"], "artists": rec["artists"], "depth": 0}
+        self.frontier = list(self.nodes)
+
+    @property
+    def roots(self):
+        return [nid for nid, node in self.nodes.items() if node["depth"] == 0]
+
+    def expand_to(self, depth):
+        """Grow the network until it reaches `depth` hops (or runs out of songs)."""
+        while self.depth < depth and self.frontier:
+            self._expand()
+
+    def _expand(self):
+        level = self.depth + 1
+        records = self.conn.query(queries.EGO_EXPAND, {"frontier": self.frontier,
+                                                       "per_node": self.max_edges_per_node})
+        frontier = []
+        for rec in records:
+            if rec["id"] not in self.nodes:
+                if len(self.nodes) >= self.max_nodes:
+                    self.truncated = True
+                    continue
+                self.nodes[rec["id"]] = {"title": rec["title"], "artists": rec["artists"], "depth": level}
+                frontier.append(rec["id"])
+            self.edges.add((rec["src_id"], rec["tgt_id"]))
+        read = Counter(rec["from_id"] for rec in records)
+        if any(n >= self.max_edges_per_node for n in read.values()):
+            self.truncated = True
+        self.frontier = frontier
+        self.depth = level
+
+    def view(self, depth):
+        """
+        Songs within `depth` hops and the relationships on paths of at most
+        `depth` hops, i.e. those whose nearer end is at most depth - 1 away.
+        """
+        self.expand_to(depth)
+        nodes = {nid: node for nid, node in self.nodes.items() if node["depth"] <= depth}
+        edges = [(src, tgt) for src, tgt in self.edges
+                 if src in nodes and tgt in nodes
+                 and min(nodes[src]["depth"], nodes[tgt]["depth"]) <= depth - 1]
+        return nodes, edges
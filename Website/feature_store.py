@@ -0,0 +1,241 @@
+# feature_store.py
+"""
+Song vectors for recommendation scoring, as row-aligned matrices.
+
+n2v and audio vectors are stored L2-normalised, so a cosine is a dot
+product: scoring candidates is a gather of their rows and one matrix-vector
+product with the stem's row, instead of reading every candidate's vectors
+through Cypher on each rerun.
+
+The matrices are written by knowledge-graph/neo4j/feature_export.py (and into
+every snapshot by snapshot_export.py) and memory-mapped from KG_FEATURES,
+the snapshot's features/ directory or Website/features. Without an export,
+the store is built once per process from SONG_FEATURES. Every call re-reads
+the export's manifest and reloads the store when its graph_version changed;
+the export swaps the whole directory in, so a loaded store keeps reading the
+files it mapped.
+
+n2v is read in the encoding named by KG_N2V_ENCODING (float32, float16, int8
+or pq, see knowledge-graph/neo4j/quantisation.py) and scored on the codes
+without decoding the catalogue. int8, the default, is a quarter of the size
+of float32 and moves cosines by under 0.001 on average.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+import queries
+
+FEATURES_ENV = "KG_FEATURES"
+FEATURES_DIR = Path(__file__).resolve().parent / "features"
+N2V_ENCODING_ENV = "KG_N2V_ENCODING"
+N2V_ENCODING = os.environ.get(N2V_ENCODING_ENV, "int8")
+
+
+def _unit_rows(vectors, dimension):
+    """List of vectors (or None) -> unit-length float32 rows, and which rows are real."""
+    matrix = np.zeros((len(vectors), dimension), dtype=np.float32)
+    for i, v in enumerate(vectors):
+        if v is not None and len(v) == dimension:
+            matrix[i] = v
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    present = norms[:, 0] > 0
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0), present
+
+
+class DenseVectors:
+    """float32 or float16 rows. Indexing returns float32 vectors, as for the other encodings."""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __getitem__(self, rows):
+        return np.asarray(self.matrix[rows], dtype=np.float32)
+
+    def dot(self, rows, query):
+        return self[rows] @ query
+
+
+class Int8Vectors:
+    """v ≈ codes · scale, one scale per row."""
+
+    def __init__(self, codes, scales):
+        self.codes, self.scales = codes, scales
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        return self.codes[rows].astype(np.float32) * np.asarray(self.scales[rows])[..., None]
+
+    def dot(self, rows, query):
+        return (self.codes[rows].astype(np.float32) @ query) * self.scales[rows]
+
+
+class PQVectors:
+    """Product-quantised rows: one codebook entry per subspace."""
+
+    def __init__(self, codes, codebooks):
+        self.codes, self.codebooks = codes, codebooks
+        self._subspaces = np.arange(len(codebooks))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        codes = self.codes[rows]
+        return self.codebooks[self._subspaces, codes].reshape(*codes.shape[:-1], -1)
+
+    def dot(self, rows, query):
+        table = np.einsum("mkd,md->mk", self.codebooks, np.asarray(query).reshape(len(self.codebooks), -1))
+        return table[self._subspaces, self.codes[rows]].sum(axis=-1)
+
+
+class FeatureStore:
+    def __init__(self, node_ids, n2v, has_n2v, audio, has_audio, audio_mean=None, audio_std=None,
+                 graph_version=None, path=None, n2v_encoding="float32"):
+        # Ascending, so a node id's row is a binary search away
+        self.node_ids = node_ids
+        self.n2v, self.has_n2v = n2v, has_n2v
+        self.audio, self.has_audio = audio, has_audio
+        self.audio_mean, self.audio_std = audio_mean, audio_std
+        self.graph_version = graph_version
+        # Directory it was loaded from, None when built from SONG_FEATURES
+        self.path = path
+        self.n2v_encoding = n2v_encoding
+
+    @classmethod
+    def from_directory(cls, path, n2v_encoding=N2V_ENCODING):
+        return read_export(path, lambda path: cls._from_directory(path, n2v_encoding))
+
+    @classmethod
+    def _from_directory(cls, path, n2v_encoding):
+        with open(path / "manifest.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        def load(name):
+            return np.load(path / f"{name}.npy", mmap_mode="r")
+
+        # Exports older than the quantised encodings only have float32
+        encoding = n2v_encoding if n2v_encoding in manifest.get("n2v_encodings", {}) else "float32"
+        if encoding == "int8":
+            n2v = Int8Vectors(load("n2v_i8"), load("n2v_scale"))
+        elif encoding == "pq":
+            n2v = PQVectors(load("n2v_pq"), np.load(path / "n2v_pq_codebooks.npy"))
+        else:
+            n2v = DenseVectors(load("n2v_f16" if encoding == "float16" else "n2v"))
+        return cls(load("node_ids"), n2v, load("has_n2v"), DenseVectors(load("audio")), load("has_audio"),
+                   load("audio_mean"), load("audio_std"), manifest["graph_version"], path, encoding)
+
+    @classmethod
+    def from_records(cls, records, n2v_dimension=128, audio_dimension=53):
+        """
+        From SONG_FEATURES rows (ordered by id). n2v comes as int8 codes where the
+        graph has them; audio_vec is already standardised and unit-length.
+        """
+        if all(r["n2v_i8"] is not None or r["n2v"] is None for r in records):
+            codes = np.zeros((len(records), n2v_dimension), dtype=np.int8)
+            scales = np.zeros(len(records), dtype=np.float32)
+            for i, r in enumerate(records):
+                if r["n2v_i8"] is not None:
+                    codes[i], scales[i] = np.frombuffer(r["n2v_i8"], dtype=np.int8), r["n2v_scale"]
+            n2v, has_n2v, encoding = Int8Vectors(codes, scales), scales > 0, "int8"
+        else:
+            matrix, has_n2v = _unit_rows([r["n2v"] for r in records], n2v_dimension)
+            n2v, encoding = DenseVectors(matrix), "float32"
+        audio, has_audio = _unit_rows([r["audio_vec"] for r in records], audio_dimension)
+        return cls(np.array([r["id"] for r in records], dtype=np.int64), n2v, has_n2v,
+                   DenseVectors(audio), has_audio, n2v_encoding=encoding)
+
+    def rows(self, node_ids):
+        """Row of each node id, -1 for songs not in the store."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        rows = np.searchsorted(self.node_ids, node_ids)
+        rows[rows == len(self.node_ids)] = 0
+        found = len(self.node_ids) > 0 and self.node_ids[rows] == node_ids
+        return np.where(found, rows, -1)
+
+    def _cosine(self, vectors, present, stem, rows):
+        scores = np.full(len(rows), np.nan, dtype=np.float32)
+        if stem < 0 or not present[stem]:
+            return scores
+        known = rows >= 0
+        known[known] = present[rows[known]]
+        scores[known] = vectors.dot(rows[known], vectors[stem])
+        return scores
+
+    def similarity(self, stem_id, candidate_ids):
+        """Cosine of each candidate to the stem on n2v and on audio; NaN where a vector is missing."""
+        stem = self.rows([stem_id])[0]
+        rows = self.rows(candidate_ids)
+        return (self._cosine(self.n2v, self.has_n2v, stem, rows),
+                self._cosine(self.audio, self.has_audio, stem, rows))
+
+    def audio_vector(self, features):
+        """Raw audio features (in the manifest's order) -> a vector comparable with the stored ones."""
+        z = (np.asarray(features, dtype=np.float64) - self.audio_mean) / self.audio_std
+        return (z / np.linalg.norm(z)).astype(np.float32)
+
+
+_stores = {}
+_lock = threading.Lock()
+
+
+def features_directory(conn):
+    """Where the feature export for this connection lives (it may not exist)."""
+    if os.environ.get(FEATURES_ENV):
+        return Path(os.environ[FEATURES_ENV])
+    snapshot = getattr(conn, "snapshot", None)
+    return snapshot.path / "features" if snapshot is not None else FEATURES_DIR
+
+
+def exported_version(path):
+    """graph_version of the export in `path`; None without one (or for the instant it is being swapped)."""
+    try:
+        with open(Path(path) / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f)["graph_version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def read_export(path, load, attempts=3):
+    """
+    load(path) for an export directory (anything with a graph_version), loaded
+    again if the export was swapped while its files were being opened.
+    """
+    path = Path(path)
+    for attempt in range(attempts):
+        try:
+            loaded = load(path)
+        except FileNotFoundError:
+            # Between the two renames of an export swap
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.1)
+            continue
+        if exported_version(path) == loaded.graph_version:
+            break
+    return loaded
+
+
+def load_feature_store(conn):
+    """
+    The store for this connection (connect() returns one per process), loaded
+    on first use and again whenever the export's graph_version changes.
+    """
+    with _lock:
+        path = features_directory(conn)
+        version = exported_version(path)
+        store = _stores.get(id(conn))
+        if version is not None and (store is None or store.graph_version != version):
+            store = _stores[id(conn)] = FeatureStore.from_directory(path)
+        elif store is None:
+            store = _stores[id(conn)] = FeatureStore.from_records(conn.query(queries.SONG_FEATURES))
+        return store
@@ -1,14 +1,80 @@
 # neo4j_utils.py
+import atexit
+import os
+import threading
+
+import pyarrow as pa
 from neo4j import GraphDatabase
 
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_USER = "neo4j"
+NEO4J_PASSWORD = "testpassword"
+
+# Connections kept open by the shared driver, and records pulled per round trip
+POOL_SIZE = int(os.environ.get("NEO4J_POOL_SIZE", 50))
+FETCH_SIZE = int(os.environ.get("NEO4J_FETCH_SIZE", 1000))
+
+# Directory written by knowledge-graph/neo4j/snapshot_export.py; when set, no database is used
+SNAPSHOT_ENV = "KG_SNAPSHOT"
+
+
 class Neo4jConnection:
-    def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    """
+    Runs every query as a managed read transaction (retried on transient
+    errors) on a pooled driver. Use connect() rather than building one per
+    page: the driver is shared by all pages and sessions of the app.
+    """
+
+    def __init__(self, uri, user, password, pool_size=POOL_SIZE, fetch_size=FETCH_SIZE):
+        self.driver = GraphDatabase.driver(uri, auth=(user, password), max_connection_pool_size=pool_size)
+        self.fetch_size = fetch_size
 
     def close(self):
         self.driver.close()
 
+    def read(self, work):
+        """Run `work(tx)` in a read transaction; return consumed results, not the Result itself."""
+        with self.driver.session(fetch_size=self.fetch_size) as session:
+            return session.execute_read(work)
+
     def query(self, query, parameters=None):
-        with self.driver.session() as session:
-            result = session.run(query, parameters)
-            return [record.data() for record in result]
+        return self.read(lambda tx: tx.run(query, parameters).data())
+
+    def to_df(self, query, parameters=None):
+        return self.read(lambda tx: tx.run(query, parameters).to_df())
+
+    def to_arrow(self, query, parameters=None):
+        """Result as an Arrow table, filled column by column as the records stream in."""
+        def work(tx):
+            result = tx.run(query, parameters)
+            keys = result.keys()
+            columns = [[] for _ in keys]
+            for record in result:
+                for column, value in zip(columns, record.values()):
+                    # neo4j.time values -> datetime / date, which Arrow understands
+                    column.append(value.to_native() if hasattr(value, "to_native") else value)
+            return pa.table(dict(zip(keys, columns)))
+        return self.read(work)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def connect():
+    """
+    The process-wide connection: the snapshot backend if $KG_SNAPSHOT points
+    at an export, otherwise Neo4j. It is closed when the process exits, so
+    pages must not close it.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            snapshot_dir = os.environ.get(SNAPSHOT_ENV)
+            if snapshot_dir:
+                from snapshot_backend import SnapshotConnection
+                _shared = SnapshotConnection(snapshot_dir)
+            else:
+                _shared = Neo4jConnection(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+                atexit.register(_shared.close)
+        return _shared
@@ -1,20 +1,27 @@
 import streamlit as st
-import pandas as pd
 import altair as alt
 from pyvis.network import Network
 import networkx as nx
 import streamlit.components.v1 as components
-from neo4j_utils import Neo4jConnection
+import queries
+from neo4j_utils import connect
+from search_index import load_search_index
+from ego_network import EgoNetwork
+from song_profile import fetch_song_profile
 import math
+import urllib.parse
 
 
 # Neo4j connection
-@st.cache_resource
-def get_conn():
-    return Neo4jConnection("bolt://localhost:7687", "neo4j", "testpassword")
+conn = connect()
 
 
-conn = get_conn()
+def search_link(label, search_type, query, artist_filter=None):
+    query_params = {"search_type": search_type, "query": query}
+    if artist_filter:
+        query_params["artist_filter"] = artist_filter
+    return f"[{label}](/Search_and_Explore/?{urllib.parse.urlencode(query_params)})"
+
 
 st.set_page_config(page_title="Search & Explore", page_icon="🔍", layout="wide")
 st.sidebar.header("Search Mode")
@@ -47,7 +54,6 @@ with st.form("search_form"):
 if st.session_state.submitted:
     if not query:
         st.error("Please enter a search query.")
-        conn.close()
         st.stop()
 
     # --- Artist Search -------------------------------------------------------
@@ -55,15 +61,14 @@ if st.session_state.submitted:
         artist = query
         try:
             artist_info = conn.query(
-                """
-                MATCH (a:Artist {name:$artist})
-                RETURN a.wikipedia_summary AS summary
-                """,
+                queries.ARTIST_SUMMARY,
                 {"artist": artist}
             )[0]
         except (IndexError, KeyError):
             st.error(f"Artist '{artist}' not found.")
-            conn.close()
+            suggestions = load_search_index(conn).artists_matching(artist, k=5)
+            if suggestions:
+                st.markdown("Did you mean: " + ", ".join(search_link(name, "Artist", name) for name in suggestions))
             st.stop()
 
         # Header
@@ -75,11 +80,7 @@ if st.session_state.submitted:
 
             # Fetch top 3 genres based on artist's songs
             top_genres = conn.query(
-                """
-                MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[:BELONGS_TO_GENRE]->(g:Genre)
-                RETURN g.name AS genre, count(*) AS cnt
-                ORDER BY cnt DESC LIMIT 3
-                """,
+                queries.ARTIST_TOP_GENRES,
                 {"artist": artist}
             )
 
@@ -98,10 +99,7 @@ if st.session_state.submitted:
 
             # Song List
             sl = conn.query(
-                """
-                MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[:RELEASED_IN]->(y:Year)
-                RETURN s.title AS name, id(s) AS id, y.value AS year
-                """,
+                queries.ARTIST_SONGS,
                 {"artist": artist}
             )
             st.markdown("**Song List:**")
@@ -112,17 +110,11 @@ if st.session_state.submitted:
         with col2:
             # Sampling Stats
             sampled_by = conn.query(
-                """
-                MATCH (other:Song)-[:SAMPLES]->(:Song)-[:HAS_ARTIST]->(a:Artist {name:$artist})
-                RETURN count(DISTINCT other) AS cnt
-                """,
+                queries.ARTIST_SAMPLED_BY,
                 {"artist": artist}
             )[0]["cnt"]
             sampled = conn.query(
-                """
-                MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(:Song)-[r:SAMPLES]->()
-                RETURN count(r) AS cnt
-                """,
+                queries.ARTIST_SAMPLES,
                 {"artist": artist}
             )[0]["cnt"]
 
@@ -134,11 +126,7 @@ if st.session_state.submitted:
 
             # Most Sampled Songs
             ms = conn.query(
-                """
-                MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[r:SAMPLES]->()
-                RETURN s.title AS song, count(r) AS cnt
-                ORDER BY cnt DESC LIMIT 3
-                """,
+                queries.ARTIST_TOP_SAMPLING_SONGS,
                 {"artist": artist}
             )
             st.markdown("**Top Sampling Songs:**")
@@ -146,14 +134,10 @@ if st.session_state.submitted:
                 st.write(f"- “{rec['song']}” ({rec['cnt']} samples)")
 
             # Genres Sampled
-            gs = pd.DataFrame(conn.query(
-                """
-                MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[:SAMPLES]->(t:Song)-[:BELONGS_TO_GENRE]->(g:Genre)
-                RETURN g.name AS genre, count(*) AS cnt
-                ORDER BY cnt DESC LIMIT 3
-                """,
+            gs = conn.to_df(
+                queries.ARTIST_GENRES_SAMPLED,
                 {"artist": artist}
-            ))
+            )
             st.markdown("**Genres Sampled:**")
             if not gs.empty:
                 total = gs["cnt"].sum()
@@ -164,15 +148,10 @@ if st.session_state.submitted:
                 st.write("- N/A")
 
             # Genres That Sample
-            gts = pd.DataFrame(conn.query(
-                """
-                MATCH (t:Song)-[:BELONGS_TO_GENRE]->(g:Genre),
-                      (t)-[:SAMPLES]->(:Song)-[:HAS_ARTIST]->(a:Artist {name:$artist})
-                RETURN g.name AS genre, count(*) AS cnt
-                ORDER BY cnt DESC LIMIT 3
-                """,
+            gts = conn.to_df(
+                queries.ARTIST_SAMPLED_BY_GENRES,
                 {"artist": artist}
-            ))
+            )
             st.markdown(f"**Genres That Sample {artist}:**")
             if not gts.empty:
                 total2 = gts["cnt"].sum()
@@ -186,35 +165,7 @@ if st.session_state.submitted:
         st.markdown("### Artist-Song Sampling Network")
 
         records = conn.query(
-            """
-            MATCH (a:Artist {name:$artist})
-            OPTIONAL MATCH (a)<-[:HAS_ARTIST]-(s:Song)
-            WHERE s IS NOT NULL
-            OPTIONAL MATCH (s)-[r:SAMPLES]->(t:Song)
-
-            OPTIONAL MATCH (s)-[:HAS_ARTIST]->(sa:Artist)
-            OPTIONAL MATCH (s)-[:BELONGS_TO_GENRE]->(sg:Genre)
-            OPTIONAL MATCH (s)-[:RELEASED_IN]->(sy:Year)
-
-            OPTIONAL MATCH (t)-[:HAS_ARTIST]->(ta:Artist)
-            OPTIONAL MATCH (t)-[:BELONGS_TO_GENRE]->(tg:Genre)
-            OPTIONAL MATCH (t)-[:RELEASED_IN]->(ty:Year)
-
-            RETURN 
-                id(a) AS a_id, a.name AS a_name,
-                id(s) AS s_id, s.title AS s_name,
-                id(t) AS t_id, t.title AS t_name,
-                type(r) AS rel_type,
-                collect(DISTINCT sa.name) AS song_artists,
-                s.release_date AS s_release_date,
-                sy.value AS s_year,
-                collect(DISTINCT sg.name) AS s_genres,
-                collect(DISTINCT ta.name) AS t_artists,
-                t.release_date AS t_release_date,
-                ty.value AS t_year,
-                collect(DISTINCT tg.name) AS t_genres
-            LIMIT 200
-            """,
+            queries.ARTIST_NETWORK,
             {"artist": artist}
         )
 
@@ -287,30 +238,21 @@ if st.session_state.submitted:
     else:
         # --- Song Search -------------------------------------------------------
         title = query
-        # Basic song info
-        try:
-            if artist_filter in ("None", ""):
-                artist_filter = None
-            
-            artist_filters = [artist.strip() for artist in artist_filter.split(",")] if artist_filter else None
-
-            info = conn.query(
-                """
-                MATCH (s:Song {title:$title})
-                OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
-                OPTIONAL MATCH (s)-[:BELONGS_TO_GENRE]->(g:Genre)
-                OPTIONAL MATCH (s)-[:PART_OF_ALBUM]->(al:Album)
-                OPTIONAL MATCH (s)-[:RELEASED_IN]->(y:Year)
-                WITH s, al, collect(DISTINCT a.name) AS artists, collect(DISTINCT g.name) AS genres,
-                    s.record_label AS label, s.release_date AS rd, y.value AS year
-                WHERE $artist_filters IS NULL OR ANY(artist IN $artist_filters WHERE artist IN artists)
-                RETURN rd, year, al.title AS album, label, artists, genres, s.id AS song_id
-                """,
-                {"title": title, "artist_filters": artist_filters}
-            )[0]
-        except (IndexError, KeyError):
+        # Everything shown below comes from one query
+        if artist_filter in ("None", ""):
+            artist_filter = None
+
+        artist_filters = [artist.strip() for artist in artist_filter.split(",")] if artist_filter else None
+
+        profile = fetch_song_profile(conn, title, artist_filters)
+        if profile is None:
             st.error(f"Song '{title}' not found.")
-            conn.close()
+            suggestions = load_search_index(conn).songs(f"{title} {artist_filter or ''}", k=5)
+            if suggestions:
+                st.markdown("Did you mean: " + ", ".join(
+                    search_link(f"{r['title']} – {', '.join(r['artist'])}", "Song", r["title"], ", ".join(r["artist"]))
+                    for r in suggestions
+                ))
             st.stop()
 
         def format_release(date_val, year_val):
@@ -318,12 +260,11 @@ if st.session_state.submitted:
                 return str(year_val) if year_val else "N/A"
             return str(date_val)
 
-        rd = format_release(info.get("rd"), info.get("year"))
-        album = info.get('album', 'N/A')
-        label = info.get('label', 'N/A')
-        artists = info.get('artists', [])
-        genres = info.get('genres', [])
-        song_id = info.get('song_id', None)
+        rd = format_release(profile.release_date, profile.year)
+        album = profile.album
+        label = profile.label
+        artists = profile.artists
+        genres = profile.genres
 
         st.subheader("Song Details")
         st.markdown(f"**Song:** {title}")
@@ -334,93 +275,28 @@ if st.session_state.submitted:
         st.markdown(f"**Record Label:** {label}")
 
         # Sampling stats
-        outgoing = conn.query(
-            """
-            MATCH (s:Song {id:$song_id})-[r:SAMPLES]->()
-            RETURN count(r) AS cnt
-            """,
-            {"song_id": song_id}
-        )[0]['cnt']
-        incoming = conn.query(
-            """
-            MATCH ()-[r:SAMPLES]->(s:Song {id:$song_id})
-            RETURN count(r) AS cnt
-            """,
-            {"song_id": song_id}
-        )[0]['cnt']
-        chains = conn.query(
-            """
-            MATCH path=(o:Song)-[:SAMPLES*2]-(s:Song {id:$song_id})
-            RETURN count(DISTINCT o) AS cnt
-            """,
-            {"song_id": song_id}
-        )[0]['cnt']
-        pagerank_score = conn.query(
-            """
-            MATCH (s:Song {id:$song_id})
-            RETURN s.pagerank AS pr
-            """,
-            {"song_id": song_id}
-        )[0]["pr"]
-        pagerank_score = round(pagerank_score, 2) if pagerank_score is not None else "N/A"
+        pagerank_score = round(profile.pagerank, 2) if profile.pagerank is not None else "N/A"
 
         st.markdown("**🧬 Sampling Stats:**")
-        st.write(f"- Sampled {outgoing} other songs")
-        st.write(f"- Sampled by {incoming} songs")
-        st.write(f"- Appears in {chains} sample chains")
+        st.write(f"- Sampled {profile.outgoing} other songs")
+        st.write(f"- Sampled by {profile.incoming} songs")
+        st.write(f"- Appears in {profile.chains} sample chains")
         st.write(f"- PageRank Score: {pagerank_score}")
 
         # Songs This Track Sampled
-        sampled = conn.query(
-            """
-            MATCH (s:Song {id:$song_id})-[:SAMPLES]->(t:Song)
-            OPTIONAL MATCH (t)-[:HAS_ARTIST]->(a:Artist)
-            WITH t, collect(DISTINCT a.name) AS artist_list
-            RETURN
-                t.title AS name,
-                apoc.text.join(artist_list, ', ') AS artists,
-                t.release_date AS rd
-            ORDER BY rd DESC
-            """,
-            {"song_id": song_id}
-        )
         st.markdown("**🎧 Songs This Track Sampled:**")
         with st.expander("See Songs Sampled by This Track"):
-            for rec in sampled:
+            for rec in profile.sampled:
                 st.write(f"- “{rec['name']}” by {rec['artists']} ({rec['rd']})")
 
         # Songs That Sampled This Track
-        samp_by = conn.query(
-            """
-            MATCH (o:Song)-[r:SAMPLES]->(s:Song {id:$song_id})
-            OPTIONAL MATCH (o)-[:HAS_ARTIST]->(a:Artist)
-            WITH o, collect(DISTINCT a.name) AS artist_list
-            RETURN
-                o.title AS name,
-                apoc.text.join(artist_list, ', ') AS artists,
-                o.release_date AS rd
-            ORDER BY rd DESC
-            """,
-            {"song_id": song_id}
-        )
         st.markdown("**🔁 Songs That Sampled This Track:**")
         with st.expander("See Songs That Sampled This Track"):
-            for rec in samp_by:
+            for rec in profile.sampled_by:
                 st.write(f"- “{rec['name']}” by {rec['artists']} ({rec['rd']})")
 
         # Sample Usage Over Time
-        df_time = pd.DataFrame(conn.query(
-            """
-            MATCH (o:Song)-[:SAMPLES]->(s:Song {id:$song_id})
-            MATCH (o)-[:RELEASED_IN]->(y:Year)
-            WITH y.value            AS year,
-                 collect(o.title)   AS songs,          // list for the tooltip
-                 count(*)           AS n               // total samples that year
-            RETURN year, n, songs
-            ORDER BY year
-            """,
-            {"song_id": song_id}
-        ))
+        df_time = profile.usage_df()
         st.markdown("**📈 Sample Usage Over Time:**")
         if df_time.empty:
             st.info("No sampling events.")
@@ -458,68 +334,17 @@ if st.session_state.submitted:
             key="depth_slider"
         )
 
-        # Query recursive sample relationships up to selected depth
-
+        # Grown one hop at a time and kept for this song, so moving the slider only expands the last level
         artist_filters = artists if artists else None
-
-        results = conn.query(
-            f"""
-            MATCH (s:Song {{title:$title}})
-            OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
-            WITH s, collect(DISTINCT a.name) AS matched_artists
-            WHERE $artist_filters IS NULL OR ALL(artist IN $artist_filters WHERE artist IN matched_artists)
-
-            CALL {{
-                WITH s
-                MATCH path = (s)-[:SAMPLES*1..{depth}]-(n)
-                RETURN DISTINCT relationships(path) AS rels
-            }}
-            UNWIND rels AS r
-            WITH DISTINCT r,
-                startNode(r) AS src,
-                endNode(r) AS tgt
-            OPTIONAL MATCH (src)-[:HAS_ARTIST]->(a1:Artist)
-            OPTIONAL MATCH (tgt)-[:HAS_ARTIST]->(a2:Artist)
-            RETURN 
-                id(src) AS src_id,
-                src.title AS src_title,
-                collect(DISTINCT a1.name) AS src_artists,
-                id(tgt) AS tgt_id,
-                tgt.title AS tgt_title,
-                collect(DISTINCT a2.name) AS tgt_artists,
-                type(r) AS rel_type
-            """,
-            {"title": title, "artist_filters": artist_filters}
-        )
-
-
-        # Build the graph
-        G = nx.DiGraph()
-        for rec in results:
-            G.add_edge(rec["src_id"], rec["tgt_id"])
-
-        title_clean = title.strip().lower()
-        root_id = None
-
-        for rec in results:
-            if rec["src_title"] and rec["src_title"].strip().lower() == title_clean:
-                root_id = rec["src_id"]
-                break
-            elif rec["tgt_title"] and rec["tgt_title"].strip().lower() == title_clean:
-                root_id = rec["tgt_id"]
-                break
-
-        # Calculate depths
-        depths = {node: float("inf") for node in G.nodes}
-        if root_id is not None:
-            depths[root_id] = 0
-            queue = [root_id]
-            while queue:
-                current = queue.pop(0)
-                for neighbor in list(G.successors(current)) + list(G.predecessors(current)):
-                    if depths[neighbor] > depths[current] + 1:
-                        depths[neighbor] = depths[current] + 1
-                        queue.append(neighbor)
+        network_key = (title, tuple(artist_filters or ()))
+        if st.session_state.get("ego_network_key") != network_key:
+            st.session_state.ego_network_key = network_key
+            st.session_state.ego_network = EgoNetwork(conn, title, artist_filters)
+        network = st.session_state.ego_network
+        nodes, edges = network.view(depth)
+        if network.truncated:
+            st.caption(f"Showing at most {network.max_nodes} songs and {network.max_edges_per_node} "
+                       "samples per song.")
 
 
         def get_color_by_depth(depth):
@@ -530,44 +355,24 @@ if st.session_state.submitted:
 
 
         net = Network(height="590px", width="100%", notebook=False, directed=True)
-        added_nodes = set()
-        added_edges = set()
-
-        for rec in results:
-            src_id = rec["src_id"]
-            tgt_id = rec["tgt_id"]
-            src_title = rec["src_title"]
-            tgt_title = rec["tgt_title"]
-            src_artists = ", ".join(rec["src_artists"]) if rec["src_artists"] else "Unknown"
-            tgt_artists = ", ".join(rec["tgt_artists"]) if rec["tgt_artists"] else "Unknown"
-            rel_type = rec["rel_type"]
-
-            for nid, title_val, artist_str in [
-                (src_id, src_title, src_artists),
-                (tgt_id, tgt_title, tgt_artists)
-            ]:
-                if nid not in added_nodes:
-                    depth = depths.get(nid, 0)
-                    color = "blue" if title_val == title else get_color_by_depth(depth)
-                    tooltip = f"Song: {title_val}\nArtist(s): {artist_str}\nDepth: {depth}"
-                    net.add_node(nid, label=title_val, color=color, title=tooltip)
-                    added_nodes.add(nid)
-
-            edge_key = (src_id, tgt_id)
-            if rel_type == "SAMPLES" and edge_key not in added_edges:
-                net.add_edge(
-                    src_id,
-                    tgt_id,
-                    arrows="to",
-                    color="black",
-                    width=2,
-                    smooth=True
-                )
-                added_edges.add(edge_key)
+
+        for nid, node in nodes.items():
+            artist_str = ", ".join(node["artists"]) if node["artists"] else "Unknown"
+            color = "blue" if node["depth"] == 0 else get_color_by_depth(node["depth"])
+            tooltip = f"Song: {node['title']}\nArtist(s): {artist_str}\nDepth: {node['depth']}"
+            net.add_node(nid, label=node["title"], color=color, title=tooltip)
+
+        for src_id, tgt_id in edges:
+            net.add_edge(
+                src_id,
+                tgt_id,
+                arrows="to",
+                color="black",
+                width=2,
+                smooth=True
+            )
 
         # Display
         net.save_graph("song_graph.html")
         with open("song_graph.html", "r") as f:
             components.html(f.read(), height=600)
-
-conn.close()
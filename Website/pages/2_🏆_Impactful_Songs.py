@@ -1,35 +1,16 @@
 import streamlit as st
 import pandas as pd
-from neo4j_utils import Neo4jConnection
+import queries
+from neo4j_utils import connect
 import urllib.parse
 
 st.set_page_config(page_title="PageRank Leaderboard", page_icon="🏆", layout="wide")
 st.title("🏆 Top 50 Most Influential Songs in This Network")
 
 
-@st.cache_resource
-def get_conn():
-    return Neo4jConnection("bolt://localhost:7687", "neo4j", "testpassword")
+conn = connect()
 
-
-conn = get_conn()
-
-query = """
-MATCH (s:Song)
-WHERE s.pagerank IS NOT NULL
-OPTIONAL MATCH (s)<-[:SAMPLES]-(:Song)
-WITH s, count(*) AS sampled_by
-ORDER BY s.pagerank DESC
-LIMIT 50
-OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
-RETURN s.title AS title,
-       collect(DISTINCT a.name) AS artists,
-       sampled_by,
-       round(s.pagerank, 2) AS pagerank
-"""
-
-results = conn.query(query)
-conn.close()
+results = conn.query(queries.TOP_PAGERANK)
 
 df = pd.DataFrame(results)
 df["Rank"] = range(1, len(df) + 1)
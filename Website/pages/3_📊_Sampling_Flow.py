@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-from neo4j_utils import Neo4jConnection
+import queries
+from neo4j_utils import connect
 import plotly.graph_objects as go
 import plotly.express as px
 
@@ -10,25 +11,18 @@ st.sidebar.header("Visualization Settings")
 
 
 # Neo4j connection
-@st.cache_resource
-def get_conn():
-    return Neo4jConnection("bolt://localhost:7687", "neo4j", "testpassword")
+conn = connect()
 
+# Most flows the slider can show
+MAX_FLOWS = 100
 
-# Load sampling data
+
+# Load sampling data: the largest stored flows, or the live aggregation before genre_flow.py has run
 @st.cache_data
 def load_sampling_data():
-    query = """
-    MATCH (original:Song)-[:BELONGS_TO_GENRE]->(g1:Genre)
-    MATCH (sampled:Song)-[:SAMPLES]->(original)
-    MATCH (sampled)-[:BELONGS_TO_GENRE]->(g2:Genre)
-    RETURN g1.name AS source_genre, g2.name AS target_genre, count(*) AS count
-    ORDER BY count DESC
-    """
-    return get_conn().query(query)
+    return conn.query(queries.GENRE_FLOW, {"limit": MAX_FLOWS}) or conn.query(queries.GENRE_FLOW_LIVE)
 
 
-conn = get_conn()
 data = load_sampling_data()
 
 df = pd.DataFrame(data)
@@ -36,7 +30,7 @@ if df.empty:
     st.warning("No sampling data found.")
     st.stop()
 
-top_n = st.sidebar.slider("Max number of flows to display", 5, 100, 25)
+top_n = st.sidebar.slider("Max number of flows to display", 5, MAX_FLOWS, 25)
 df = df.sort_values("count", ascending=False).head(top_n)
 
 # Group and filter
@@ -3,74 +3,52 @@ import pandas as pd
 import plotly.express as px
 from pyvis.network import Network
 import streamlit.components.v1 as components
-from neo4j_utils import Neo4jConnection
+import queries
+from neo4j_utils import connect
 
 st.set_page_config(page_title="Sampling Communities", page_icon="🌐", layout="wide")
 st.title("🌐 Sampling Communities")
 st.sidebar.header("Community Selection")
 
 
-@st.cache_resource
-def get_conn():
-    return Neo4jConnection("bolt://localhost:7687", "neo4j", "testpassword")
-
-
-conn = get_conn()
+conn = connect()
 
 
 @st.cache_data
 def get_community_list():
-    query = """
-    MATCH (s:Song)
-    WITH s.sampling_community AS community, count(*) AS size
-    WHERE size > 50
-    RETURN community, size
-    ORDER BY size DESC
-    """
-    return conn.query(query)
+    return conn.query(queries.COMMUNITY_LIST)
 
 
 @st.cache_data
 def get_community_profile(community):
-    query = """
-    MATCH (s:Song)
-    WHERE s.sampling_community = $community
-    RETURN 
-      avg(s.mood_party) AS party,
-      avg(s.mood_sad) AS sad,
-      avg(s.mood_relaxed) AS relaxed,
-      avg(s.mood_aggressive_aggressive) AS aggressive,
-      avg(s.mood_acoustic_acoustic) AS acoustic,
-      avg(s.timbre_bright) AS bright,
-      avg(s.voice_instrumental_voice) AS voice
-    """
-    return conn.query(query, {"community": community})[0]
+    return conn.query(queries.COMMUNITY_PROFILE, {"community": community})[0]
 
 
 @st.cache_data
 def get_top_songs(community, limit=20):
-    query = """
-    MATCH (s:Song)-[:HAS_ARTIST]->(a:Artist)
-    WHERE s.sampling_community = $community
-    MATCH (s)-[:BELONGS_TO_GENRE]->(g:Genre)
-    RETURN
-        s.title AS title,
-        collect(DISTINCT a.name) AS artists,
-        collect(DISTINCT g.name) AS genres,
-        s.pagerank AS pagerank
-    ORDER BY s.pagerank DESC
-    LIMIT $limit
-    """
-    return pd.DataFrame(conn.query(query, {"community": community, "limit": limit}))
+    return conn.to_df(queries.COMMUNITY_TOP_SONGS, {"community": community, "limit": limit})
 
 
 # Sidebar community selection
 communities_data = get_community_list()
+if not communities_data:
+    st.warning("No community summaries found. Run knowledge-graph/neo4j/community_summary.py "
+               "(or the analytics job) first.")
+    st.stop()
 community_options = [f"Community {r['community']} ({r['size']} songs)" for r in communities_data]
 community_map = {f"Community {r['community']} ({r['size']} songs)": r['community'] for r in communities_data}
 
 selected_label = st.sidebar.selectbox("Select a Community", community_options)
 selected_community = community_map[selected_label]
+summary = next(r for r in communities_data if r["community"] == selected_community)
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Songs", f"{summary['size']:,}")
+col2.metric("Samples within", f"{summary['internal_edges']:,}")
+col3.metric("Samples out of it", f"{summary['outgoing_edges']:,}")
+col4.metric("Samples into it", f"{summary['incoming_edges']:,}")
+st.markdown(f"**Top artists:** {', '.join(summary['top_artists'][:5]) or '—'}  \n"
+            f"**Top genres:** {', '.join(summary['top_genres'][:5]) or '—'}")
 
 # Audio profile
 st.subheader("Audio Profile of Community")
@@ -92,35 +70,50 @@ else:
     st.info("No songs with PageRank/audio features in this community.")
 
 
+@st.cache_data
+def get_community_backbone(community: int, limit: int = 200):
+    return conn.to_df(queries.COMMUNITY_BACKBONE, {"community": community, "limit": limit})
+
+
 @st.cache_data
 def get_community_edges(community: int, limit: int = 200):
-    query = """
-    MATCH (s1:Song)-[:SAMPLES]->(s2:Song)
-    WHERE s1.sampling_community = $community AND s2.sampling_community = $community
-    RETURN s1.title AS source, s2.title AS target
-    LIMIT $limit
-    """
-    return pd.DataFrame(conn.query(query, {"community": community, "limit": limit}))
+    return conn.to_df(queries.COMMUNITY_EDGES, {"community": community, "limit": limit})
+
 
+# Stored layout coordinates are in [-1, 1]
+LAYOUT_SCALE = 400
 
 # Sampling network visualization
 st.subheader("Sampling Network Within Community")
 
-edge_df = get_community_edges(selected_community)
+backbone_df = get_community_backbone(selected_community)
 
-if edge_df.empty:
-    st.info("No edges found in this community.")
-else:
+if not backbone_df.empty:
+    st.caption(f"The {len(backbone_df)} strongest samples within the community, ranked by PageRank and "
+               f"number of sampled passages.")
     net = Network(height="600px", width="100%", directed=True, notebook=False)
-    for i, row in edge_df.iterrows():
-        source = str(row["source"]) if pd.notnull(row["source"]) else None
-        target = str(row["target"]) if pd.notnull(row["target"]) else None
-
-        if source and target:
-            net.add_node(source, label=source)
-            net.add_node(target, label=target)
-            net.add_edge(source, target)
-
-    net.force_atlas_2based()
-    net.save_graph("community_graph.html")
-    components.html(open("community_graph.html", "r").read(), height=650)
+    for row in backbone_df.itertuples():
+        for node_id, title, x, y in ((row.source_id, row.source, row.source_x, row.source_y),
+                                     (row.target_id, row.target, row.target_x, row.target_y)):
+            net.add_node(int(node_id), label=str(title), x=x * LAYOUT_SCALE, y=y * LAYOUT_SCALE)
+        net.add_edge(int(row.source_id), int(row.target_id), value=row.score)
+    net.toggle_physics(False)
+    components.html(net.generate_html(), height=650)
+else:
+    edge_df = get_community_edges(selected_community)
+
+    if edge_df.empty:
+        st.info("No edges found in this community.")
+    else:
+        net = Network(height="600px", width="100%", directed=True, notebook=False)
+        for i, row in edge_df.iterrows():
+            source = str(row["source"]) if pd.notnull(row["source"]) else None
+            target = str(row["target"]) if pd.notnull(row["target"]) else None
+
+            if source and target:
+                net.add_node(source, label=source)
+                net.add_node(target, label=target)
+                net.add_edge(source, target)
+
+        net.force_atlas_2based()
+        components.html(net.generate_html(), height=650)
@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-from neo4j_utils import Neo4jConnection
+import queries
+from ann_index import similar_songs
+from neo4j_utils import connect
+from search_index import load_search_index
+from spotify_popularity import PopularityCache, PopularityService, spotify_client
 import networkx as nx
 import streamlit.components.v1 as components
 from pyvis.network import Network
@@ -12,62 +14,29 @@ st.title("🎧 Song Recommendations from Sampling Patterns")
 
 
 # Neo4j connection
-@st.cache_resource
-def get_conn():
-    return Neo4jConnection("bolt://localhost:7687", "neo4j", "testpassword")
+conn = connect()
 
 
-conn = get_conn()
+# Spotify popularity: cached on disk for every session, missing songs looked up concurrently
+def get_secret(name):
+    try:
+        return st.secrets[name]
+    except Exception:  # no secrets.toml, or no such key: run with the offline stub
+        return None
 
 
-# Spotify client setup
 @st.cache_resource
-def get_spotify_client():
-    client_id = st.secrets["SPOTIFY_CLIENT_ID"]
-    client_secret = st.secrets["SPOTIFY_CLIENT_SECRET"]
-    auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
-    return spotipy.Spotify(auth_manager=auth_manager)
-
+def get_popularity_service():
+    client = spotify_client(get_secret("SPOTIFY_CLIENT_ID"), get_secret("SPOTIFY_CLIENT_SECRET"))
+    return PopularityService(client, PopularityCache())
 
-sp = get_spotify_client()
-
-
-# Get Spotify popularity for a song
-@st.cache_data(show_spinner="Fetching Spotify popularity...")
-def get_spotify_popularity(song_title, artist_name=None):
-    try:
-        query = f"track:{song_title}"
-        if artist_name and artist_name != "Unknown":
-            query += f" artist:{artist_name}"
 
-        result = sp.search(q=query, type="track", limit=1)
-        items = result.get("tracks", {}).get("items", [])
-        if items:
-            return items[0]["popularity"]
-    except Exception as e:
-        st.error(f"Spotify API error: {e}")
-    
-    return 0  # Default if not found
+popularity = get_popularity_service()
 
 
 # Search for songs
-@st.cache_data(show_spinner="Searching songs...")
 def search_songs(query):
-    results = conn.query("""
-        MATCH (s:Song)
-        OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
-        WITH s, collect(DISTINCT a.name) AS artists
-        WHERE toLower(s.title) CONTAINS toLower($q)
-           OR (size(artists) > 0 AND any(name IN artists WHERE toLower(name) CONTAINS toLower($q)))
-        MATCH (s)-[:RELEASED_IN]->(y:Year)
-        RETURN id(s) AS id,
-               s.title AS title,
-               artists AS artist,
-               coalesce(y.value, s.release_year) AS year
-        ORDER BY year DESC
-        LIMIT 20
-    """, {"q": query})
-    return results
+    return load_search_index(conn).songs(query)
 
 
 # Search input
@@ -100,9 +69,15 @@ selected_song = selected_row.title
 selected_song_id = selected_row.id
 
 
-# Get Spotify popularity for the selected song
-artist_name = ", ".join(selected_row.artist) if isinstance(selected_row.artist, (list, tuple)) else selected_row.artist
-selected_song_popularity = get_spotify_popularity(selected_song, artist_name)
+# Spotify popularity of the selected song: stored by the backfill, else from the cache or Spotify
+# (keyed on the first artist, like the backfill and the recommendations)
+selected_song_popularity = getattr(selected_row, "spotify_popularity", None)
+if pd.isna(selected_song_popularity):
+    first_artist = selected_row.artist[0] if len(selected_row.artist) else None
+    selected_song_popularity, errors = popularity.lookup(selected_song, first_artist)
+    if errors:
+        st.error(f"Spotify API error: {errors[-1]}")
+selected_song_popularity = int(selected_song_popularity or 0)
 
 st.markdown(f"**Selected Song Spotify Popularity**: 🎵 **{selected_song_popularity}** / 100")
 
@@ -110,26 +85,7 @@ st.markdown(f"**Selected Song Spotify Popularity**: 🎵 **{selected_song_popula
 # Get recommendations based on sampling
 @st.cache_data(show_spinner="Fetching recommendations...")
 def get_recommendations(title, artist_names):
-    query = """
-    MATCH (s:Song)
-    OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
-    WITH s, collect(DISTINCT a.name) AS artists
-    WHERE toLower(s.title) = toLower($title)
-      AND any(name IN artists WHERE toLower(name) IN $artist_names)
-    
-    MATCH (s)-[:SAMPLES]->(sampled:Song)
-    WITH sampled
-    MATCH (rec:Song)-[:SAMPLES]->(sampled)
-    WHERE rec.title <> $title
-    OPTIONAL MATCH (rec)-[:HAS_ARTIST]->(a:Artist)
-    OPTIONAL MATCH (sampled)-[:HAS_ARTIST]->(sampled_artist:Artist)
-    RETURN rec.title AS recommended_title,
-           collect(DISTINCT a.name) AS artists,
-           sampled.title AS sampled_source,
-           collect(DISTINCT sampled_artist.name) AS sampled_artists
-    LIMIT 15
-    """
-    return conn.query(query, {
+    return conn.query(queries.CO_SAMPLERS, {
         "title": title,
         "artist_names": [name.lower() for name in artist_names] if artist_names else []
     })
@@ -146,11 +102,15 @@ else:
     df["artists"] = df["artists"].apply(lambda a: a if isinstance(a, list) else [])
     df["sampled_artists"] = df["sampled_artists"].apply(lambda a: a if isinstance(a, list) else [])
 
-    # Fetch live Spotify popularity
-    df["Spotify Popularity"] = df.apply(
-        lambda row: get_spotify_popularity(row["recommended_title"], row["artists"][0] if row["artists"] else None),
-        axis=1
-    )
+    # Popularity stored on the songs by the backfill, the rest from the cache or Spotify in one batch
+    missing = df.spotify_popularity.isna()
+    with st.spinner("Fetching Spotify popularity..."):
+        found, errors = popularity.lookup_many(
+            [(row.recommended_title, row.artists[0] if row.artists else None) for row in df[missing].itertuples()])
+        df.loc[missing, "spotify_popularity"] = found
+    if errors:
+        st.error(f"Spotify API error: {errors[-1]}")
+    df["Spotify Popularity"] = df.spotify_popularity.fillna(0).astype(int)
 
     df = df.rename(columns={
         "recommended_title": "Recommended Song",
@@ -174,6 +134,23 @@ else:
     )
 
 
+# Nearest neighbours in node2vec space, from anywhere in the catalogue (not only co-samplers)
+@st.cache_data(show_spinner="Finding structurally similar songs...")
+def get_similar_songs(node_id, k=20):
+    ids, scores = similar_songs(conn, node_id, k)
+    meta = pd.DataFrame(conn.query(queries.CANDIDATE_METADATA, {"ids": ids.tolist()}),
+                        columns=["id", "title", "artist", "year"])
+    return meta.merge(pd.DataFrame({"id": ids, "similarity": scores})).sort_values("similarity", ascending=False)
+
+
+with st.expander("🧬 Songs with a similar place in the sampling graph"):
+    similar = get_similar_songs(int(selected_song_id))
+    if similar.empty:
+        st.info("No structural embedding for this song.")
+    else:
+        st.dataframe(similar[["title", "artist", "year", "similarity"]].style.format({"similarity": "{:.3f}"}))
+
+
 with st.expander("Show sampling graph (co-samplers)"):
     G = nx.DiGraph()
 
@@ -2,8 +2,11 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import networkx as nx
-from scipy.spatial.distance import cdist
-from neo4j_utils import Neo4jConnection
+import queries
+from ann_index import similar_songs
+from feature_store import load_feature_store
+from neo4j_utils import connect
+from search_index import load_search_index
 import streamlit.components.v1 as components
 from pyvis.network import Network
 
@@ -13,45 +16,8 @@ st.sidebar.header("Recommendation Settings")
 
 
 # Neo4j connection
-@st.cache_resource
-def get_conn():
-    return Neo4jConnection("bolt://localhost:7687", "neo4j", "testpassword")
-
-
-conn = get_conn()
-
-FEATURE_COLS = [
-    "danceability_danceable",
-    "genre_dortmund_alternative", "genre_dortmund_blues",
-    "genre_dortmund_electronic", "genre_dortmund_folkcountry",
-    "genre_dortmund_funksoulrnb", "genre_dortmund_jazz",
-    "genre_dortmund_pop", "genre_dortmund_raphiphop",
-    "genre_dortmund_rock",
-    "genre_electronic_ambient", "genre_electronic_dnb",
-    "genre_electronic_house", "genre_electronic_techno",
-    "genre_electronic_trance",
-    "genre_rosamerica_cla", "genre_rosamerica_dan",
-    "genre_rosamerica_hip", "genre_rosamerica_jaz",
-    "genre_rosamerica_pop", "genre_rosamerica_rhy",
-    "genre_rosamerica_roc", "genre_rosamerica_spe",
-    "genre_tzanetakis_blu", "genre_tzanetakis_cla",
-    "genre_tzanetakis_cou", "genre_tzanetakis_dis",
-    "genre_tzanetakis_hip", "genre_tzanetakis_jaz",
-    "genre_tzanetakis_met", "genre_tzanetakis_pop",
-    "genre_tzanetakis_reg", "genre_tzanetakis_roc",
-    "ismir04_rhythm_ChaChaCha", "ismir04_rhythm_Jive",
-    "ismir04_rhythm_Quickstep",
-    "ismir04_rhythm_Rumba_American",
-    "ismir04_rhythm_Rumba_International",
-    "ismir04_rhythm_Rumba_Misc",
-    "ismir04_rhythm_Samba", "ismir04_rhythm_Tango",
-    "ismir04_rhythm_VienneseWaltz", "ismir04_rhythm_Waltz",
-    "mood_acoustic_acoustic", "mood_aggressive_aggressive",
-    "mood_electronic_electronic", "mood_happy_happy",
-    "mood_party", "mood_relaxed", "mood_sad",
-    "timbre_bright", "tonal_atonal_atonal",
-    "voice_instrumental_voice"
-]
+conn = connect()
+
 
 # Search Sample
 stem_query = st.text_input("Search a sample (song title / artist):")
@@ -61,23 +27,8 @@ if not stem_query:
 
 
 # Get matching samples
-@st.cache_data(show_spinner="Searching samples...")
 def search_samples(query):
-    results = conn.query("""
-        MATCH (s:Song)
-        OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
-        WITH s, collect(a.name) AS artists
-        WHERE toLower(s.title) CONTAINS toLower($q)
-           OR any(n IN artists WHERE toLower(n) CONTAINS toLower($q))
-        MATCH (s)-[:RELEASED_IN]->(y:Year)
-        RETURN id(s) AS id,
-               s.title AS title,
-               artists AS artist,
-               coalesce(y.value, s.release_year) AS year
-        ORDER BY year DESC
-        LIMIT 20
-    """, {"q": query})
-    return results
+    return load_search_index(conn).songs(query)
 
 
 matches = search_samples(stem_query)
@@ -103,97 +54,70 @@ stem_id = int(stem_row.id)
 stem_year = int(stem_row.year)
 
 
-# Random Warks
+# Random Walks: precomputed visit scores, or seeded live walks for songs added since they were computed
+WALK_SEED = 42
+
+
 @st.cache_data(show_spinner="Generating random walks...")
 def get_random_walks(stem_node_id):
-    query = """
-    CALL gds.randomWalk.stream('songGraph', {
-        sourceNodes: [$stem],
-        walkLength: 4,
-        walksPerNode: 800
-    })
-    YIELD nodeIds
-    UNWIND nodeIds[1..] AS v
-    RETURN v AS id, count(*) AS hits
-    """
-    return conn.query(query, {"stem": stem_node_id})
+    stored = conn.query(queries.WALK_NEIGHBOURS, {"stem": stem_node_id})
+    if stored and stored[0]["scored"]:
+        return stored[0]["neighbours"]
+    return conn.query(queries.RANDOM_WALKS, {"stem": stem_node_id, "seed": WALK_SEED})
 
 
 walks = get_random_walks(stem_id)
-walk_df = pd.DataFrame(walks)
+walk_df = pd.DataFrame(walks, columns=["id", "hits"])
+walk_df["walk_prob"] = walk_df.hits / walk_df.hits.sum()
+
+
+# Structurally similar songs from the whole catalogue, including those the walks never reach
+SIMILAR_CANDIDATES = 100
 
-if walk_df.empty:
+
+@st.cache_data(show_spinner="Finding structurally similar songs...")
+def get_similar_songs(stem_node_id, k=SIMILAR_CANDIDATES):
+    ids, _ = similar_songs(conn, stem_node_id, k)
+    return ids.tolist()
+
+
+candidate_ids = list(dict.fromkeys(walk_df.id.tolist() + get_similar_songs(stem_id)))
+
+if not candidate_ids:
     st.warning("Random walks found no candidates.")
     st.stop()
 
-walk_df["walk_prob"] = walk_df.hits / walk_df.hits.sum()
-
 
 # Get candidate metadata
 @st.cache_data(show_spinner="Fetching candidate metadata...")
 def get_candidate_metadata(ids):
-    feature_props = ", ".join([f"t.{c} AS {c}" for c in FEATURE_COLS])
-    query = f"""
-    UNWIND $ids AS i
-    MATCH (t:Song) WHERE id(t) = i
-    MATCH (t)-[:HAS_ARTIST]->(a:Artist)
-    MATCH (t)-[:RELEASED_IN]->(y:Year)
-    RETURN id(t) AS id,
-           t.title AS title,
-           collect(DISTINCT a.name) AS artist,
-           y.value AS year,
-           t.n2v AS vec_struct,
-           {feature_props}
-    """
-    return conn.query(query, {"ids": ids})
-
-
-meta = get_candidate_metadata(walk_df.id.tolist())
+    return conn.query(queries.CANDIDATE_METADATA, {"ids": ids})
+
+
+meta = get_candidate_metadata(candidate_ids)
 meta_df = pd.DataFrame(meta)
 
 if meta_df.empty:
     st.warning("Candidates returned 0 results.")
     st.stop()
 
-# Similarity scores
-# Structural (node2vec)
-stem_struct = np.array(conn.query(
-    "MATCH (s) WHERE id(s) = $id RETURN s.n2v AS v", {"id": stem_id}
-)[0]["v"], np.float32).reshape(1, -1)
+# Similarity scores: the feature store keeps unit-length n2v and audio vectors, so
+# both cosines are a gather of the candidates' rows and a matrix-vector product
+store = load_feature_store(conn)
+struct_cos, audio_cos = store.similarity(stem_id, meta_df.id.to_numpy())
 
-if meta_df.vec_struct.isnull().all():
+if np.isnan(struct_cos).all():
     st.warning("Candidates missing structural vectors.")
     st.stop()
 
-struct_mat = np.stack(meta_df.vec_struct.dropna().apply(lambda v: np.array(v, np.float32)))
-meta_df["struct_cos"] = 1 - cdist(stem_struct, struct_mat, "cosine").flatten()
-
-# Audio features
-audio_df = meta_df[FEATURE_COLS].astype(float)
-
-if audio_df.isna().all().all():
-    meta_df["audio_cos"] = np.nan
-    st.info("⚠️  No scalar audio features found; using structure only.")
-else:
-    audio_mat = audio_df.to_numpy(dtype=np.float32)
-    col_mean = audio_mat.mean(axis=0, keepdims=True)
-    col_std = audio_mat.std(axis=0, ddof=0, keepdims=True)
-    col_std[col_std == 0] = 1
-
-    audio_mat_std = (audio_mat - col_mean) / col_std
-
-    stem_audio_raw = conn.query(f"""
-        MATCH (s:Song) WHERE id(s)=$id
-        RETURN {', '.join(f's.{c}' for c in FEATURE_COLS)}
-    """, {"id": stem_id})[0]
+meta_df["struct_cos"] = struct_cos
+meta_df["audio_cos"] = audio_cos
 
-    stem_audio = np.array([[stem_audio_raw.get(c, 0.0) for c in FEATURE_COLS]], dtype=np.float32)
-    stem_audio_std = (stem_audio - col_mean) / col_std
-
-    meta_df["audio_cos"] = 1 - cdist(stem_audio_std, audio_mat_std, metric="cosine").flatten()
+if np.isnan(audio_cos).all():
+    st.info("⚠️  No audio vectors found; using structure only.")
 
 # Combine scores and display
-df = meta_df.merge(walk_df[["id", "walk_prob"]], how="inner")
+df = meta_df.merge(walk_df[["id", "walk_prob"]], how="left").fillna({"walk_prob": 0.0})
 df = df[df.year < stem_year].copy()
 
 alpha = st.sidebar.slider("Mix: Similar Sound (0) vs Sampling Graph (1)", 0.0, 1.0, 0.6, 0.05)
@@ -208,26 +132,25 @@ st.dataframe(
     .style.format({"score": "{:.3f}"})
 )
 
+
+# Songs that sound like the stem, from the vector index (independent of the sampling graph)
+@st.cache_data(show_spinner="Finding songs that sound alike...")
+def get_sound_alikes(stem_node_id, k=20):
+    return conn.query(queries.SOUND_ALIKES, {"id": stem_node_id, "k": k})
+
+
+with st.expander("🎧 Songs that sound like this"):
+    alikes = pd.DataFrame(get_sound_alikes(stem_id))
+    if alikes.empty:
+        st.info("No audio vector for this song.")
+    else:
+        st.dataframe(alikes.style.format({"score": "{:.3f}"}))
+
 # Graph visualization
 with st.expander("🔗 Show sampling graph (outgoing edges only)"):
     @st.cache_data(show_spinner="Loading sampling tree...")
     def fetch_sampling_tree_full(stem_id):
-        query = """
-        MATCH path = (s:Song)-[:SAMPLES*1..3]->(sampled:Song)
-        WHERE id(s) = $id
-        UNWIND relationships(path) AS rel
-        WITH startNode(rel) AS src, endNode(rel) AS tgt
-        OPTIONAL MATCH (src)-[:HAS_ARTIST]->(src_artist:Artist)
-        OPTIONAL MATCH (tgt)-[:HAS_ARTIST]->(tgt_artist:Artist)
-        RETURN 
-          id(src) AS src_id,
-          src.title AS src_title,
-          collect(DISTINCT src_artist.name) AS src_artists,
-          id(tgt) AS tgt_id,
-          tgt.title AS tgt_title,
-          collect(DISTINCT tgt_artist.name) AS tgt_artists
-        """
-        return conn.query(query, {"id": stem_id})
+        return conn.query(queries.SAMPLING_TREE, {"id": stem_id})
 
 
     tree_data = fetch_sampling_tree_full(stem_id)
@@ -0,0 +1,379 @@
+# queries.py
+"""
+Every Cypher query the pages run, in one place.
+
+The pages pass these constants to `conn.query`; the snapshot backend
+(snapshot_backend.py) recognises them by identity and answers them without a
+database, so a query used by a page must live here.
+"""
+
+# ──────────────────── SEARCH & EXPLORE: ARTIST ────────────────────
+
+ARTIST_SUMMARY = """
+MATCH (a:Artist {name:$artist})
+RETURN a.wikipedia_summary AS summary
+"""
+
+ARTIST_TOP_GENRES = """
+MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[:BELONGS_TO_GENRE]->(g:Genre)
+RETURN g.name AS genre, count(*) AS cnt
+ORDER BY cnt DESC LIMIT 3
+"""
+
+ARTIST_SONGS = """
+MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[:RELEASED_IN]->(y:Year)
+RETURN s.title AS name, id(s) AS id, y.value AS year
+"""
+
+ARTIST_SAMPLED_BY = """
+MATCH (other:Song)-[:SAMPLES]->(:Song)-[:HAS_ARTIST]->(a:Artist {name:$artist})
+RETURN count(DISTINCT other) AS cnt
+"""
+
+ARTIST_SAMPLES = """
+MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(:Song)-[r:SAMPLES]->()
+RETURN count(r) AS cnt
+"""
+
+ARTIST_TOP_SAMPLING_SONGS = """
+MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[r:SAMPLES]->()
+RETURN s.title AS song, count(r) AS cnt
+ORDER BY cnt DESC LIMIT 3
+"""
+
+ARTIST_GENRES_SAMPLED = """
+MATCH (a:Artist {name:$artist})<-[:HAS_ARTIST]-(s:Song)-[:SAMPLES]->(t:Song)-[:BELONGS_TO_GENRE]->(g:Genre)
+RETURN g.name AS genre, count(*) AS cnt
+ORDER BY cnt DESC LIMIT 3
+"""
+
+ARTIST_SAMPLED_BY_GENRES = """
+MATCH (t:Song)-[:BELONGS_TO_GENRE]->(g:Genre),
+      (t)-[:SAMPLES]->(:Song)-[:HAS_ARTIST]->(a:Artist {name:$artist})
+RETURN g.name AS genre, count(*) AS cnt
+ORDER BY cnt DESC LIMIT 3
+"""
+
+ARTIST_NETWORK = """
+MATCH (a:Artist {name:$artist})
+OPTIONAL MATCH (a)<-[:HAS_ARTIST]-(s:Song)
+WHERE s IS NOT NULL
+OPTIONAL MATCH (s)-[r:SAMPLES]->(t:Song)
+
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(sa:Artist)
+OPTIONAL MATCH (s)-[:BELONGS_TO_GENRE]->(sg:Genre)
+OPTIONAL MATCH (s)-[:RELEASED_IN]->(sy:Year)
+
+OPTIONAL MATCH (t)-[:HAS_ARTIST]->(ta:Artist)
+OPTIONAL MATCH (t)-[:BELONGS_TO_GENRE]->(tg:Genre)
+OPTIONAL MATCH (t)-[:RELEASED_IN]->(ty:Year)
+
+RETURN
+    id(a) AS a_id, a.name AS a_name,
+    id(s) AS s_id, s.title AS s_name,
+    id(t) AS t_id, t.title AS t_name,
+    type(r) AS rel_type,
+    collect(DISTINCT sa.name) AS song_artists,
+    s.release_date AS s_release_date,
+    sy.value AS s_year,
+    collect(DISTINCT sg.name) AS s_genres,
+    collect(DISTINCT ta.name) AS t_artists,
+    t.release_date AS t_release_date,
+    ty.value AS t_year,
+    collect(DISTINCT tg.name) AS t_genres
+LIMIT 200
+"""
+
+# ──────────────────── SEARCH & EXPLORE: SONG ────────────────────
+
+# Everything the song page shows, in one round trip (see song_profile.py).
+# Of the songs with this title (and one of $artist_filters), the first is profiled.
+SONG_PROFILE = """
+MATCH (s:Song {title:$title})
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+WITH s, collect(DISTINCT a.name) AS artists
+WHERE $artist_filters IS NULL OR ANY(artist IN $artist_filters WHERE artist IN artists)
+WITH s, artists
+LIMIT 1
+OPTIONAL MATCH (s)-[:BELONGS_TO_GENRE]->(g:Genre)
+WITH s, artists, collect(DISTINCT g.name) AS genres
+OPTIONAL MATCH (s)-[:PART_OF_ALBUM]->(al:Album)
+OPTIONAL MATCH (s)-[:RELEASED_IN]->(y:Year)
+WITH s, artists, genres, collect(al.title)[0] AS album, collect(y.value)[0] AS year
+CALL {
+    // Only expanded when graph_metrics.py hasn't stored the count (or it was cleared by new samples).
+    // Degrees are always counted live: Neo4j keeps them per node, so that is a lookup.
+    WITH s
+    OPTIONAL MATCH (o:Song)-[:SAMPLES*2]-(s)
+    WHERE s.sample_chains IS NULL
+    RETURN count(DISTINCT o) AS live_chains
+}
+CALL {
+    WITH s
+    MATCH (s)-[:SAMPLES]->(t:Song)
+    OPTIONAL MATCH (t)-[:HAS_ARTIST]->(a:Artist)
+    WITH t, collect(DISTINCT a.name) AS artist_list
+    ORDER BY t.release_date DESC
+    RETURN collect({name: t.title, artists: apoc.text.join(artist_list, ', '), rd: t.release_date}) AS sampled
+}
+CALL {
+    WITH s
+    MATCH (o:Song)-[:SAMPLES]->(s)
+    OPTIONAL MATCH (o)-[:HAS_ARTIST]->(a:Artist)
+    WITH o, collect(DISTINCT a.name) AS artist_list
+    ORDER BY o.release_date DESC
+    RETURN collect({name: o.title, artists: apoc.text.join(artist_list, ', '), rd: o.release_date}) AS sampled_by
+}
+CALL {
+    WITH s
+    MATCH (o:Song)-[:SAMPLES]->(s)
+    MATCH (o)-[:RELEASED_IN]->(y:Year)
+    WITH y.value AS year, collect(o.title) AS songs, count(*) AS n
+    ORDER BY year
+    RETURN collect({year: year, n: n, songs: songs}) AS usage
+}
+RETURN s.id AS song_id, s.title AS title, artists, genres, album, s.record_label AS label,
+       s.release_date AS rd, year, s.pagerank AS pagerank,
+       COUNT { (s)-[:SAMPLES]->() } AS outgoing,
+       COUNT { ()-[:SAMPLES]->(s) } AS incoming,
+       coalesce(s.sample_chains, live_chains) AS chains,
+       sampled, sampled_by, usage
+"""
+
+# Sampling network, expanded one hop at a time by ego_network.py
+
+EGO_ROOTS = """
+MATCH (s:Song {title:$title})
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+WITH s, collect(DISTINCT a.name) AS artists
+WHERE $artist_filters IS NULL OR ALL(artist IN $artist_filters WHERE artist IN artists)
+RETURN id(s) AS id, s.title AS title, artists
+"""
+
+# At most $per_node relationships of each frontier song
+EGO_EXPAND = """
+UNWIND $frontier AS fid
+MATCH (f:Song) WHERE id(f) = fid
+CALL {
+    WITH f
+    MATCH (f)-[r:SAMPLES]-(n:Song)
+    RETURN r, n
+    LIMIT $per_node
+}
+OPTIONAL MATCH (n)-[:HAS_ARTIST]->(a:Artist)
+WITH fid, r, n, collect(DISTINCT a.name) AS artists
+RETURN fid AS from_id, id(startNode(r)) AS src_id, id(endNode(r)) AS tgt_id,
+       id(n) AS id, n.title AS title, artists
+"""
+
+# ──────────────────── IMPACTFUL SONGS ────────────────────
+
+TOP_PAGERANK = """
+MATCH (s:Song)
+WHERE s.pagerank IS NOT NULL
+WITH s
+ORDER BY s.pagerank DESC
+LIMIT 50
+OPTIONAL MATCH (s)<-[:SAMPLES]-(:Song)
+WITH s, count(*) AS sampled_by
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+RETURN s.title AS title,
+       collect(DISTINCT a.name) AS artists,
+       sampled_by,
+       round(s.pagerank, 2) AS pagerank
+"""
+
+# ──────────────────── SAMPLING FLOW ────────────────────
+
+# The $limit largest flows, as stored by knowledge-graph/neo4j/genre_flow.py
+GENRE_FLOW = """
+MATCH (g1)-[f:GENRE_FLOW]->(g2)
+WHERE f.count IS NOT NULL
+RETURN g1.name AS source_genre, g2.name AS target_genre, f.count AS count
+ORDER BY count DESC
+LIMIT $limit
+"""
+
+# Every flow aggregated from the samples, for databases imported before GENRE_FLOW
+GENRE_FLOW_LIVE = """
+MATCH (original:Song)-[:BELONGS_TO_GENRE]->(g1:Genre)
+MATCH (sampled:Song)-[:SAMPLES]->(original)
+MATCH (sampled)-[:BELONGS_TO_GENRE]->(g2:Genre)
+RETURN g1.name AS source_genre, g2.name AS target_genre, count(*) AS count
+ORDER BY count DESC
+"""
+
+# ──────────────────── COMMUNITIES ────────────────────
+
+# Communities are summarised in Community nodes by knowledge-graph/neo4j/community_summary.py
+COMMUNITY_LIST = """
+MATCH (c:Community)
+WHERE c.size > 50
+RETURN c.id AS community,
+       c.size AS size,
+       c.internal_edges AS internal_edges,
+       c.outgoing_edges AS outgoing_edges,
+       c.incoming_edges AS incoming_edges,
+       c.top_artists AS top_artists,
+       c.top_genres AS top_genres
+ORDER BY size DESC
+"""
+
+# (column in the result, Song property)
+COMMUNITY_PROFILE_FEATURES = [
+    ("party", "mood_party"),
+    ("sad", "mood_sad"),
+    ("relaxed", "mood_relaxed"),
+    ("aggressive", "mood_aggressive_aggressive"),
+    ("acoustic", "mood_acoustic_acoustic"),
+    ("bright", "timbre_bright"),
+    ("voice", "voice_instrumental_voice"),
+]
+
+COMMUNITY_PROFILE = """
+MATCH (c:Community {id: $community})
+RETURN
+""" + ",\n".join(f"  c.{prop}_mean AS {column}" for column, prop in COMMUNITY_PROFILE_FEATURES)
+
+COMMUNITY_TOP_SONGS = """
+MATCH (c:Community {id: $community})-[r:TOP_SONG]->(s:Song)
+WHERE r.rank <= $limit
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+WITH r, s, collect(DISTINCT a.name) AS artists
+OPTIONAL MATCH (s)-[:BELONGS_TO_GENRE]->(g:Genre)
+WITH r, s, artists, collect(DISTINCT g.name) AS genres
+RETURN
+    s.title AS title,
+    artists,
+    genres,
+    s.pagerank AS pagerank
+ORDER BY r.rank
+"""
+
+# The $limit best backbone samples of a community, at the stored layout (community_layout.py)
+COMMUNITY_BACKBONE = """
+MATCH (s1:Song)-[r:SAMPLES]->(s2:Song)
+WHERE s1.sampling_community = $community AND r.backbone_rank <= $limit
+RETURN id(s1) AS source_id, s1.title AS source, s1.layout_x AS source_x, s1.layout_y AS source_y,
+       id(s2) AS target_id, s2.title AS target, s2.layout_x AS target_x, s2.layout_y AS target_y,
+       r.backbone_score AS score
+ORDER BY r.backbone_rank
+"""
+
+# Any $limit samples within a community, for databases without a backbone
+COMMUNITY_EDGES = """
+MATCH (s1:Song)-[:SAMPLES]->(s2:Song)
+WHERE s1.sampling_community = $community AND s2.sampling_community = $community
+RETURN s1.title AS source, s2.title AS target
+LIMIT $limit
+"""
+
+# ──────────────────── RECOMMENDATIONS ────────────────────
+
+# Everything search_index.py needs, read once per process
+SEARCH_CATALOGUE = """
+MATCH (s:Song)-[:RELEASED_IN]->(y:Year)
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+RETURN id(s) AS id,
+       s.title AS title,
+       collect(DISTINCT a.name) AS artists,
+       y.value AS year,
+       s.pagerank AS pagerank,
+       s.spotify_popularity AS spotify_popularity
+"""
+
+CO_SAMPLERS = """
+MATCH (s:Song {title: $title})
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+WITH s, collect(DISTINCT a.name) AS artists
+WHERE any(name IN artists WHERE toLower(name) IN $artist_names)
+
+MATCH (s)-[:SAMPLES]->(sampled:Song)
+WITH sampled
+MATCH (rec:Song)-[:SAMPLES]->(sampled)
+WHERE rec.title <> $title
+OPTIONAL MATCH (rec)-[:HAS_ARTIST]->(a:Artist)
+OPTIONAL MATCH (sampled)-[:HAS_ARTIST]->(sampled_artist:Artist)
+RETURN rec.title AS recommended_title,
+       collect(DISTINCT a.name) AS artists,
+       sampled.title AS sampled_source,
+       collect(DISTINCT sampled_artist.name) AS sampled_artists,
+       max(rec.spotify_popularity) AS spotify_popularity
+LIMIT 15
+"""
+
+# Expected visits of a 4-node walk from the song, stored by knowledge-graph/neo4j/walk_scores.py;
+# `scored` is null for songs added since it last ran
+WALK_NEIGHBOURS = """
+MATCH (s:Song) WHERE id(s) = $stem
+RETURN s.walk_scored AS scored,
+       [(s)-[r:WALK_NEIGHBOUR]->(t:Song) | {id: id(t), hits: r.score}] AS neighbours
+"""
+
+# Live fallback for songs without WALK_NEIGHBOURS; seeded so a song always gets the same candidates
+RANDOM_WALKS = """
+CALL gds.randomWalk.stream('songGraph', {
+    sourceNodes: [$stem],
+    relationshipTypes: ['SAMPLES'],
+    walkLength: 4,
+    walksPerNode: 800,
+    randomSeed: $seed,
+    concurrency: 1
+})
+YIELD nodeIds
+UNWIND nodeIds[1..] AS v
+RETURN v AS id, count(*) AS hits
+"""
+
+CANDIDATE_METADATA = """
+UNWIND $ids AS i
+MATCH (t:Song) WHERE id(t) = i
+MATCH (t)-[:HAS_ARTIST]->(a:Artist)
+MATCH (t)-[:RELEASED_IN]->(y:Year)
+RETURN id(t) AS id,
+       t.title AS title,
+       collect(DISTINCT a.name) AS artist,
+       y.value AS year
+"""
+
+# Every song's vectors, for feature_store.py when no feature export is available;
+# n2v as 128 int8 codes and a scale where quantisation.py has run (it replaces the 128 floats)
+SONG_FEATURES = """
+MATCH (s:Song)
+WHERE s.n2v_i8 IS NOT NULL OR s.n2v IS NOT NULL OR s.audio_vec IS NOT NULL
+RETURN id(s) AS id,
+       s.n2v_i8 AS n2v_i8,
+       s.n2v_scale AS n2v_scale,
+       CASE WHEN s.n2v_i8 IS NULL THEN s.n2v END AS n2v,
+       s.audio_vec AS audio_vec
+ORDER BY id
+"""
+
+SOUND_ALIKES = """
+MATCH (s:Song) WHERE id(s) = $id AND s.audio_vec IS NOT NULL
+CALL db.index.vector.queryNodes('song_audio_vec', $k + 1, s.audio_vec) YIELD node, score
+WITH node, score WHERE node <> s
+OPTIONAL MATCH (node)-[:HAS_ARTIST]->(a:Artist)
+OPTIONAL MATCH (node)-[:RELEASED_IN]->(y:Year)
+RETURN node.title AS title,
+       collect(DISTINCT a.name) AS artist,
+       y.value AS year,
+       score
+ORDER BY score DESC
+"""
+
+SAMPLING_TREE = """
+MATCH path = (s:Song)-[:SAMPLES*1..3]->(sampled:Song)
+WHERE id(s) = $id
+UNWIND relationships(path) AS rel
+WITH startNode(rel) AS src, endNode(rel) AS tgt
+OPTIONAL MATCH (src)-[:HAS_ARTIST]->(src_artist:Artist)
+OPTIONAL MATCH (tgt)-[:HAS_ARTIST]->(tgt_artist:Artist)
+RETURN
+  id(src) AS src_id,
+  src.title AS src_title,
+  collect(DISTINCT src_artist.name) AS src_artists,
+  id(tgt) AS tgt_id,
+  tgt.title AS tgt_title,
+  collect(DISTINCT tgt_artist.name) AS tgt_artists
+"""
@@ -0,0 +1,251 @@
+# search_index.py
+"""
+In-memory typeahead over song titles and artist names, shared by the Search,
+Song Recommendations and Sample Recommendations pages.
+
+The catalogue (songs with a release year, their artists and PageRank) is
+indexed offline: knowledge-graph/neo4j/feature_export.py (and every snapshot)
+saves the index in the search/ directory of the feature export, where it is
+memory-mapped and reloaded whenever the export's graph_version changes.
+Without an export it is built once per process from SEARCH_CATALOGUE.
+
+Songs are stored best first (PageRank, then year), so a song's row is its
+rank. Every word is kept in a sorted vocabulary with the rows it occurs in,
+so the rows of the words a typed word is a prefix of are two binary searches
+and one slice, marked in a boolean mask over the songs. Every typed word must
+match the title or one of the artists; exact titles rank first, then matches
+on the title alone, then by row, and only the top k are sorted. At 300k songs
+a lookup takes a few milliseconds, one-letter prefixes included, once the
+files are paged in.
+
+    KG_FEATURES=snapshot/features python search_index.py   # lookup latency
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import queries
+from feature_store import exported_version, features_directory, read_export
+
+TOKEN = re.compile(r"\w+(?:'\w+)*")
+TOP_K = 20
+# Words are indexed (and typed words matched) on their first MAX_TOKEN characters,
+# which bounds the width of the vocabulary array
+MAX_TOKEN = 24
+SEARCH_DIR = "search"
+
+
+def tokens(text):
+    return [token[:MAX_TOKEN] for token in TOKEN.findall(text.lower())] if text else []
+
+
+def title_key(text):
+    """64-bit hash of a lower-cased title, to find exact title matches without comparing strings."""
+    digest = hashlib.blake2b((text or "").strip().lower().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class TokenIndex:
+    """Sorted vocabulary and, for each word, the sorted rows it occurs in (CSR: starts, rows)."""
+
+    def __init__(self, vocabulary, starts, rows):
+        self.vocabulary, self.starts, self.rows = vocabulary, starts, rows
+
+    @classmethod
+    def build(cls, documents):
+        """From (row, text) pairs."""
+        words, rows = [], []
+        for row, text in documents:
+            for token in tokens(text):
+                words.append(token)
+                rows.append(row)
+        vocabulary, word = np.unique(np.array(words, dtype=str), return_inverse=True)
+        rows = np.asarray(rows, dtype=np.int32)
+        order = np.lexsort((rows, word))
+        word, rows = word[order], rows[order]
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (word[1:] != word[:-1]) | (rows[1:] != rows[:-1])
+        word, rows = word[keep], rows[keep]
+        return cls(vocabulary, np.searchsorted(word, np.arange(len(vocabulary) + 1)).astype(np.int64), rows)
+
+    def prefix(self, term):
+        """Rows with a word starting with `term`, once per matching word."""
+        # Every word starting with term sorts before term with its last character incremented
+        lo, hi = np.searchsorted(self.vocabulary, [term, term[:-1] + chr(ord(term[-1]) + 1)])
+        return self.rows[self.starts[lo]:self.starts[hi]]
+
+    def mask(self, term, n):
+        """Boolean mask over n rows of those with a word starting with `term`; no sort, however many match."""
+        mask = np.zeros(n, dtype=bool)
+        mask[self.prefix(term)] = True
+        return mask
+
+    def save(self, path, name):
+        for part in ("vocabulary", "starts", "rows"):
+            np.save(path / f"{name}.{part}.npy", getattr(self, part))
+
+    @classmethod
+    def load(cls, path, name):
+        return cls(*(np.load(path / f"{name}.{part}.npy", mmap_mode="r")
+                     for part in ("vocabulary", "starts", "rows")))
+
+
+class SearchIndex:
+    def __init__(self, songs, artists, title_keys, titles, song_artists, artist_names, graph_version=None):
+        # One row per song, best first: id, title, artist (list), year, spotify_popularity
+        self.songs_table = songs
+        # One row per artist name, most songs first: name, songs
+        self.artists_table = artists
+        self.title_keys = title_keys
+        self.title_index, self.artist_index, self.artist_names = titles, song_artists, artist_names
+        self.graph_version = graph_version
+
+    @classmethod
+    def from_records(cls, records, graph_version=None):
+        """From SEARCH_CATALOGUE rows."""
+        ids = np.array([r["id"] for r in records], dtype=np.int64)
+        pagerank = np.array([np.nan if r["pagerank"] is None else r["pagerank"] for r in records], dtype=np.float64)
+        years = np.array([np.nan if r["year"] is None else r["year"] for r in records], dtype=np.float64)
+        # Highest PageRank first, then the latest year; songs without either last
+        order = np.lexsort((ids, -np.nan_to_num(years, nan=-np.inf), -np.nan_to_num(pagerank, nan=0.0)))
+        records = [records[i] for i in order]
+        titles = [r["title"] for r in records]
+        names = [r["artists"] or [] for r in records]
+        songs = pa.table({
+            "id": pa.array(ids[order]),
+            "title": pa.array(titles, type=pa.string()),
+            "artist": pa.array(names, type=pa.list_(pa.string())),
+            "year": pa.array([None if r["year"] is None else int(r["year"]) for r in records], type=pa.int64()),
+            "spotify_popularity": pa.array([r.get("spotify_popularity") for r in records], type=pa.int64()),
+        })
+        counts = Counter(name for song_names in names for name in song_names)
+        artist_list = sorted(counts, key=lambda name: (-counts[name], name))
+        artists = pa.table({"name": pa.array(artist_list, type=pa.string()),
+                            "songs": pa.array([counts[name] for name in artist_list], type=pa.int64())})
+        return cls(songs, artists, np.array([title_key(t) for t in titles], dtype=np.int64),
+                   TokenIndex.build(enumerate(titles)),
+                   TokenIndex.build((i, name) for i, song_names in enumerate(names) for name in song_names),
+                   TokenIndex.build(enumerate(artist_list)), graph_version)
+
+    @classmethod
+    def from_directory(cls, path):
+        """The index saved in the search/ directory of the feature export in `path`."""
+        return read_export(path, cls._from_directory)
+
+    @classmethod
+    def _from_directory(cls, path):
+        graph_version = exported_version(path)
+        path = path / SEARCH_DIR
+        return cls(feather.read_table(path / "songs.arrow", memory_map=True),
+                   feather.read_table(path / "artists.arrow", memory_map=True),
+                   np.load(path / "title_key.npy", mmap_mode="r"),
+                   TokenIndex.load(path, "title"), TokenIndex.load(path, "song_artist"),
+                   TokenIndex.load(path, "artist_name"), graph_version)
+
+    def save(self, path):
+        """Write into the directory `path`; feature_export.py swaps it in with the rest of the export."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        feather.write_feather(self.songs_table, path / "songs.arrow", compression="uncompressed")
+        feather.write_feather(self.artists_table, path / "artists.arrow", compression="uncompressed")
+        np.save(path / "title_key.npy", self.title_keys)
+        self.title_index.save(path, "title")
+        self.artist_index.save(path, "song_artist")
+        self.artist_names.save(path, "artist_name")
+
+    def __len__(self):
+        return self.songs_table.num_rows
+
+    def _match(self, terms):
+        """Masks of the rows matching every term, and of those matching every term in the title alone."""
+        n = len(self)
+        matched, in_title = np.ones(n, dtype=bool), np.ones(n, dtype=bool)
+        for term in terms:
+            title = self.title_index.mask(term, n)
+            in_title &= title
+            matched &= title | self.artist_index.mask(term, n)
+        return matched, in_title
+
+    def songs(self, text, k=TOP_K):
+        """Top-k songs as {id, title, artist, year, spotify_popularity} dicts."""
+        terms = tokens(text)
+        if not terms:
+            return []
+        matched, in_title = self._match(terms)
+        rows = np.flatnonzero(matched)
+        if not len(rows):
+            return []
+        # Lower is better: exact title, then every word in the title, then the row
+        tier = 2 * (self.title_keys[rows] != title_key(text)).astype(np.int64) + ~in_title[rows]
+        keys = tier * len(self) + rows
+        k = min(k, len(keys))
+        top = np.sort(np.partition(keys, k - 1)[:k]) % len(self)
+        return self.songs_table.take(top).to_pylist()
+
+    def artists_matching(self, text, k=TOP_K):
+        """Top-k artist names with a word starting with every typed word, most songs first."""
+        terms = tokens(text)
+        if not terms:
+            return []
+        found = np.ones(self.artists_table.num_rows, dtype=bool)
+        for term in terms:
+            found &= self.artist_names.mask(term, len(found))
+        # Artists are stored most songs first
+        return self.artists_table.column("name").take(np.flatnonzero(found)[:k]).to_pylist()
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def load_search_index(conn):
+    """
+    The index for this connection (connect() returns one per process): the
+    feature export's, loaded again whenever its graph_version changes, or
+    built from SEARCH_CATALOGUE on first use when there is no export.
+    """
+    with _lock:
+        path = features_directory(conn)
+        version = exported_version(path)
+        index = _indexes.get(id(conn))
+        exported = version is not None and (path / SEARCH_DIR).exists()
+        if exported and (index is None or index.graph_version != version):
+            index = _indexes[id(conn)] = SearchIndex.from_directory(path)
+        elif index is None:
+            index = _indexes[id(conn)] = SearchIndex.from_records(conn.query(queries.SEARCH_CATALOGUE))
+        return index
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def benchmark(index, lookups=200, seed=0):
+    """Mean and worst latency of song lookups for typed prefixes of 1 to 4 characters, and two words."""
+    rng = np.random.default_rng(seed)
+    words = index.title_index.vocabulary
+    sample = [str(words[i]) for i in rng.choice(len(words), size=min(lookups, len(words)), replace=False)]
+    cases = {f"{n} character{'s' * (n > 1)}": [w[:n] for w in sample] for n in (1, 2, 4)}
+    cases["two words"] = [f"{a[:3]} {b[:1]}" for a, b in zip(sample, sample[1:] + sample[:1])]
+    print(f"{len(index):,} songs, {len(index.artists_table):,} artists")
+    # The first lookups page the memory-mapped files in
+    for texts in cases.values():
+        for text in texts:
+            index.songs(text)
+    for case, texts in cases.items():
+        times = []
+        for text in texts:
+            start = time.perf_counter()
+            index.songs(text)
+            times.append(time.perf_counter() - start)
+        print(f"{case:<14} mean {np.mean(times) * 1e3:.2f}ms, worst {np.max(times) * 1e3:.2f}ms")
+
+
+if __name__ == "__main__":
+    benchmark(SearchIndex.from_directory(Path(os.environ.get("KG_FEATURES", "features"))))
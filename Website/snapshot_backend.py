@@ -0,0 +1,514 @@
+# snapshot_backend.py
+"""
+Read-only backend that answers the pages' queries (queries.py) from a snapshot
+written by knowledge-graph/neo4j/snapshot_export.py, without a database.
+
+The SAMPLES relationships are kept as CSR arrays in both directions and the
+embedding / audio matrices as .npy files, all memory-mapped, so a
+neighbourhood lookup is two array slices. Each query constant is mapped to a
+handler below that reproduces its Cypher semantics (including DESC putting
+nulls first); a query without a handler raises instead of returning wrong rows.
+
+    KG_SNAPSHOT=snapshot streamlit run Home.py
+"""
+import json
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import queries
+
+RANDOM_WALKS_PER_NODE = 800
+RANDOM_WALK_LENGTH = 4
+WALK_NEIGHBOURS_TOP_K = 200  # walk_scores.TOP_K
+
+
+def _desc_nulls_first(rows, key):
+    """Cypher's ORDER BY ... DESC: nulls first, then largest first."""
+    return sorted(rows, key=lambda r: (r[key] is None, r[key] if r[key] is not None else 0), reverse=True)
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path = Path(path)
+        with open(path / "manifest.json", "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        songs = feather.read_table(path / "songs.arrow", memory_map=True)
+        for column in songs.column_names:
+            setattr(self, column, songs.column(column).to_pylist())
+        artists = feather.read_table(path / "artists.arrow", memory_map=True)
+        self.artist_node_ids = set(artists.column("node_id").to_pylist())
+        self.summaries = dict(zip(artists.column("name").to_pylist(),
+                                  artists.column("wikipedia_summary").to_pylist()))
+        self.artist_node_id = dict(zip(artists.column("name").to_pylist(),
+                                       artists.column("node_id").to_pylist()))
+        # Snapshots exported before genre_flow.py / community_summary.py / community_layout.py lack these
+        self.genre_flow = (feather.read_table(path / "genre_flow.arrow", memory_map=True)
+                           if (path / "genre_flow.arrow").exists() else None)
+        self.communities = ({row["id"]: row for row in
+                             feather.read_table(path / "communities.arrow", memory_map=True).to_pylist()}
+                            if (path / "communities.arrow").exists() else {})
+        self.backbones = defaultdict(list)
+        if (path / "community_backbone.arrow").exists():
+            for row in feather.read_table(path / "community_backbone.arrow", memory_map=True).to_pylist():
+                self.backbones[row["community"]].append(row)
+
+        def load(name):
+            return np.load(path / f"{name}.npy", mmap_mode="r")
+
+        self.out_indptr, self.out_indices = load("samples_out.indptr"), load("samples_out.indices")
+        self.in_indptr, self.in_indices = load("samples_in.indptr"), load("samples_in.indices")
+        self.n2v = load("n2v")
+        self.audio_vec = load("audio_vec")
+        self.audio_features = load("audio_features")
+        self.feature_column = {name: i for i, name in enumerate(self.manifest["audio_features"])}
+        self.has_audio = ~np.isnan(self.audio_vec).any(axis=1)
+
+        self.row = {node_id: i for i, node_id in enumerate(self.node_id)}
+        self.by_id = {song_id: i for i, song_id in enumerate(self.id)}
+        self.by_title = defaultdict(list)
+        self.by_artist = defaultdict(list)
+        for i, (title, names) in enumerate(zip(self.title, self.artists)):
+            self.by_title[title].append(i)
+            for name in names:
+                self.by_artist[name].append(i)
+
+    def samples(self, i):
+        return self.out_indices[self.out_indptr[i]:self.out_indptr[i + 1]]
+
+    def sampled_by(self, i):
+        return self.in_indices[self.in_indptr[i]:self.in_indptr[i + 1]]
+
+    def out_degree(self, i):
+        return int(self.out_indptr[i + 1] - self.out_indptr[i])
+
+    def in_degree(self, i):
+        return int(self.in_indptr[i + 1] - self.in_indptr[i])
+
+    def incident(self, i):
+        """SAMPLES relationships touching song i as (source, target) pairs."""
+        return [(i, int(t)) for t in self.samples(i)] + [(int(s), i) for s in self.sampled_by(i)]
+
+    def vector(self, matrix, i):
+        v = matrix[i]
+        return None if np.isnan(v).any() else v.tolist()
+
+
+@lru_cache(maxsize=None)
+def load_snapshot(path):
+    return Snapshot(Path(path).resolve())
+
+
+# ──────────────────── ARTIST ────────────────────
+
+def _top(counter, column, limit=3):
+    return [{column: key, "cnt": cnt} for key, cnt in counter.most_common(limit)]
+
+
+def artist_summary(snap, p):
+    if p["artist"] not in snap.summaries:
+        return []
+    return [{"summary": snap.summaries[p["artist"]]}]
+
+
+def artist_top_genres(snap, p):
+    return _top(Counter(g for i in snap.by_artist.get(p["artist"], []) for g in snap.genres[i]), "genre")
+
+
+def artist_songs(snap, p):
+    return [{"name": snap.title[i], "id": snap.node_id[i], "year": snap.year[i]}
+            for i in snap.by_artist.get(p["artist"], []) if snap.year[i] is not None]
+
+
+def artist_sampled_by(snap, p):
+    others = {int(o) for i in snap.by_artist.get(p["artist"], []) for o in snap.sampled_by(i)}
+    return [{"cnt": len(others)}]
+
+
+def artist_samples(snap, p):
+    return [{"cnt": sum(snap.out_degree(i) for i in snap.by_artist.get(p["artist"], []))}]
+
+
+def artist_top_sampling_songs(snap, p):
+    counts = Counter()
+    for i in snap.by_artist.get(p["artist"], []):
+        if snap.out_degree(i):
+            counts[snap.title[i]] += snap.out_degree(i)
+    return [{"song": title, "cnt": cnt} for title, cnt in counts.most_common(3)]
+
+
+def artist_genres_sampled(snap, p):
+    return _top(Counter(g for i in snap.by_artist.get(p["artist"], [])
+                        for t in snap.samples(i) for g in snap.genres[t]), "genre")
+
+
+def artist_sampled_by_genres(snap, p):
+    return _top(Counter(g for i in snap.by_artist.get(p["artist"], [])
+                        for t in snap.sampled_by(i) for g in snap.genres[t]), "genre")
+
+
+def artist_network(snap, p):
+    name = p["artist"]
+    if name not in snap.artist_node_id:
+        return []
+    empty = {"s_id": None, "s_name": None, "song_artists": [], "s_release_date": None, "s_year": None,
+             "s_genres": []}
+    no_target = {"t_id": None, "t_name": None, "rel_type": None, "t_artists": [], "t_release_date": None,
+                 "t_year": None, "t_genres": []}
+    rows = []
+    songs = snap.by_artist.get(name) or [None]
+    for i in songs:
+        song = empty if i is None else {
+            "s_id": snap.node_id[i], "s_name": snap.title[i], "song_artists": snap.artists[i],
+            "s_release_date": snap.release_date[i], "s_year": snap.year[i], "s_genres": snap.genres[i],
+        }
+        targets = [] if i is None else snap.samples(i).tolist()
+        for t in targets or [None]:
+            target = no_target if t is None else {
+                "t_id": snap.node_id[t], "t_name": snap.title[t], "rel_type": "SAMPLES",
+                "t_artists": snap.artists[t], "t_release_date": snap.release_date[t], "t_year": snap.year[t],
+                "t_genres": snap.genres[t],
+            }
+            rows.append({"a_id": snap.artist_node_id[name], "a_name": name, **song, **target})
+            if len(rows) == 200:
+                return rows
+    return rows
+
+
+# ──────────────────── SONG ────────────────────
+
+def _chains(snap, i):
+    # (o)-[r1]-(m)-[r2]-(s) with r1 <> r2: o may be s itself through a pair of mutual samples
+    found = set()
+    for r2 in snap.incident(i):
+        m = r2[0] if r2[1] == i else r2[1]
+        for r1 in snap.incident(m):
+            if r1 != r2:
+                found.add(r1[0] if r1[1] == m else r1[1])
+    return len(found)
+
+
+def _neighbour_list(snap, neighbours):
+    rows = [{"name": snap.title[t], "artists": ", ".join(snap.artists[t]), "rd": snap.release_date[t]}
+            for t in neighbours.tolist()]
+    return _desc_nulls_first(rows, "rd")
+
+
+def _usage_over_time(snap, i):
+    by_year = defaultdict(list)
+    for o in snap.sampled_by(i):
+        if snap.year[o] is not None:
+            by_year[snap.year[o]].append(snap.title[o])
+    return [{"year": year, "n": len(titles), "songs": titles} for year, titles in sorted(by_year.items())]
+
+
+def song_profile(snap, p):
+    filters = p.get("artist_filters")
+    matches = [i for i in snap.by_title.get(p["title"], [])
+               if filters is None or any(a in snap.artists[i] for a in filters)]
+    if not matches:
+        return []
+    i = matches[0]
+    return [{
+        "song_id": snap.id[i], "title": snap.title[i], "artists": snap.artists[i], "genres": snap.genres[i],
+        "album": snap.album[i], "label": snap.record_label[i], "rd": snap.release_date[i], "year": snap.year[i],
+        "pagerank": snap.pagerank[i], "outgoing": snap.out_degree(i), "incoming": snap.in_degree(i),
+        "chains": snap.sample_chains[i] if hasattr(snap, "sample_chains") else _chains(snap, i),
+        "sampled": _neighbour_list(snap, snap.samples(i)),
+        "sampled_by": _neighbour_list(snap, snap.sampled_by(i)),
+        "usage": _usage_over_time(snap, i),
+    }]
+
+
+def _edge_rows(snap, edges):
+    return [{"src_id": snap.node_id[s], "src_title": snap.title[s], "src_artists": snap.artists[s],
+             "tgt_id": snap.node_id[t], "tgt_title": snap.title[t], "tgt_artists": snap.artists[t]}
+            for s, t in edges]
+
+
+def ego_roots(snap, p):
+    filters = p.get("artist_filters")
+    return [{"id": snap.node_id[i], "title": snap.title[i], "artists": snap.artists[i]}
+            for i in snap.by_title.get(p["title"], [])
+            if filters is None or all(a in snap.artists[i] for a in filters)]
+
+
+def ego_expand(snap, p):
+    rows = []
+    for node_id in p["frontier"]:
+        i = snap.row.get(node_id)
+        if i is None:
+            continue
+        for src, tgt in snap.incident(i)[:p["per_node"]]:
+            n = tgt if src == i else src
+            rows.append({"from_id": node_id, "src_id": snap.node_id[src], "tgt_id": snap.node_id[tgt],
+                         "id": snap.node_id[n], "title": snap.title[n], "artists": snap.artists[n]})
+    return rows
+
+
+# ──────────────────── IMPACTFUL SONGS / COMMUNITIES ────────────────────
+
+def top_pagerank(snap, p):
+    ranked = _desc_nulls_first([{"i": i, "pr": pr} for i, pr in enumerate(snap.pagerank) if pr is not None], "pr")
+    return [{"title": snap.title[r["i"]], "artists": snap.artists[r["i"]],
+             # count(*) over an OPTIONAL MATCH counts the null row of an unsampled song
+             "sampled_by": max(snap.in_degree(r["i"]), 1),
+             "pagerank": round(r["pr"], 2)}
+            for r in ranked[:50]]
+
+
+@lru_cache(maxsize=None)
+def _genre_flow(snap):
+    counts = Counter()
+    for original in range(len(snap.title)):
+        if not snap.genres[original]:
+            continue
+        for sampled in snap.sampled_by(original):
+            for g2 in snap.genres[sampled]:
+                for g1 in snap.genres[original]:
+                    counts[g1, g2] += 1
+    return [{"source_genre": g1, "target_genre": g2, "count": n} for (g1, g2), n in counts.most_common()]
+
+
+def genre_flow(snap, p):
+    if snap.genre_flow is None:
+        return []
+    return snap.genre_flow.slice(0, p["limit"]).to_pylist()
+
+
+def genre_flow_live(snap, p):
+    return _genre_flow(snap)
+
+
+def community_list(snap, p):
+    return [{"community": c["id"], "size": c["size"], "internal_edges": c["internal_edges"],
+             "outgoing_edges": c["outgoing_edges"], "incoming_edges": c["incoming_edges"],
+             "top_artists": c["top_artists"], "top_genres": c["top_genres"]}
+            for c in snap.communities.values() if c["size"] > 50]
+
+
+def _community(snap, community):
+    return [i for i, c in enumerate(snap.sampling_community) if c == community]
+
+
+def community_profile(snap, p):
+    community = snap.communities.get(p["community"])
+    if community is None:
+        return []
+    return [{column: community[f"{prop}_mean"] for column, prop in queries.COMMUNITY_PROFILE_FEATURES}]
+
+
+def community_top_songs(snap, p):
+    community = snap.communities.get(p["community"], {"top_songs": []})
+    rows = [snap.by_id[song_id] for song_id in community["top_songs"][:p["limit"]]]
+    return [{"title": snap.title[i], "artists": snap.artists[i], "genres": snap.genres[i],
+             "pagerank": snap.pagerank[i]} for i in rows]
+
+
+def community_backbone(snap, p):
+    return [{"source_id": snap.node_id[r["source"]], "source": snap.title[r["source"]],
+             "source_x": r["source_x"], "source_y": r["source_y"],
+             "target_id": snap.node_id[r["target"]], "target": snap.title[r["target"]],
+             "target_x": r["target_x"], "target_y": r["target_y"], "score": r["score"]}
+            for r in snap.backbones.get(p["community"], []) if r["rank"] <= p["limit"]]
+
+
+def community_edges(snap, p):
+    members = set(_community(snap, p["community"]))
+    rows = []
+    for s in sorted(members):
+        for t in snap.samples(s):
+            if int(t) in members:
+                rows.append({"source": snap.title[s], "target": snap.title[t]})
+                if len(rows) == p["limit"]:
+                    return rows
+    return rows
+
+
+# ──────────────────── RECOMMENDATIONS ────────────────────
+
+def search_catalogue(snap, p):
+    popularity = getattr(snap, "spotify_popularity", [None] * len(snap.title))
+    return [{"id": snap.node_id[i], "title": snap.title[i], "artists": snap.artists[i], "year": snap.year[i],
+             "pagerank": snap.pagerank[i], "spotify_popularity": popularity[i]}
+            for i in range(len(snap.title)) if snap.year[i] is not None]
+
+
+def co_samplers(snap, p):
+    title = p["title"]
+    names = set(p["artist_names"])
+    grouped = {}
+    for i in snap.by_title.get(title, []):
+        if not any(a.lower() in names for a in snap.artists[i]):
+            continue
+        for sampled in snap.samples(i):
+            for rec in snap.sampled_by(sampled):
+                if snap.title[rec] is None or snap.title[rec] == title:
+                    continue
+                row = grouped.setdefault((snap.title[rec], snap.title[sampled]), {
+                    "recommended_title": snap.title[rec], "artists": [],
+                    "sampled_source": snap.title[sampled], "sampled_artists": [],
+                    "spotify_popularity": None,
+                })
+                # Snapshots written before the Spotify backfill have no popularity column
+                popularity = snap.spotify_popularity[rec] if hasattr(snap, "spotify_popularity") else None
+                if popularity is not None:
+                    row["spotify_popularity"] = max(row["spotify_popularity"] or 0, popularity)
+                for key, artists in (("artists", snap.artists[rec]), ("sampled_artists", snap.artists[sampled])):
+                    row[key].extend(a for a in artists if a not in row[key])
+    return list(grouped.values())[:15]
+
+
+def walk_neighbours(snap, p):
+    """What walk_scores.py stores, computed for the one song: Σ P^k[stem, t] for k = 1..3."""
+    start = snap.row.get(p["stem"])
+    if start is None:
+        return []
+    visits = np.zeros(len(snap.node_id))
+    visits[start] = 1.0
+    total = np.zeros_like(visits)
+    for _ in range(RANDOM_WALK_LENGTH - 1):
+        current = np.flatnonzero(visits)
+        degree = snap.out_indptr[current + 1] - snap.out_indptr[current]
+        current, share = current[degree > 0], visits[current][degree > 0] / degree[degree > 0]
+        step = np.zeros_like(visits)
+        for i, weight in zip(current.tolist(), share.tolist()):
+            np.add.at(step, np.asarray(snap.out_indices[snap.out_indptr[i]:snap.out_indptr[i + 1]]), weight)
+        visits = step
+        total += visits
+    reached = np.flatnonzero(total)
+    top = reached[np.argsort(-total[reached], kind="stable")[:WALK_NEIGHBOURS_TOP_K]]
+    return [{"scored": True,
+             "neighbours": [{"id": snap.node_id[i], "hits": float(total[i])} for i in top.tolist()]}]
+
+
+def random_walks(snap, p):
+    """gds.randomWalk from one song: uniform steps along SAMPLES, a walk ends early at a dead end."""
+    start = snap.row.get(p["stem"])
+    if start is None:
+        return []
+    rng = np.random.default_rng(p.get("seed"))
+    current = np.full(RANDOM_WALKS_PER_NODE, start, dtype=np.int64)
+    visited = []
+    for _ in range(RANDOM_WALK_LENGTH - 1):
+        degree = snap.out_indptr[current + 1] - snap.out_indptr[current]
+        current = current[degree > 0]
+        if not len(current):
+            break
+        offset = (rng.random(len(current)) * degree[degree > 0]).astype(np.int64)
+        current = np.asarray(snap.out_indices[snap.out_indptr[current] + offset], dtype=np.int64)
+        visited.append(current)
+    if not visited:
+        return []
+    rows, hits = np.unique(np.concatenate(visited), return_counts=True)
+    return [{"id": snap.node_id[i], "hits": int(n)} for i, n in zip(rows.tolist(), hits.tolist())]
+
+
+def candidate_metadata(snap, p):
+    rows = []
+    for node_id in p["ids"]:
+        i = snap.row.get(node_id)
+        if i is None or not snap.artists[i] or snap.year[i] is None:
+            continue
+        rows.append({"id": node_id, "title": snap.title[i], "artist": snap.artists[i], "year": snap.year[i]})
+    return rows
+
+
+def song_features(snap, p):
+    rows = []
+    for i, node_id in enumerate(snap.node_id):
+        n2v, audio_vec = snap.vector(snap.n2v, i), snap.vector(snap.audio_vec, i)
+        if n2v is not None or audio_vec is not None:
+            # Snapshots keep n2v at full precision, like a graph quantisation.py has not run on
+            rows.append({"id": node_id, "n2v_i8": None, "n2v_scale": None, "n2v": n2v, "audio_vec": audio_vec})
+    return sorted(rows, key=lambda r: r["id"])
+
+
+def sound_alikes(snap, p):
+    i = snap.row.get(p["id"])
+    if i is None or not snap.has_audio[i]:
+        return []
+    candidates = np.flatnonzero(snap.has_audio)
+    # Vector index score for cosine similarity
+    scores = (1 + np.asarray(snap.audio_vec[candidates]) @ np.asarray(snap.audio_vec[i])) / 2
+    k = min(p["k"] + 1, len(candidates))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [{"title": snap.title[j], "artist": snap.artists[j], "year": snap.year[j], "score": float(s)}
+            for j, s in zip(candidates[top].tolist(), scores[top].tolist()) if j != i]
+
+
+def sampling_tree(snap, p):
+    i = snap.row.get(p["id"])
+    if i is None:
+        return []
+    # A relationship is on a path of at most 3 hops iff its source is at most 2 hops down
+    reached = {i}
+    frontier = [i]
+    for _ in range(2):
+        frontier = [t for t in dict.fromkeys(t for s in frontier for t in snap.samples(s).tolist())
+                    if t not in reached]
+        reached.update(frontier)
+    edges = {(s, int(t)) for s in reached for t in snap.samples(s)}
+    return _edge_rows(snap, edges)
+
+
+HANDLERS = {
+    queries.ARTIST_SUMMARY: artist_summary,
+    queries.ARTIST_TOP_GENRES: artist_top_genres,
+    queries.ARTIST_SONGS: artist_songs,
+    queries.ARTIST_SAMPLED_BY: artist_sampled_by,
+    queries.ARTIST_SAMPLES: artist_samples,
+    queries.ARTIST_TOP_SAMPLING_SONGS: artist_top_sampling_songs,
+    queries.ARTIST_GENRES_SAMPLED: artist_genres_sampled,
+    queries.ARTIST_SAMPLED_BY_GENRES: artist_sampled_by_genres,
+    queries.ARTIST_NETWORK: artist_network,
+    queries.SONG_PROFILE: song_profile,
+    queries.EGO_ROOTS: ego_roots,
+    queries.EGO_EXPAND: ego_expand,
+    queries.TOP_PAGERANK: top_pagerank,
+    queries.GENRE_FLOW: genre_flow,
+    queries.GENRE_FLOW_LIVE: genre_flow_live,
+    queries.COMMUNITY_LIST: community_list,
+    queries.COMMUNITY_PROFILE: community_profile,
+    queries.COMMUNITY_TOP_SONGS: community_top_songs,
+    queries.COMMUNITY_BACKBONE: community_backbone,
+    queries.COMMUNITY_EDGES: community_edges,
+    queries.SEARCH_CATALOGUE: search_catalogue,
+    queries.CO_SAMPLERS: co_samplers,
+    queries.WALK_NEIGHBOURS: walk_neighbours,
+    queries.RANDOM_WALKS: random_walks,
+    queries.CANDIDATE_METADATA: candidate_metadata,
+    queries.SONG_FEATURES: song_features,
+    queries.SOUND_ALIKES: sound_alikes,
+    queries.SAMPLING_TREE: sampling_tree,
+}
+
+
+class SnapshotConnection:
+    """Drop-in for neo4j_utils.Neo4jConnection over a snapshot directory."""
+
+    def __init__(self, path):
+        self.snapshot = load_snapshot(str(path))
+
+    def close(self):
+        pass
+
+    def query(self, query, parameters=None):
+        handler = HANDLERS.get(query)
+        if handler is None:
+            raise ValueError("Query not served by the snapshot backend; add it to queries.py and HANDLERS:\n"
+                             + query)
+        return handler(self.snapshot, parameters or {})
+
+    def to_df(self, query, parameters=None):
+        return pd.DataFrame(self.query(query, parameters))
+
+    def to_arrow(self, query, parameters=None):
+        return pa.Table.from_pylist(self.query(query, parameters))
@@ -0,0 +1,48 @@
+# song_profile.py
+"""Everything the song page shows about one song, fetched with a single query."""
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+import queries
+
+
+@dataclass
+class SongProfile:
+    song_id: str
+    title: str
+    artists: list = field(default_factory=list)
+    genres: list = field(default_factory=list)
+    album: str = None
+    label: str = None
+    release_date: str = None
+    year: int = None
+    pagerank: float = None
+    outgoing: int = 0
+    incoming: int = 0
+    chains: int = 0
+    # {name, artists, rd} dicts, newest first
+    sampled: list = field(default_factory=list)
+    sampled_by: list = field(default_factory=list)
+    # {year, n, songs} dicts, one per year the song was sampled in
+    usage: list = field(default_factory=list)
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            song_id=record["song_id"], title=record["title"],
+            artists=record["artists"], genres=record["genres"],
+            album=record["album"], label=record["label"],
+            release_date=record["rd"], year=record["year"], pagerank=record["pagerank"],
+            outgoing=record["outgoing"], incoming=record["incoming"], chains=record["chains"],
+            sampled=record["sampled"], sampled_by=record["sampled_by"], usage=record["usage"],
+        )
+
+    def usage_df(self):
+        return pd.DataFrame(self.usage, columns=["year", "n", "songs"])
+
+
+def fetch_song_profile(conn, title, artist_filters=None):
+    """The profile of the first song with this title (by one of `artist_filters`), or None."""
+    records = conn.query(queries.SONG_PROFILE, {"title": title, "artist_filters": artist_filters})
+    return SongProfile.from_record(records[0]) if records else None
@@ -0,0 +1,211 @@
+# spotify_popularity.py
+"""
+Spotify popularity for songs, looked up once and shared.
+
+Lookups go, in order, to the `spotify_popularity` property the backfill job
+below writes onto Song nodes (the pages get it with their queries), then to a
+SQLite cache shared by every session and process and kept across restarts
+(entries expire after TTL_DAYS), and only then to the Spotify API, with all
+the misses of a page fetched concurrently. A song Spotify does not know is
+cached too, as None, so it is not searched again on every view.
+
+With no Spotify credentials (or KG_SPOTIFY_OFFLINE=1) StubSpotify answers
+instead, so the pages work offline. Its answers are never cached (the cache
+is still read), and the backfill refuses to run without real credentials, so
+an offline run cannot hide real popularity behind "no match".
+
+    python spotify_popularity.py --backfill           # write spotify_popularity onto the songs
+    python spotify_popularity.py --backfill --limit 500
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CACHE_ENV = "KG_SPOTIFY_CACHE"
+CACHE_PATH = Path(os.environ.get(CACHE_ENV, Path(__file__).resolve().parent / ".cache" / "spotify_popularity.sqlite"))
+OFFLINE_ENV = "KG_SPOTIFY_OFFLINE"
+TTL_DAYS = 30
+WORKERS = 8
+BACKFILL_BATCH = 200
+
+songs_to_backfill = """
+MATCH (s:Song)
+WHERE s.title IS NOT NULL
+  AND (s.spotify_popularity_at IS NULL OR s.spotify_popularity_at < datetime() - duration({days: $ttl_days}))
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+WITH s, collect(a.name) AS artists
+RETURN s.id AS id, s.title AS title, artists[0] AS artist
+"""
+
+popularity_write = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.id})
+SET s.spotify_popularity = row.popularity, s.spotify_popularity_at = datetime()
+"""
+
+
+def search_query(title, artist=None):
+    query = f"track:{title}"
+    if artist and artist != "Unknown":
+        query += f" artist:{artist}"
+    return query
+
+
+class StubSpotify:
+    """Stands in for spotipy.Spotify offline: knows only the queries in `popularity`."""
+
+    def __init__(self, popularity=None):
+        self.popularity = popularity or {}
+
+    def search(self, q, type="track", limit=1):
+        if q not in self.popularity:
+            return {"tracks": {"items": []}}
+        return {"tracks": {"items": [{"popularity": self.popularity[q]}]}}
+
+
+class PopularityCache:
+    """Search query -> popularity or None, with the time it was fetched; safe to share across threads."""
+
+    def __init__(self, path=CACHE_PATH, ttl_days=TTL_DAYS):
+        self.ttl = ttl_days * 86400
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS popularity (
+                    query TEXT PRIMARY KEY, popularity INTEGER, fetched_at REAL NOT NULL)
+            """)
+
+    def get_many(self, queries):
+        """{query: popularity} for the queries cached and not expired."""
+        found = {}
+        queries = list(queries)
+        with self._lock:
+            for i in range(0, len(queries), 500):
+                chunk = queries[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT query, popularity FROM popularity WHERE fetched_at > ? "
+                    f"AND query IN ({','.join('?' * len(chunk))})", [time.time() - self.ttl, *chunk])
+                found.update(rows)
+        return found
+
+    def put_many(self, results):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO popularity VALUES (?, ?, ?)",
+                                 [(query, popularity, now) for query, popularity in results.items()])
+
+
+class PopularityService:
+    def __init__(self, client, cache, workers=WORKERS, persist=None):
+        self.client = client
+        self.cache = cache
+        self.workers = workers
+        # Only real Spotify answers are written to the cache (and by the backfill, to the graph)
+        self.persist = not isinstance(client, StubSpotify) if persist is None else persist
+
+    def _fetch(self, query):
+        """(query, popularity or None, error message or None)."""
+        try:
+            items = self.client.search(q=query, type="track", limit=1).get("tracks", {}).get("items", [])
+        except Exception as e:
+            return query, None, str(e)
+        return query, items[0]["popularity"] if items else None, None
+
+    def resolve(self, queries):
+        """
+        {search query: popularity or None} from the cache, the misses fetched
+        concurrently, and the messages of the lookups that failed (left out,
+        not cached, so the next call retries them).
+        """
+        found = self.cache.get_many(set(queries))
+        missing = sorted(set(queries) - set(found))
+        errors = []
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                fetched = list(pool.map(self._fetch, missing))
+            fresh = {query: popularity for query, popularity, error in fetched if error is None}
+            errors = [error for _, _, error in fetched if error is not None]
+            if self.persist:
+                self.cache.put_many(fresh)
+            found.update(fresh)
+        return found, errors
+
+    def lookup_many(self, songs):
+        """Popularity (or None) of each (title, artist) pair, in order, and the failed lookups' messages."""
+        queries = [search_query(title, artist) for title, artist in songs]
+        found, errors = self.resolve(queries)
+        return [found.get(query) for query in queries], errors
+
+    def lookup(self, title, artist=None):
+        popularities, errors = self.lookup_many([(title, artist)])
+        return popularities[0], errors
+
+
+def spotify_client(client_id=None, client_secret=None):
+    """spotipy.Spotify with these credentials, or StubSpotify without them or when offline."""
+    if os.environ.get(OFFLINE_ENV) or not (client_id and client_secret):
+        return StubSpotify()
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
+
+    auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
+    return spotipy.Spotify(auth_manager=auth_manager, requests_timeout=10, retries=3)
+
+
+# ──────────────────── BACKFILL ────────────────────
+
+def backfill(driver, service, limit=None, ttl_days=TTL_DAYS, batch_size=BACKFILL_BATCH):
+    """Look up every song without a fresh spotify_popularity and store it on the node."""
+    if not service.persist:
+        raise ValueError("the backfill needs real Spotify credentials, not the offline stub")
+    query = songs_to_backfill if limit is None else songs_to_backfill + "LIMIT $limit\n"
+    with driver.session() as session:
+        songs = session.run(query, ttl_days=ttl_days, limit=limit).data()
+    start = time.perf_counter()
+    failed = 0
+    for i in range(0, len(songs), batch_size):
+        batch = songs[i:i + batch_size]
+        queries = [search_query(s["title"], s["artist"]) for s in batch]
+        found, errors = service.resolve(queries)
+        failed += len(errors)
+        # Songs whose lookup failed get no timestamp, so the next run retries them
+        rows = [{"id": s["id"], "popularity": found[q]} for s, q in zip(batch, queries) if q in found]
+        with driver.session() as session:
+            session.execute_write(lambda tx: tx.run(popularity_write, rows=rows).consume())
+        print(f"   {min(i + batch_size, len(songs)):,}/{len(songs):,} songs")
+    print(f"✅ Spotify popularity for {len(songs):,} songs in {time.perf_counter() - start:.1f}s "
+          f"({failed} failed lookups)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spotify popularity backfill.")
+    parser.add_argument("--backfill", action="store_true", help="write spotify_popularity onto the songs")
+    parser.add_argument("--limit", type=int, help="at most this many songs")
+    parser.add_argument("--ttl-days", type=int, default=TTL_DAYS, help="refresh values older than this")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.print_help()
+        return
+
+    from neo4j import GraphDatabase
+
+    from neo4j_utils import NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER
+
+    client = spotify_client(os.environ.get("SPOTIFY_CLIENT_ID"), os.environ.get("SPOTIFY_CLIENT_SECRET"))
+    if isinstance(client, StubSpotify):
+        parser.error(f"set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET (and unset {OFFLINE_ENV}) to backfill")
+    service = PopularityService(client, PopularityCache(ttl_days=args.ttl_days))
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    backfill(driver, service, args.limit, args.ttl_days)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
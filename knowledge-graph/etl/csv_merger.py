@@ -1,28 +1,54 @@
 import pandas as pd
 
-csv_files = [
-    "../neo4j/data/import/musicbrainz_summaries_2024.csv",
-    "../neo4j/data/import/musicbrainz_summaries_2023.csv",
-    "../neo4j/data/import/musicbrainz_summaries_2022.csv"
-]
-
-df_all = pd.concat([pd.read_csv(f) for f in csv_files], ignore_index=True)
-
-df_all.drop_duplicates(subset=['artist_name'], keep="first", inplace=True)
-
-# Genre clean up
-# df_all = df_all[~(
-#     df_all['genre'].str.startswith('_') |
-#     df_all['genre'].str.contains(';') |
-#     df_all['genre'].str.match(r'^\d') |
-#     (df_all['genre'].str.len() <= 2) |
-#     (df_all['genre'].str.len() >= 20)
-# )]
-
-# Save final result
-df_all.to_csv("../neo4j/data/import/musicbrainz_summaries_all.csv", index=False)
-
-# df = pd.read_csv('../neo4j/data/import/musicbrainz_genres_all.csv')
-# df['genre'] = df['genre'].str.strip().str.title()
-#
-# df.to_csv('../neo4j/data/import/musicbrainz_genres_all.csv', index=False)
+from delta import merge_with_deltas
+
+
+def clean_genres(df):
+    """Drop malformed genre tags and normalise the rest to title case."""
+    df = df[~(
+        df['genre'].str.startswith('_') |
+        df['genre'].str.contains(';') |
+        df['genre'].str.match(r'^\d') |
+        (df['genre'].str.len() <= 2) |
+        (df['genre'].str.len() >= 20)
+    )].copy()
+    df['genre'] = df['genre'].str.strip().str.title()
+    return df
+
+
+def merge_csv_files(csv_files, output_file, subset=None, clean=None, deltas=True):
+    """
+    Concatenate yearly CSVs (newest first), de-duplicate and write the `_all` file; returns its row count.
+
+    With `deltas`, rows are keyed by `subset` (or the whole row) and
+    insert/update/delete files are written next to the output, see delta.py.
+    """
+    def prepare(df):
+        # Clean first, so rows that only differ before cleaning collapse into one
+        if clean is not None:
+            df = clean(df)
+        return df.drop_duplicates(subset=subset, keep="first")
+
+    if deltas:
+        rows = merge_with_deltas(csv_files, output_file, subset, prepare)
+    else:
+        df_all = prepare(pd.concat([pd.read_csv(f) for f in csv_files], ignore_index=True))
+        # Save final result
+        df_all.to_csv(output_file, index=False)
+        rows = len(df_all)
+
+    print(f"✅ Merged {len(csv_files)} files into {output_file} ({rows} rows)")
+    return rows
+
+
+if __name__ == "__main__":
+    csv_files = [
+        "../neo4j/data/import/musicbrainz_summaries_2024.csv",
+        "../neo4j/data/import/musicbrainz_summaries_2023.csv",
+        "../neo4j/data/import/musicbrainz_summaries_2022.csv"
+    ]
+
+    merge_csv_files(csv_files, "../neo4j/data/import/musicbrainz_summaries_all.csv", subset=['artist_name'])
+
+    # Genre clean up (opt-in, `python pipeline.py --clean-genres`)
+    # merge_csv_files([...], "../neo4j/data/import/musicbrainz_genres_all.csv", clean=clean_genres)
@@ -0,0 +1,215 @@
+"""
+Keyed snapshots and insert/update/delete delta files for the CSV mergers.
+
+Next to every merged file (e.g. `whosampled_tracks_all.csv`) we keep:
+
+    whosampled_tracks_all.snapshot.csv   key column(s) + a content hash per row
+    whosampled_tracks_all.snapshot.json  the source files (size, mtime, sha256) and row count of the last merge
+    whosampled_tracks_all.inserts.csv    rows whose key is new
+    whosampled_tracks_all.updates.csv    rows whose key existed but whose content changed
+    whosampled_tracks_all.deletes.csv    key columns of rows that disappeared
+
+When the only change is one or more new yearly files added in front of
+(newer, taking priority) or behind (older) the previous sources, only those
+files are read and diffed, and their new rows are appended to the merged
+file and the snapshot; the merged file is only rewritten if they change rows
+it already has. Otherwise the whole merge is recomputed and compared with the
+snapshot. Sources are re-hashed only when their size or mtime changed.
+
+Every CSV is read as text (no NaN or number parsing), so a value hashes the
+same whichever other files it is read with.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+DELTA_KINDS = ("inserts", "updates", "deletes")
+HASH_COLUMN = "row_hash"
+
+
+def _sibling(output_file, suffix):
+    output_file = Path(output_file)
+    return output_file.with_name(output_file.stem + suffix)
+
+
+def delta_paths(output_file):
+    return {kind: _sibling(output_file, f".{kind}.csv") for kind in DELTA_KINDS}
+
+
+def snapshot_paths(output_file):
+    return _sibling(output_file, ".snapshot.csv"), _sibling(output_file, ".snapshot.json")
+
+
+def output_files(output_file):
+    """Every file a delta-tracked merge writes besides the merged file itself."""
+    return list(delta_paths(output_file).values()) + list(snapshot_paths(output_file))
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_source(path, **kwargs):
+    """A CSV as text: '1999' stays '1999' (not 1999.0 next to a NaN) and empty cells stay ''."""
+    return pd.read_csv(path, dtype=str, keep_default_na=False, **kwargs)
+
+
+def source_entries(csv_files, previous):
+    """Path, size, mtime and sha256 of every source; the hash is reused if size and mtime are unchanged."""
+    known = {p["path"]: p for p in previous}
+    sources = []
+    for f in csv_files:
+        path, stat = str(Path(f).resolve()), Path(f).stat()
+        entry = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        old = known.get(path)
+        if old and old.get("size") == stat.st_size and old.get("mtime_ns") == stat.st_mtime_ns:
+            entry["sha256"] = old["sha256"]
+        else:
+            entry["sha256"] = file_sha256(f)
+        sources.append(entry)
+    return sources
+
+
+def row_hashes(df, key):
+    """64-bit content hash per row, indexed by key. Read the rows with read_source so equal text hashes equally."""
+    hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    return pd.Series(hashes.to_numpy(), index=pd.MultiIndex.from_frame(df[key].astype(str)), name=HASH_COLUMN)
+
+
+def load_snapshot(output_file, key):
+    """Key -> hash of the merged rows (the last entry per key, as appends add to the end), and the manifest."""
+    rows_path, manifest_path = snapshot_paths(output_file)
+    if not rows_path.exists() or not manifest_path.exists():
+        return None, {"sources": []}
+    snapshot = read_source(rows_path).drop_duplicates(subset=key, keep="last")
+    hashes = pd.Series(snapshot[HASH_COLUMN].astype("uint64").to_numpy(),
+                       index=pd.MultiIndex.from_frame(snapshot[key]), name=HASH_COLUMN)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return hashes, json.load(f)
+
+
+def save_snapshot(output_file, hashes, sources, rows, append=False):
+    rows_path, manifest_path = snapshot_paths(output_file)
+    if append:
+        hashes.reset_index().to_csv(rows_path, mode="a", header=False, index=False)
+    else:
+        hashes.reset_index().to_csv(rows_path, index=False)
+    tmp = manifest_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"sources": sources, "rows": rows}, f, indent=2)
+    tmp.replace(manifest_path)
+
+
+def added_sources(previous, current):
+    """
+    (front, back): the files before and after the previous source list, if
+    the previous sources are unchanged and contiguous in `current`; None otherwise.
+    """
+    if not previous or len(current) < len(previous):
+        return None
+    paths = [s["path"] for s in current]
+    first = paths.index(previous[0]["path"]) if previous[0]["path"] in paths else -1
+    if first < 0:
+        return None
+    middle = current[first:first + len(previous)]
+    if [s["path"] for s in middle] != [p["path"] for p in previous]:
+        return None
+    if any(s["sha256"] != p["sha256"] for s, p in zip(middle, previous)):
+        return None
+    return current[:first], current[first + len(previous):]
+
+
+def write_deltas(output_file, inserts, updates, deletes):
+    paths = delta_paths(output_file)
+    inserts.to_csv(paths["inserts"], index=False)
+    updates.to_csv(paths["updates"], index=False)
+    deletes.to_csv(paths["deletes"], index=False)
+    print(f"   Δ {Path(output_file).name}: +{len(inserts)} inserts, ~{len(updates)} updates, "
+          f"-{len(deletes)} deletes")
+
+
+def _empty_snapshot(key):
+    return pd.Series([], index=pd.MultiIndex.from_tuples([], names=key), dtype="uint64", name=HASH_COLUMN)
+
+
+def _diff(changed, snapshot, key):
+    """Hashes of `changed` and masks of its rows whose key is new / whose content differs from the snapshot."""
+    hashes = row_hashes(changed, key)
+    known = hashes.index.isin(snapshot.index)
+    modified = known.copy()
+    modified[known] = snapshot.reindex(hashes.index[known]).to_numpy() != hashes[known].to_numpy()
+    return hashes, ~known, modified
+
+
+def _read_all(paths, prepare):
+    return prepare(pd.concat([read_source(p) for p in paths], ignore_index=True))
+
+
+def merge_with_deltas(csv_files, output_file, key, prepare):
+    """
+    Merge `csv_files` (earlier files take priority) into `output_file`, emit
+    delta files and return the number of merged rows.
+
+    `prepare` turns the concatenation of some yearly files into de-duplicated
+    rows (the merger's own drop/dedupe/clean logic). `key` names the columns
+    that identify a row; None means the whole row is the key.
+    """
+    if key is None:
+        key = list(read_source(csv_files[0], nrows=0).columns)
+    snapshot, manifest = load_snapshot(output_file, key)
+    sources = source_entries(csv_files, manifest["sources"])
+    added = None
+    if Path(output_file).exists() and "rows" in manifest:
+        added = added_sources(manifest["sources"], sources)
+
+    if added is not None:
+        front, back = added
+        if not front and not back:
+            print(f"✅ {Path(output_file).name} is up to date")
+            empty = read_source(output_file, nrows=0)
+            write_deltas(output_file, empty, empty, empty[key])
+            save_snapshot(output_file, snapshot.iloc[:0], sources, manifest["rows"], append=True)
+            return manifest["rows"]
+
+        # Only the new yearly files are read. Newer ones take priority over what we had...
+        changed = _read_all([s["path"] for s in front], prepare) if front else None
+        if back:
+            # ...older ones only add keys nobody had yet
+            older = _read_all([s["path"] for s in back], prepare)
+            taken = snapshot.index if changed is None else snapshot.index.append(row_hashes(changed, key).index)
+            older = older[~row_hashes(older, key).index.isin(taken)]
+            changed = older if changed is None else pd.concat([changed, older], ignore_index=True)
+
+        new_hashes, inserted, modified = _diff(changed, snapshot, key)
+        inserts, updates = changed[inserted], changed[modified]
+        deletes = pd.DataFrame(columns=key)
+        columns = list(read_source(output_file, nrows=0).columns)
+
+        if updates.empty and sorted(changed.columns) == sorted(columns):
+            # New keys only: append them, the merged file is not read
+            inserts[columns].to_csv(output_file, mode="a", header=False, index=False)
+            rows = manifest["rows"] + len(inserts)
+        else:
+            df_all = pd.concat([changed, read_source(output_file)], ignore_index=True)
+            df_all.drop_duplicates(subset=key, keep="first", inplace=True)
+            df_all.to_csv(output_file, index=False)
+            rows = len(df_all)
+        write_deltas(output_file, inserts, updates, deletes)
+        save_snapshot(output_file, new_hashes[inserted | modified], sources, rows, append=True)
+        return rows
+
+    df_all = _read_all(csv_files, prepare)
+    new_hashes, inserted, modified = _diff(df_all, _empty_snapshot(key) if snapshot is None else snapshot, key)
+    deletes = pd.DataFrame(columns=key) if snapshot is None else \
+        snapshot.index[~snapshot.index.isin(new_hashes.index)].to_frame(index=False)
+
+    df_all.to_csv(output_file, index=False)
+    write_deltas(output_file, df_all[inserted], df_all[modified], deletes)
+    save_snapshot(output_file, new_hashes, sources, len(df_all))
+    return len(df_all)
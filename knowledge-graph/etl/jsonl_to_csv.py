@@ -72,6 +72,7 @@ def relationships_jsonl_to_csv(jsonl_path, csv_path):
 
 
 # Example usage
-# tracks_jsonl_to_csv("../../data/processed/whosampled_tracks_2022.jsonl", "../neo4j/data/import/whosampled_tracks_2022.csv")
-relationships_jsonl_to_csv( "../../data/processed/whosampled_relationships_2022.jsonl",
-                            "../neo4j/data/import/whosampled_relationships_2022.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    # tracks_jsonl_to_csv("../../data/processed/whosampled_tracks_2022.jsonl", "../neo4j/data/import/whosampled_tracks_2022.csv")
+    relationships_jsonl_to_csv( "../../data/processed/whosampled_relationships_2022.jsonl",
+                                "../neo4j/data/import/whosampled_relationships_2022.csv")
@@ -1,26 +1,43 @@
 import pandas as pd
 
-csv_files = [
-    "../../data/processed/acousticbrainz_2022.csv",
-    "../../data/processed/acousticbrainz_2023.csv",
-    "../../data/processed/acousticbrainz_2024.csv"
-]
-
-df_all = pd.concat([pd.read_csv(f) for f in csv_files], ignore_index=True)
+from delta import merge_with_deltas
 
-drop_columns = [
+DROP_COLUMNS = [
     "voice_instrumental_instrumental",
     "tonal_atonal_atonal",
     "timbre_dark"
 ]
 
-drop_columns += [col for col in df_all.columns if col.startswith("gender_")]
 
-# Drop safely (only existing columns)
-df_all.drop(columns=[col for col in drop_columns if col in df_all.columns], inplace=True)
+def merge_audio_features(csv_files, output_file, deltas=True):
+    """Concatenate yearly AcousticBrainz feature CSVs into the single import file; returns its row count."""
+    def prepare(df):
+        drop_columns = DROP_COLUMNS + [col for col in df.columns if col.startswith("gender_")]
+
+        # Drop safely (only existing columns)
+        df = df.drop(columns=[col for col in drop_columns if col in df.columns])
+
+        # Drop duplicates based on 'whosampled_id'
+        return df.drop_duplicates(subset="whosampled_id", keep="first")
+
+    if deltas:
+        # Keyed snapshot + insert/update/delete files next to the output, see delta.py
+        rows = merge_with_deltas(csv_files, output_file, ["whosampled_id"], prepare)
+    else:
+        df_all = prepare(pd.concat([pd.read_csv(f) for f in csv_files], ignore_index=True))
+        # Save final result
+        df_all.to_csv(output_file, index=False)
+        rows = len(df_all)
+
+    print(f"✅ Merged {len(csv_files)} audio feature files into {output_file} ({rows} rows)")
+    return rows
+
 
-# Drop duplicates based on 'whosampled_id'
-df_all.drop_duplicates(subset="whosampled_id", keep="first", inplace=True)
+if __name__ == "__main__":
+    csv_files = [
+        "../../data/processed/acousticbrainz_2022.csv",
+        "../../data/processed/acousticbrainz_2023.csv",
+        "../../data/processed/acousticbrainz_2024.csv"
+    ]
 
-# Save final result
-df_all.to_csv("../neo4j/data/import/acousticbrainz.csv", index=False)
+    merge_audio_features(csv_files, "../neo4j/data/import/acousticbrainz.csv")
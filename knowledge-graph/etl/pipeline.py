@@ -0,0 +1,347 @@
+"""
+Content-hashed pipeline runner for scrape → ETL → import.
+
+Every step declares the files it reads and writes. A step is skipped when the
+hashes of its inputs (and of the script that implements it) match the last
+successful run and its outputs are still the files that run produced.
+Independent branches (tracks, MusicBrainz metadata, audio features) run in
+parallel, and a per-step timing report is printed at the end.
+
+Usage (from knowledge-graph/etl):
+
+    python pipeline.py                # run whatever is out of date
+    python pipeline.py --dry-run      # only show what would run
+    python pipeline.py --force        # ignore the cache
+    python pipeline.py --no-import    # stop before loading into Neo4j
+    python pipeline.py --clean-genres # drop malformed genre tags and title-case the rest
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from csv_merger import clean_genres, merge_csv_files
+from delta import merge_with_deltas, output_files
+from merge_audio_features import merge_audio_features
+from audio_extract_features import extract_features
+from jsonl_to_csv import relationships_jsonl_to_csv, tracks_jsonl_to_csv
+from jsonl_to_csv_brainz import metadata_jsonl_to_csv
+
+ETL_DIR = Path(__file__).resolve().parent
+NEO4J_DIR = ETL_DIR.parent / "neo4j"
+IMPORT_DIR = NEO4J_DIR / "data" / "import"
+DATA_DIR = ETL_DIR.parent.parent / "data"
+SCRAPERS_DIR = ETL_DIR.parent.parent / "scrapers"
+CACHE_FILE = ETL_DIR / ".pipeline_cache.json"
+
+# Newest year first: the mergers keep the first occurrence of a key
+YEARS = (2024, 2023, 2022)
+# merge_audio_features.py has always read the oldest year first, so a song's earliest features win
+AUDIO_YEARS = tuple(reversed(YEARS))
+
+
+@dataclass
+class Step:
+    name: str
+    func: object
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    code: list = field(default_factory=list)
+
+    def signature(self):
+        """Everything that identifies the work a step does, apart from input contents."""
+        return json.dumps({
+            "func": f"{self.func.__module__}.{self.func.__qualname__}",
+            "args": [str(a) for a in self.args],
+            "kwargs": {k: getattr(v, "__qualname__", str(v)) for k, v in sorted(self.kwargs.items())},
+            "outputs": [str(p) for p in self.outputs],
+        }, sort_keys=True)
+
+
+def run_script(script):
+    """Run a standalone script from its own directory (the scripts use relative paths)."""
+    script = Path(script)
+    subprocess.run([sys.executable, script.name], cwd=script.parent, check=True)
+
+
+# ──────────────────── HASHING / CACHE ────────────────────
+
+class HashCache:
+    """sha256 of file contents, memoised on (size, mtime) so unchanged files are not re-read."""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    def digest(self, path):
+        path = Path(path)
+        stat = path.stat()
+        key = str(path)
+        cached = self.entries.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self.entries[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": h.hexdigest()}
+        return h.hexdigest()
+
+
+def load_cache():
+    if CACHE_FILE.exists():
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"steps": {}, "files": {}}
+
+
+def save_cache(cache):
+    tmp = CACHE_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp, CACHE_FILE)
+
+
+def step_key(step, hashes):
+    """Combined hash of a step's signature, its code and the contents of its inputs."""
+    h = hashlib.sha256(step.signature().encode())
+    for path in sorted(set(map(str, step.inputs + step.code))):
+        h.update(path.encode())
+        h.update(hashes.digest(path).encode())
+    return h.hexdigest()
+
+
+def is_fresh(step, key, record, hashes):
+    if record is None or record.get("key") != key:
+        return False
+    for path in step.outputs:
+        if not Path(path).exists() or hashes.digest(path) != record["outputs"].get(str(path)):
+            return False
+    return True
+
+
+# ──────────────────── DAG ────────────────────
+
+def _code(*funcs):
+    return [Path(inspect.getsourcefile(f)) for f in funcs]
+
+
+def conversion_steps():
+    """Raw JSONL → yearly CSV steps. Only those whose sources are present take part."""
+    steps = []
+    for year in YEARS:
+        steps.append(Step(
+            f"tracks_csv_{year}", tracks_jsonl_to_csv,
+            args=(DATA_DIR / "processed" / f"whosampled_tracks_{year}.jsonl",
+                  IMPORT_DIR / f"whosampled_tracks_{year}.csv"),
+            code=_code(tracks_jsonl_to_csv),
+        ))
+        steps.append(Step(
+            f"relationships_csv_{year}", relationships_jsonl_to_csv,
+            args=(DATA_DIR / "processed" / f"whosampled_relationships_{year}.jsonl",
+                  IMPORT_DIR / f"whosampled_relationships_{year}.csv"),
+            code=_code(relationships_jsonl_to_csv),
+        ))
+        steps.append(Step(
+            f"musicbrainz_csv_{year}", metadata_jsonl_to_csv,
+            args=(SCRAPERS_DIR / "musicbrainz" / f"musicbrainz_tracks_{year}.jsonl",
+                  IMPORT_DIR / f"musicbrainz_dates_{year}.csv",
+                  IMPORT_DIR / f"musicbrainz_genres_{year}.csv",
+                  IMPORT_DIR / f"musicbrainz_summaries_{year}.csv"),
+            code=_code(metadata_jsonl_to_csv),
+        ))
+        steps.append(Step(
+            f"audio_csv_{year}", extract_features,
+            args=(DATA_DIR / "raw" / f"acousticbrainz_{year}.jsonl",
+                  DATA_DIR / "processed" / f"acousticbrainz_{year}.csv"),
+            code=_code(extract_features),
+        ))
+
+    # The first argument is the source, the rest are outputs
+    for step in steps:
+        step.inputs = [step.args[0]]
+        step.outputs = list(step.args[1:])
+    return steps
+
+
+def build_dag(include_import=True, genre_cleanup=False):
+    steps = [s for s in conversion_steps() if all(Path(p).exists() for p in s.inputs)]
+    produced = {str(p) for s in steps for p in s.outputs}
+
+    def available(paths):
+        return [p for p in paths if Path(p).exists() or str(p) in produced]
+
+    def merge(name, kind, output, **kwargs):
+        inputs = available([IMPORT_DIR / f"{kind}_{year}.csv" for year in YEARS])
+        if len(inputs) < len(YEARS) and Path(output).exists():
+            # Rebuilding from a partial set of years would silently drop rows
+            print(f"⚠️  {name}: not every yearly file is available, keeping {Path(output).name} as-is")
+            inputs = []
+        code = _code(merge_csv_files, merge_with_deltas, *[v for v in kwargs.values() if callable(v)])
+        return Step(name, merge_csv_files, args=(inputs, output), kwargs=kwargs,
+                    inputs=inputs, outputs=[output] + output_files(output), code=code)
+
+    audio_inputs = available([DATA_DIR / "processed" / f"acousticbrainz_{year}.csv" for year in AUDIO_YEARS])
+    if len(audio_inputs) < len(AUDIO_YEARS) and (IMPORT_DIR / "acousticbrainz.csv").exists():
+        print("⚠️  merge_audio: not every yearly file is available, keeping acousticbrainz.csv as-is")
+        audio_inputs = []
+    merges = [
+        # Track branch
+        merge("merge_tracks", "whosampled_tracks", IMPORT_DIR / "whosampled_tracks_all.csv",
+              subset=["whosampled_id"]),
+        merge("merge_relationships", "whosampled_relationships",
+              IMPORT_DIR / "whosampled_relationships_all.csv"),
+        # MusicBrainz branch
+        merge("merge_dates", "musicbrainz_dates", IMPORT_DIR / "musicbrainz_dates_all.csv", subset=["id"]),
+        merge("merge_genres", "musicbrainz_genres", IMPORT_DIR / "musicbrainz_genres_all.csv",
+              **({"clean": clean_genres} if genre_cleanup else {})),
+        merge("merge_summaries", "musicbrainz_summaries", IMPORT_DIR / "musicbrainz_summaries_all.csv",
+              subset=["artist_name"]),
+        # Audio feature branch
+        Step("merge_audio", merge_audio_features,
+             args=(audio_inputs, IMPORT_DIR / "acousticbrainz.csv"),
+             inputs=audio_inputs,
+             outputs=[IMPORT_DIR / "acousticbrainz.csv"] + output_files(IMPORT_DIR / "acousticbrainz.csv"),
+             code=_code(merge_audio_features, merge_with_deltas)),
+    ]
+    # A merge without any (complete) set of yearly files has nothing to do
+    merges = [s for s in merges if s.inputs]
+    steps += merges
+
+    if include_import:
+        import_inputs = available([
+            IMPORT_DIR / "whosampled_tracks_all.csv",
+            IMPORT_DIR / "whosampled_relationships_all.csv",
+            IMPORT_DIR / "musicbrainz_dates_all.csv",
+            IMPORT_DIR / "musicbrainz_genres_all.csv",
+            IMPORT_DIR / "musicbrainz_summaries_all.csv",
+            IMPORT_DIR / "acousticbrainz.csv",
+        ] + [p for s in merges for p in s.outputs])
+        steps.append(Step("neo4j_import", run_script, args=(NEO4J_DIR / "data_import.py",),
+                          inputs=sorted(set(map(str, import_inputs))),
+                          code=[NEO4J_DIR / "data_import.py"]))
+    return steps
+
+
+def dependencies(steps):
+    """Map each step name to the names of the steps producing its inputs."""
+    producer = {str(p): s.name for s in steps for p in s.outputs}
+    return {s.name: {producer[str(p)] for p in s.inputs if str(p) in producer and producer[str(p)] != s.name}
+            for s in steps}
+
+
+# ──────────────────── RUNNER ────────────────────
+
+def _execute(step):
+    start = time.perf_counter()
+    step.func(*step.args, **step.kwargs)
+    return time.perf_counter() - start
+
+
+def run(steps, jobs=None, force=False, dry_run=False):
+    cache = load_cache()
+    hashes = HashCache(cache.get("files"))
+    deps = dependencies(steps)
+    by_name = {s.name: s for s in steps}
+    satisfied = ("ran", "cached", "would run")
+    report = {}
+
+    pending = set(by_name)
+    running = {}
+    wall_start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                upstream = [report.get(d, {}).get("status") for d in deps[name]]
+                if any(u in ("failed", "blocked") for u in upstream):
+                    pending.discard(name)
+                    report[name] = {"status": "blocked", "seconds": 0.0}
+                    continue
+                if not all(u in satisfied for u in upstream):
+                    continue
+
+                pending.discard(name)
+                step = by_name[name]
+                if dry_run and any(report[d]["status"] == "would run" for d in deps[name]):
+                    # Inputs are about to change, so the current hashes say nothing
+                    report[name] = {"status": "would run", "seconds": 0.0}
+                    continue
+                key = step_key(step, hashes)
+                if not force and is_fresh(step, key, cache["steps"].get(name), hashes):
+                    report[name] = {"status": "cached", "seconds": 0.0}
+                elif dry_run:
+                    report[name] = {"status": "would run", "seconds": 0.0}
+                else:
+                    running[pool.submit(_execute, step)] = (name, key)
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = running.pop(future)
+                step = by_name[name]
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    print(f"❌ {name} failed: {e}")
+                    report[name] = {"status": "failed", "seconds": 0.0}
+                    continue
+                # Outputs were rewritten, so they have to be hashed from scratch
+                for path in step.outputs:
+                    hashes.entries.pop(str(path), None)
+                cache["steps"][name] = {
+                    "key": key,
+                    "outputs": {str(p): hashes.digest(p) for p in step.outputs},
+                }
+                report[name] = {"status": "ran", "seconds": seconds}
+
+    cache["files"] = hashes.entries
+    if not dry_run:
+        save_cache(cache)
+
+    print_report(steps, report, time.perf_counter() - wall_start)
+    return report
+
+
+def print_report(steps, report, wall_seconds):
+    width = max(len(s.name) for s in steps)
+    print()
+    print(f"{'step'.ljust(width)}  {'status':<10} {'seconds':>8}")
+    print("-" * (width + 21))
+    for s in steps:
+        entry = report[s.name]
+        print(f"{s.name.ljust(width)}  {entry['status']:<10} {entry['seconds']:>8.2f}")
+    total = sum(e["seconds"] for e in report.values())
+    print("-" * (width + 21))
+    print(f"Step time {total:.2f}s, wall time {wall_seconds:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ETL → import pipeline, skipping up-to-date steps.")
+    parser.add_argument("--force", action="store_true", help="re-run every step regardless of the cache")
+    parser.add_argument("--dry-run", action="store_true", help="only report which steps are out of date")
+    parser.add_argument("--no-import", action="store_true", help="do not load the results into Neo4j")
+    parser.add_argument("--jobs", type=int, default=None, help="number of parallel worker processes")
+    parser.add_argument("--clean-genres", action="store_true",
+                        help="drop malformed genre tags and title-case the rest when merging genres")
+    args = parser.parse_args()
+
+    steps = build_dag(include_import=not args.no_import, genre_cleanup=args.clean_genres)
+    report = run(steps, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    if any(e["status"] in ("failed", "blocked") for e in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
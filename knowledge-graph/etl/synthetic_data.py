@@ -0,0 +1,326 @@
+"""
+Synthetic, power-law shaped dataset generator for scale testing.
+
+Writes files with the same layout and columns as the real pipeline so every
+stage (mergers, data_import.py, the website queries) can be benchmarked at a
+chosen multiple of the scraped corpus without network access:
+
+    <out>/import/whosampled_tracks_<year>.csv          yearly scrapes (overlapping, like the real ones)
+    <out>/import/whosampled_relationships_<year>.csv
+    <out>/import/musicbrainz_{dates,genres,summaries}_<year>.csv
+    <out>/processed/acousticbrainz_<year>.csv          raw ABZ columns, before merge_audio_features
+    <out>/import/*_all.csv, acousticbrainz.csv         merged, ready for import (unless --no-merge)
+
+Cardinalities default to what the scraped data has per track (≈0.67 artists,
+≈1.1 SAMPLES edges, ≈4 genres on 63% of songs) and sample in/out degree
+follow heavy-tailed distributions with a few hub songs.
+
+Usage:
+    python synthetic_data.py --scale 10 --out ../../data/synthetic/x10
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from csv_merger import clean_genres, merge_csv_files
+from merge_audio_features import merge_audio_features
+from pipeline import AUDIO_YEARS, YEARS
+
+BASE_TRACKS = 11_530
+
+ARTISTS_PER_TRACK = 0.67
+EDGES_PER_TRACK = 1.12
+SAMPLER_FRACTION = 0.7
+ALBUM_FRACTION = 0.82
+LABELS_PER_TRACK = 0.33
+BASE_GENRES = 1_448
+GENRE_FRACTION = 0.63
+GENRES_PER_SONG = 3.85
+DATE_FRACTION = 0.71
+SUMMARY_FRACTION = 0.55
+AUDIO_FRACTION = 0.6
+# Probability that a row also shows up in another year's scrape
+YEAR_OVERLAP = 0.3
+
+WORDS = (
+    "love night baby heart soul fire dream rain city gold street money summer "
+    "blue time light dance world funk life girl boy moon star sky rhythm king "
+    "queen wild road home dark fever magic party sugar honey thunder sweet"
+).split()
+SYLLABLES = "ka lo mi ra te su no ve li da zo ri ma ke tu bo ny sha el an".split()
+BASE_GENRE_NAMES = [
+    "Hip Hop", "Soul", "Funk", "Jazz", "Rock", "Pop", "Electronic", "Disco", "Reggae",
+    "Trap", "House", "Techno", "Blues", "Gospel", "Country", "Ambient", "Drill", "Boom Bap",
+]
+
+# AcousticBrainz high-level classifiers and their labels (as written by audio_extract_features.py)
+ABZ_CLASSIFIERS = {
+    "danceability": ["danceable", "not_danceable"],
+    "gender": ["female", "male"],
+    "genre_dortmund": ["alternative", "blues", "electronic", "folkcountry", "funksoulrnb",
+                       "jazz", "pop", "raphiphop", "rock"],
+    "genre_electronic": ["ambient", "dnb", "house", "techno", "trance"],
+    "genre_rosamerica": ["cla", "dan", "hip", "jaz", "pop", "rhy", "roc", "spe"],
+    "genre_tzanetakis": ["blu", "cla", "cou", "dis", "hip", "jaz", "met", "pop", "reg", "roc"],
+    "ismir04_rhythm": ["ChaChaCha", "Jive", "Quickstep", "Rumba-American", "Rumba-International",
+                       "Rumba-Misc", "Samba", "Tango", "VienneseWaltz", "Waltz"],
+    "mood_acoustic": ["acoustic", "not_acoustic"],
+    "mood_aggressive": ["aggressive", "not_aggressive"],
+    "mood_electronic": ["electronic", "not_electronic"],
+    "mood_happy": ["happy", "not_happy"],
+    "mood_party": ["party", "not_party"],
+    "mood_relaxed": ["relaxed", "not_relaxed"],
+    "mood_sad": ["sad", "not_sad"],
+    "timbre": ["bright", "dark"],
+    "tonal_atonal": ["atonal", "tonal"],
+    "voice_instrumental": ["instrumental", "voice"],
+}
+
+
+# ──────────────────── HELPERS ────────────────────
+
+def heavy_tail_weights(rng, n, exponent):
+    """Pareto weights, normalised: a handful of items get most of the mass."""
+    w = rng.pareto(exponent, size=n) + 1.0
+    return w / w.sum()
+
+
+def unique(names):
+    """Append a counter to repeated names so they can serve as keys."""
+    s = pd.Series(names)
+    dup = s.groupby(s).cumcount()
+    return np.where(dup > 0, s + " " + (dup + 1).astype(str), s)
+
+
+def pseudo_words(rng, n, min_syllables=2, max_syllables=3):
+    lengths = rng.integers(min_syllables, max_syllables + 1, size=n)
+    parts = rng.choice(SYLLABLES, size=(n, max_syllables))
+    return ["".join(p[:k]).capitalize() for p, k in zip(parts, lengths)]
+
+
+def titles(rng, n):
+    lengths = rng.integers(1, 4, size=n)
+    words = rng.choice(WORDS, size=(n, 3))
+    return [" ".join(w[:k]).title() for w, k in zip(words, lengths)]
+
+
+def slug(values):
+    return pd.Series(values).str.replace(r"[^A-Za-z0-9]+", "-", regex=True).str.strip("-")
+
+
+def timestamps(rng, n):
+    """WhoSampled style "m:ss;m:ss" sample positions."""
+    counts = rng.integers(1, 4, size=n)
+    secs = rng.integers(0, 300, size=(n, 3))
+    return [";".join(f"{t // 60}:{t % 60:02d}" for t in row[:k]) for row, k in zip(secs, counts)]
+
+
+def year_membership(rng, n):
+    """Boolean (n, len(YEARS)) matrix: which yearly scrapes each row appears in."""
+    member = rng.random((n, len(YEARS))) < YEAR_OVERLAP
+    member[np.arange(n), rng.integers(0, len(YEARS), size=n)] = True
+    return member
+
+
+# ──────────────────── ENTITIES ────────────────────
+
+def make_artists(rng, n_tracks):
+    n = max(1, int(n_tracks * ARTISTS_PER_TRACK))
+    first, last = pseudo_words(rng, n), pseudo_words(rng, n)
+    names = unique([f"{a} {b}" for a, b in zip(first, last)])
+    return pd.DataFrame({"name": names, "weight": heavy_tail_weights(rng, n, 1.3)})
+
+
+def make_genres(rng, scale):
+    n = max(len(BASE_GENRE_NAMES), int(BASE_GENRES * np.sqrt(scale)))
+    extra = n - len(BASE_GENRE_NAMES)
+    prefixes = pseudo_words(rng, extra, 1, 2)
+    bases = rng.choice(BASE_GENRE_NAMES[:8], size=extra)
+    names = unique(BASE_GENRE_NAMES + [f"{p} {b}" for p, b in zip(prefixes, bases)])
+    # Keep every name valid for clean_genres (3–19 chars, title case)
+    names = [name[:19].strip().title() for name in names]
+    names = unique(names)
+    # Genre popularity is very skewed: the top genre covers about half the songs
+    weights = 1.0 / np.arange(1, n + 1) ** 1.1
+    return pd.DataFrame({"name": names, "weight": weights / weights.sum()})
+
+
+def make_tracks(rng, n, artists):
+    artist_idx = rng.choice(len(artists), size=n, p=artists.weight.to_numpy())
+    extra = rng.poisson(0.36, size=n)
+    names = artists.name.to_numpy()
+    # Featured artists, drawn in one go and handed out per track
+    featured = np.split(names[rng.choice(len(names), size=extra.sum())], np.cumsum(extra)[:-1])
+    artist_lists = [";".join(dict.fromkeys([names[a], *f])) for a, f in zip(artist_idx, featured)]
+    title = titles(rng, n)
+    ids = unique((slug(names[artist_idx]) + "/" + slug(title)).to_numpy())
+    ids = pd.Series(ids).str.replace(" ", "-", regex=False)
+
+    n_albums = max(1, int(n * 0.63))
+    albums = np.array(unique(titles(rng, n_albums)), dtype=object)
+    album = albums[rng.choice(n_albums, size=n, p=heavy_tail_weights(rng, n_albums, 2.0))]
+    album[rng.random(n) > ALBUM_FRACTION] = None
+
+    n_labels = max(1, int(n * LABELS_PER_TRACK))
+    labels = np.array(unique(pseudo_words(rng, n_labels)), dtype=object)
+    label = labels[rng.choice(n_labels, size=n, p=heavy_tail_weights(rng, n_labels, 1.2))]
+
+    year = np.clip(np.round(rng.normal(2003, 14, size=n)), 1950, 2025)
+
+    return pd.DataFrame({
+        "title": title,
+        "artist": artist_lists,
+        "url": "https://www.whosampled.com/" + ids + "/",
+        "album": album,
+        "record_label": label,
+        "release_year": year,
+        "whosampled_id": ids,
+    })
+
+
+def make_relationships(rng, tracks):
+    n = len(tracks)
+    n_edges = int(n * EDGES_PER_TRACK)
+    samplers = rng.choice(n, size=max(1, int(n * SAMPLER_FRACTION)), replace=False)
+    source = samplers[rng.choice(len(samplers), size=n_edges, p=heavy_tail_weights(rng, len(samplers), 2.5))]
+
+    # Popular (and older) songs attract far more samples: a few breakbeats become hubs
+    age = tracks.release_year.to_numpy() - 1950
+    attractiveness = (rng.pareto(2.2, size=n) + 1.0) * np.exp(-age / 40)
+    target = rng.choice(n, size=n_edges, p=attractiveness / attractiveness.sum())
+
+    edges = pd.DataFrame({"s": source, "t": target})
+    edges = edges[edges.s != edges.t].drop_duplicates()
+    ids = tracks.whosampled_id.to_numpy()
+    return pd.DataFrame({
+        "source_id": ids[edges.s.to_numpy()],
+        "target_id": ids[edges.t.to_numpy()],
+        "timestamp_in_source": timestamps(rng, len(edges)),
+        "timestamp_in_target": timestamps(rng, len(edges)),
+    })
+
+
+def make_musicbrainz(rng, tracks, artists, genres):
+    n = len(tracks)
+    has_date = rng.random(n) < DATE_FRACTION
+    month, day = rng.integers(1, 13, size=n), rng.integers(1, 29, size=n)
+    dates = [f"{int(y)}-{m:02d}-{d:02d}" if ok else None
+             for y, m, d, ok in zip(tracks.release_year, month, day, has_date)]
+    df_dates = pd.DataFrame({"id": tracks.whosampled_id, "title": tracks.title, "release_date": dates})
+
+    tagged = np.flatnonzero(rng.random(n) < GENRE_FRACTION)
+    per_song = 1 + rng.poisson(GENRES_PER_SONG - 1, size=len(tagged))
+    song_idx = np.repeat(tagged, per_song)
+    genre_idx = rng.choice(len(genres), size=len(song_idx), p=genres.weight.to_numpy())
+    df_genres = pd.DataFrame({
+        "song_id": tracks.whosampled_id.to_numpy()[song_idx],
+        "genre": genres.name.to_numpy()[genre_idx],
+    }).drop_duplicates()
+
+    described = artists.name[rng.random(len(artists)) < SUMMARY_FRACTION].to_numpy()
+    lengths = np.clip(rng.lognormal(np.log(90), 0.6, size=len(described)).astype(int), 6, 400)
+    words = rng.choice(WORDS, size=lengths.sum())
+    cuts = np.cumsum(lengths)[:-1]
+    summaries = [f"{name} is an artist. " + " ".join(w).capitalize() + "."
+                 for name, w in zip(described, np.split(words, cuts))]
+    df_summaries = pd.DataFrame({"artist_name": described, "wikipedia_summary": summaries})
+    return df_dates, df_genres, df_summaries
+
+
+def make_audio_features(rng, tracks):
+    ids = tracks.whosampled_id[rng.random(len(tracks)) < AUDIO_FRACTION].to_numpy()
+    columns = {"whosampled_id": ids}
+    for classifier, labels in ABZ_CLASSIFIERS.items():
+        probs = rng.dirichlet(np.full(len(labels), 0.6), size=len(ids))
+        for j, label in enumerate(labels):
+            if not label.startswith("not_"):
+                columns[f"{classifier}_{label}"] = probs[:, j]
+    return pd.DataFrame(columns)
+
+
+# ──────────────────── OUTPUT ────────────────────
+
+def write_yearly(rng, df, directory, kind, member=None):
+    """Split rows over the yearly scrapes; repeated rows get a fresh scrape timestamp."""
+    if member is None:
+        member = year_membership(rng, len(df))
+    paths = []
+    for j, year in enumerate(YEARS):
+        part = df[member[:, j]]
+        if "timestamp" in df.columns:
+            part = part.assign(timestamp=pd.Timestamp(f"{year + 1}-03-24").isoformat())
+        path = directory / f"{kind}_{year}.csv"
+        part.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def generate(out_dir, scale=1.0, seed=0, merge=True, genre_cleanup=False):
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    import_dir, processed_dir = out_dir / "import", out_dir / "processed"
+    import_dir.mkdir(parents=True, exist_ok=True)
+    processed_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    n_tracks = max(10, int(BASE_TRACKS * scale))
+    artists = make_artists(rng, n_tracks)
+    genres = make_genres(rng, scale)
+    tracks = make_tracks(rng, n_tracks, artists)
+    tracks["timestamp"] = ""
+    relationships = make_relationships(rng, tracks)
+    dates, song_genres, summaries = make_musicbrainz(rng, tracks, artists, genres)
+    audio = make_audio_features(rng, tracks)
+
+    # Song-level files share one membership so a song's metadata is scraped with it
+    song_member = year_membership(rng, n_tracks)
+    row_of = pd.Series(np.arange(n_tracks), index=tracks.whosampled_id)
+    yearly = {
+        "whosampled_tracks": write_yearly(rng, tracks, import_dir, "whosampled_tracks", song_member),
+        "whosampled_relationships": write_yearly(rng, relationships, import_dir, "whosampled_relationships"),
+        "musicbrainz_dates": write_yearly(rng, dates, import_dir, "musicbrainz_dates", song_member),
+        "musicbrainz_genres": write_yearly(rng, song_genres, import_dir, "musicbrainz_genres",
+                                           song_member[row_of[song_genres.song_id].to_numpy()]),
+        "musicbrainz_summaries": write_yearly(rng, summaries, import_dir, "musicbrainz_summaries"),
+    }
+    audio_files = dict(zip(YEARS, write_yearly(rng, audio, processed_dir, "acousticbrainz",
+                                               song_member[row_of[audio.whosampled_id].to_numpy()])))
+
+    in_degree = relationships.target_id.value_counts()
+    out_degree = relationships.source_id.value_counts()
+    print(f"✅ Generated {n_tracks} tracks, {len(artists)} artists, {len(genres)} genres, "
+          f"{len(relationships)} SAMPLES edges (max in {in_degree.max()}, max out {out_degree.max()}), "
+          f"{len(audio)} audio feature rows in {time.perf_counter() - start:.1f}s")
+
+    if merge:
+        # The same merge rules as pipeline.py
+        subsets = {"whosampled_tracks": ["whosampled_id"], "musicbrainz_dates": ["id"],
+                   "musicbrainz_summaries": ["artist_name"]}
+        for kind, files in yearly.items():
+            merge_csv_files(files, import_dir / f"{kind}_all.csv", subset=subsets.get(kind),
+                            clean=clean_genres if kind == "musicbrainz_genres" and genre_cleanup else None,
+                            deltas=False)
+        merge_audio_features([audio_files[year] for year in AUDIO_YEARS], import_dir / "acousticbrainz.csv",
+                             deltas=False)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic WhoSampled/MusicBrainz/ABZ dataset.")
+    parser.add_argument("--scale", type=float, default=1.0, help="size relative to the scraped corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="output directory (default ../../data/synthetic/x<scale>)")
+    parser.add_argument("--no-merge", action="store_true", help="only write the yearly files")
+    parser.add_argument("--clean-genres", action="store_true",
+                        help="merge genres with clean_genres, as pipeline.py --clean-genres does")
+    args = parser.parse_args()
+
+    out = args.out or Path(__file__).resolve().parent.parent.parent / "data" / "synthetic" / f"x{args.scale:g}"
+    generate(out, scale=args.scale, seed=args.seed, merge=not args.no_merge, genre_cleanup=args.clean_genres)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Graph analytics job: PageRank, Leiden communities and node2vec embeddings.
+
+The Song/SAMPLES graph is projected once, with the relationships in both
+orientations (SAMPLES for the directed algorithms, SAMPLES_UNDIRECTED for
+Leiden). The algorithms run in mutate mode, adding their results to the
+in-memory graph, and everything is written back to the store in one
+nodeProperties.write pass. Memory is estimated up front so an undersized heap
+fails before any work is done. The embeddings are then replaced by their int8
+codes (quantisation.py), every community summarised in a Community node
+(community_summary.py) and its backbone samples ranked and laid out for the
+Communities page (community_layout.py).
+
+The projection is kept afterwards under the name `songGraph`, which the Sample
+Recommendations page uses for its random walks; it (and any leftover from an
+earlier or failed run) is dropped at the start of every run, so the job can be
+re-run at any time.
+
+    python analytics.py
+"""
+import time
+from dataclasses import dataclass, field
+
+GRAPH_NAME = "songGraph"
+# Older versions of data_import.py left this projection behind
+STALE_GRAPHS = [GRAPH_NAME, "sampling_graph"]
+
+NODE_PROJECTION = "Song"
+RELATIONSHIP_PROJECTION = {
+    "SAMPLES": {"orientation": "NATURAL"},
+    "SAMPLES_UNDIRECTED": {"type": "SAMPLES", "orientation": "UNDIRECTED"},
+}
+
+
+@dataclass
+class Algorithm:
+    name: str
+    procedure: str
+    config: dict = field(default_factory=dict)
+
+    @property
+    def mutate_property(self):
+        return self.config["mutateProperty"]
+
+
+ALGORITHMS = [
+    Algorithm("PageRank", "gds.pageRank", {
+        "relationshipTypes": ["SAMPLES"],
+        "mutateProperty": "pagerank",
+    }),
+    Algorithm("Leiden", "gds.leiden", {
+        "relationshipTypes": ["SAMPLES_UNDIRECTED"],
+        "mutateProperty": "sampling_community",
+    }),
+    Algorithm("node2vec", "gds.node2vec", {
+        "relationshipTypes": ["SAMPLES"],
+        "mutateProperty": "n2v",
+        "embeddingDimension": 128,
+        "iterations": 10,
+        "walkLength": 80,
+    }),
+]
+
+
+def drop_projections(session, names=STALE_GRAPHS):
+    for name in names:
+        # failIfMissing=false: dropping a graph that isn't there is not an error
+        session.run("CALL gds.graph.drop($name, false) YIELD graphName", name=name).consume()
+
+
+def free_heap(session):
+    return session.run("CALL gds.systemMonitor() YIELD freeHeap RETURN freeHeap").single()["freeHeap"]
+
+
+def estimate_projection(session):
+    return session.run("""
+        CALL gds.graph.project.estimate($nodes, $relationships)
+        YIELD requiredMemory, bytesMax
+        RETURN requiredMemory, bytesMax
+    """, nodes=NODE_PROJECTION, relationships=RELATIONSHIP_PROJECTION).single().data()
+
+
+def estimate_algorithm(session, algorithm):
+    return session.run(f"""
+        CALL {algorithm.procedure}.mutate.estimate($graph, $config)
+        YIELD requiredMemory, bytesMax
+        RETURN requiredMemory, bytesMax
+    """, graph=GRAPH_NAME, config=algorithm.config).single().data()
+
+
+def check_memory(estimate, available, what):
+    if estimate["bytesMax"] > available:
+        raise MemoryError(f"{what} needs up to {estimate['requiredMemory']} but only "
+                          f"{available / 2**20:,.0f} MiB of heap is free")
+
+
+def project(session):
+    return session.run("""
+        CALL gds.graph.project($graph, $nodes, $relationships)
+        YIELD nodeCount, relationshipCount, projectMillis
+        RETURN nodeCount, relationshipCount, projectMillis
+    """, graph=GRAPH_NAME, nodes=NODE_PROJECTION, relationships=RELATIONSHIP_PROJECTION).single().data()
+
+
+def mutate(session, algorithm):
+    return session.run(f"""
+        CALL {algorithm.procedure}.mutate($graph, $config)
+        YIELD computeMillis, mutateMillis, nodePropertiesWritten
+        RETURN computeMillis, mutateMillis, nodePropertiesWritten
+    """, graph=GRAPH_NAME, config=algorithm.config).single().data()
+
+
+def write_properties(session, properties):
+    return session.run("""
+        CALL gds.graph.nodeProperties.write($graph, $properties, ['Song'])
+        YIELD propertiesWritten, writeMillis
+        RETURN propertiesWritten, writeMillis
+    """, graph=GRAPH_NAME, properties=properties).single().data()
+
+
+def run_analytics(session, algorithms=ALGORITHMS):
+    """Run the whole job; returns a report row per step."""
+    report = []
+
+    def step(name, memory, func):
+        start = time.perf_counter()
+        result = func()
+        report.append({"step": name, "memory": memory, "seconds": time.perf_counter() - start, **result})
+        print(f"✅ {name} ({report[-1]['seconds']:.1f}s)")
+        return result
+
+    drop_projections(session)
+
+    estimate = estimate_projection(session)
+    check_memory(estimate, free_heap(session), "Projection")
+    step("Projection", estimate["requiredMemory"], lambda: project(session))
+
+    for algorithm in algorithms:
+        estimate = estimate_algorithm(session, algorithm)
+        check_memory(estimate, free_heap(session), algorithm.name)
+        step(algorithm.name, estimate["requiredMemory"], lambda: mutate(session, algorithm))
+
+    properties = [algorithm.mutate_property for algorithm in algorithms]
+    step("Write back", "", lambda: write_properties(session, properties))
+    if "n2v" in properties:
+        # quantisation imports data_import, which imports this module
+        from quantisation import write_quantised_n2v
+        step("Quantise", "", lambda: write_quantised_n2v(session))
+    if "sampling_community" in properties:
+        # community_summary and community_layout import data_import, which imports this module
+        from community_layout import write_community_layouts
+        from community_summary import write_community_summaries
+        step("Communities", "", lambda: write_community_summaries(session))
+        step("Layouts", "", lambda: write_community_layouts(session))
+
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    print()
+    print(f"{'step':<12}{'est. memory':>26}{'compute ms':>12}{'mutate/write ms':>17}{'wall s':>9}")
+    for row in report:
+        compute = row.get("computeMillis", row.get("projectMillis", ""))
+        io = row.get("mutateMillis", row.get("writeMillis", ""))
+        print(f"{row['step']:<12}{row['memory']:>26}{compute:>12}{io:>17}{row['seconds']:>9.1f}")
+
+
+def main():
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        run_analytics(session)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Offline bulk load: turn the ETL outputs into `neo4j-admin database import` files
+and build a fresh database from them.
+
+The MERGE path in data_import.py stays the way to apply incremental updates;
+this is for full rebuilds, which it does in minutes instead of hours.
+
+    python bulk_import.py export    # write data/import/bulk/*.csv
+    python bulk_import.py build     # export, stop Neo4j, neo4j-admin import, restart, constraints + analytics
+
+The exported graph is the same one data_import.py produces: same labels,
+relationship types and properties, with every node de-duplicated and given a
+stable integer ID (its rank in key order), typed headers, `:date` release
+dates and the 53 AcousticBrainz features both as separate floats and as one
+`audio_features:float[]` array, plus the normalised `audio_vec:float[]`.
+"""
+import argparse
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable
+
+from analytics import run_analytics
+from data_import import AUDIO_FEATURES, AUTH, IMPORT_DIR, URI, audio_vectors, create_constraints
+from genre_flow import write_genre_flow
+from graph_metrics import write_metrics
+from walk_scores import write_walk_scores
+
+NEO4J_DIR = Path(__file__).resolve().parent
+BULK_DIR = IMPORT_DIR / "bulk"
+# data/import is mounted here in the container (see docker-compose.yml)
+CONTAINER_BULK_DIR = "/var/lib/neo4j/import/bulk"
+ARRAY_DELIMITER = ";"
+
+
+def read_import_csv(filename, import_dir=IMPORT_DIR):
+    """Read an import file as strings, with empty fields as None (what LOAD CSV / data_import.py see)."""
+    df = pd.read_csv(import_dir / filename, dtype=str, keep_default_na=False)
+    return df.replace("", None)
+
+
+def integer_ids(keys):
+    """Stable integer ID per distinct key: its position in sorted order."""
+    keys = pd.Series(pd.unique(keys.dropna())).sort_values(ignore_index=True)
+    return pd.Series(np.arange(len(keys), dtype=np.int64), index=keys)
+
+
+def write(df, name, out_dir):
+    path = out_dir / f"{name}.csv"
+    df.to_csv(path, index=False)
+    print(f"   {name}: {len(df):,} rows")
+    return path
+
+
+def export(import_dir=IMPORT_DIR, out_dir=BULK_DIR):
+    """Write node and relationship files; returns {("nodes"|"relationships", label/type): path}."""
+    start = time.perf_counter()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files = {}
+
+    tracks = read_import_csv("whosampled_tracks_all.csv", import_dir)
+
+    # Song: MERGE on id, later rows overwrite earlier ones (SET)
+    songs = tracks.drop_duplicates("whosampled_id", keep="last").set_index("whosampled_id")
+    song_ids = integer_ids(tracks.whosampled_id)
+    song_nodes = pd.DataFrame({
+        ":ID(Song)": song_ids.to_numpy(),
+        "id": song_ids.index,
+        "title": songs.title.reindex(song_ids.index).to_numpy(),
+        "url": songs.url.reindex(song_ids.index).to_numpy(),
+        "record_label": songs.record_label.reindex(song_ids.index).to_numpy(),
+    })
+
+    dates = read_import_csv("musicbrainz_dates_all.csv", import_dir).dropna(subset=["release_date"])
+    dates = dates.drop_duplicates("id", keep="last").set_index("id").release_date
+    song_nodes["release_date:date"] = dates.reindex(song_ids.index).to_numpy()
+
+    audio_path = import_dir / "acousticbrainz.csv"
+    if audio_path.exists():
+        audio = read_import_csv("acousticbrainz.csv", import_dir)
+        audio = audio.drop_duplicates("whosampled_id", keep="last").set_index("whosampled_id")
+        values = audio[[column for _, column in AUDIO_FEATURES]].astype(float).reindex(song_ids.index)
+        for prop, column in AUDIO_FEATURES:
+            song_nodes[f"{prop}:float"] = values[column].to_numpy()
+        complete = values.notna().all(axis=1).to_numpy()
+        packed = values.to_numpy().astype(str)
+        song_nodes["audio_features:float[]"] = np.where(
+            complete, [ARRAY_DELIMITER.join(row) for row in packed], None)
+        vectors = audio_vectors(audio.reset_index()).set_index("whosampled_id").audio_vec
+        song_nodes["audio_vec:float[]"] = [
+            ARRAY_DELIMITER.join(map(str, v)) if isinstance(v, list) else None
+            for v in vectors.reindex(song_ids.index)]
+    files[("nodes", "Song")] = write(song_nodes, "songs", out_dir)
+
+    # Same rule as track_import: album, year and artists are only linked for rows with an album
+    linked = tracks[tracks.album.notna() & (tracks.album.str.strip() != "")]
+
+    album_ids = integer_ids(linked.album)
+    files[("nodes", "Album")] = write(
+        pd.DataFrame({":ID(Album)": album_ids.to_numpy(), "title": album_ids.index}), "albums", out_dir)
+    files[("relationships", "PART_OF_ALBUM")] = write(pd.DataFrame({
+        ":START_ID(Song)": song_ids[linked.whosampled_id].to_numpy(),
+        ":END_ID(Album)": album_ids[linked.album].to_numpy(),
+    }).drop_duplicates(), "part_of_album", out_dir)
+
+    years = linked.release_year.astype(float).astype(int)
+    year_ids = integer_ids(years)
+    files[("nodes", "Year")] = write(
+        pd.DataFrame({":ID(Year)": year_ids.to_numpy(), "value:int": year_ids.index}), "years", out_dir)
+    files[("relationships", "RELEASED_IN")] = write(pd.DataFrame({
+        ":START_ID(Song)": song_ids[linked.whosampled_id].to_numpy(),
+        ":END_ID(Year)": year_ids[years].to_numpy(),
+    }).drop_duplicates(), "released_in", out_dir)
+
+    song_artists = linked[["whosampled_id", "artist"]].dropna()
+    song_artists = song_artists.assign(artist=song_artists.artist.str.split(";")).explode("artist")
+    song_artists["artist"] = song_artists.artist.str.strip()
+    artist_ids = integer_ids(song_artists.artist)
+    summaries = read_import_csv("musicbrainz_summaries_all.csv", import_dir)
+    summaries = summaries.drop_duplicates("artist_name", keep="last").set_index("artist_name").wikipedia_summary
+    files[("nodes", "Artist")] = write(pd.DataFrame({
+        ":ID(Artist)": artist_ids.to_numpy(),
+        "name": artist_ids.index,
+        "wikipedia_summary": summaries.reindex(artist_ids.index).to_numpy(),
+    }), "artists", out_dir)
+    files[("relationships", "HAS_ARTIST")] = write(pd.DataFrame({
+        ":START_ID(Song)": song_ids[song_artists.whosampled_id].to_numpy(),
+        ":END_ID(Artist)": artist_ids[song_artists.artist].to_numpy(),
+    }).drop_duplicates(), "has_artist", out_dir)
+
+    genres = read_import_csv("musicbrainz_genres_all.csv", import_dir).dropna()
+    genres = genres[genres.song_id.isin(song_ids.index)]
+    genre_ids = integer_ids(genres.genre)
+    files[("nodes", "Genre")] = write(
+        pd.DataFrame({":ID(Genre)": genre_ids.to_numpy(), "name": genre_ids.index}), "genres", out_dir)
+    files[("relationships", "BELONGS_TO_GENRE")] = write(pd.DataFrame({
+        ":START_ID(Song)": song_ids[genres.song_id].to_numpy(),
+        ":END_ID(Genre)": genre_ids[genres.genre].to_numpy(),
+    }).drop_duplicates(), "belongs_to_genre", out_dir)
+
+    # SAMPLES: both ends must be known songs (MATCH), one relationship per pair (MERGE, last SET wins)
+    rels = read_import_csv("whosampled_relationships_all.csv", import_dir)
+    rels = rels[rels.source_id.isin(song_ids.index) & rels.target_id.isin(song_ids.index)]
+    rels = rels.drop_duplicates(["source_id", "target_id"], keep="last")
+    files[("relationships", "SAMPLES")] = write(pd.DataFrame({
+        ":START_ID(Song)": song_ids[rels.source_id].to_numpy(),
+        ":END_ID(Song)": song_ids[rels.target_id].to_numpy(),
+        "source_timestamps:string[]": rels.timestamp_in_source.to_numpy(),
+        "target_timestamps:string[]": rels.timestamp_in_target.to_numpy(),
+    }), "samples", out_dir)
+
+    print(f"✅ Bulk import files written to {out_dir} in {time.perf_counter() - start:.1f}s")
+    return files
+
+
+def admin_import_command(files, bulk_dir=CONTAINER_BULK_DIR, database="neo4j"):
+    command = [
+        "neo4j-admin", "database", "import", "full",
+        "--overwrite-destination=true",
+        "--id-type=integer",
+        f"--array-delimiter={ARRAY_DELIMITER}",
+        "--multiline-fields=true",
+    ]
+    for (kind, name), path in files.items():
+        command.append(f"--{kind}={name}={bulk_dir}/{Path(path).name}")
+    command.append(database)
+    return command
+
+
+def wait_for_neo4j(timeout=300):
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            driver.verify_connectivity()
+            return driver
+        except ServiceUnavailable:
+            if time.time() > deadline:
+                driver.close()
+                raise
+            time.sleep(3)
+
+
+def build(use_docker=True, analytics=True):
+    """Export, replace the database with a neo4j-admin import, then add constraints and analytics."""
+    timings = {}
+
+    start = time.perf_counter()
+    files = export()
+    timings["export"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if use_docker:
+        # The target database must be offline: import from a one-off container on the same volumes
+        subprocess.run(["docker", "compose", "stop", "neo4j"], cwd=NEO4J_DIR, check=True)
+        subprocess.run(["docker", "compose", "run", "--rm", "--no-deps", "neo4j",
+                        *admin_import_command(files)], cwd=NEO4J_DIR, check=True)
+        subprocess.run(["docker", "compose", "up", "-d", "neo4j"], cwd=NEO4J_DIR, check=True)
+    else:
+        subprocess.run(admin_import_command(files, bulk_dir=BULK_DIR), check=True)
+    timings["neo4j-admin import"] = time.perf_counter() - start
+    print("✅ Database imported")
+
+    start = time.perf_counter()
+    driver = wait_for_neo4j()
+    with driver.session() as session:
+        create_constraints(session)
+        timings["constraints"] = time.perf_counter() - start
+        start = time.perf_counter()
+        write_metrics(session)
+        timings["metrics"] = time.perf_counter() - start
+        start = time.perf_counter()
+        write_walk_scores(session)
+        timings["walk_scores"] = time.perf_counter() - start
+        start = time.perf_counter()
+        write_genre_flow(session)
+        timings["genre_flow"] = time.perf_counter() - start
+        if analytics:
+            start = time.perf_counter()
+            run_analytics(session)
+            timings["analytics"] = time.perf_counter() - start
+    driver.close()
+
+    for stage, seconds in timings.items():
+        print(f"   {stage:<20} {seconds:8.1f}s")
+    print(f"✅ Fresh database built in {sum(timings.values()):.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load the ETL outputs with neo4j-admin.")
+    parser.add_argument("command", choices=["export", "build"])
+    parser.add_argument("--no-docker", action="store_true",
+                        help="run a local neo4j-admin (with the database stopped) instead of the compose service")
+    parser.add_argument("--no-analytics", action="store_true", help="skip PageRank / Leiden / node2vec")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export()
+    else:
+        build(use_docker=not args.no_docker, analytics=not args.no_analytics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Fixed network views of the sampling communities, computed by the analytics
+job, so the Communities page draws a representative subgraph at stored
+positions instead of the first LIMIT 200 edges it happened to match, laid out
+by physics in the browser on every view.
+
+Backbone: each community's internal SAMPLES relationships ranked by
+
+    score = passages · √(pagerank_source · pagerank_target)
+
+where passages is how many passages one song takes from the other (the
+timestamps on the relationship, at least 1), so the strongest links between
+the most central songs come first. The BACKBONE_EDGES best get
+r.backbone_rank (1 = best) and r.backbone_score.
+
+Layout: the backbone of each community is laid out once with a seeded
+Fruchterman-Reingold spring layout (networkx), and its songs get layout_x /
+layout_y in [-1, 1]. A song is in one community, so one position per song.
+
+Every run clears the previous backbone and layout first.
+
+    python community_layout.py               # compute and store for every community
+    python community_layout.py --benchmark   # time it on the CSVs (sparse_engine.py communities), no database
+"""
+import argparse
+import time
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from data_import import BATCH_SIZE, IMPORT_DIR, write_batch
+
+BACKBONE_EDGES = 200
+LAYOUT_ITERATIONS = 50
+CLEAR_BATCH = 50_000
+
+internal_edges_read = """
+MATCH (a:Song)-[r:SAMPLES]->(b:Song)
+WHERE a.sampling_community IS NOT NULL AND a.sampling_community = b.sampling_community
+RETURN a.sampling_community AS community, a.id AS source, b.id AS target,
+       a.pagerank AS source_pagerank, b.pagerank AS target_pagerank,
+       size(coalesce(r.source_timestamps, [])) AS passages
+"""
+
+backbone_clear = """
+MATCH ()-[r:SAMPLES]->()
+WHERE r.backbone_rank IS NOT NULL
+WITH r LIMIT $limit
+REMOVE r.backbone_rank, r.backbone_score
+RETURN count(*) AS cleared
+"""
+
+layout_clear = """
+MATCH (s:Song)
+WHERE s.layout_x IS NOT NULL
+WITH s LIMIT $limit
+REMOVE s.layout_x, s.layout_y
+RETURN count(*) AS cleared
+"""
+
+backbone_write = """
+UNWIND $rows AS row
+MATCH (:Song {id: row.source})-[r:SAMPLES]->(:Song {id: row.target})
+SET r.backbone_rank = row.rank, r.backbone_score = row.score
+"""
+
+layout_write = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.id})
+SET s.layout_x = row.x, s.layout_y = row.y
+"""
+
+
+def internal_edges(song_ids, communities, pagerank, sources, targets, passages):
+    """internal_edges_read from per-song arrays and the song indices (and passages) of every SAMPLES."""
+    communities = np.asarray(communities, dtype=np.float64)
+    sources, targets = np.asarray(sources), np.asarray(targets)
+    internal = ~np.isnan(communities[sources]) & (communities[sources] == communities[targets])
+    sources, targets = sources[internal], targets[internal]
+    song_ids, pagerank = np.asarray(song_ids, dtype=object), np.asarray(pagerank, dtype=np.float64)
+    return pd.DataFrame({"community": communities[sources].astype(np.int64),
+                         "source": song_ids[sources], "target": song_ids[targets],
+                         "source_pagerank": pagerank[sources], "target_pagerank": pagerank[targets],
+                         "passages": np.asarray(passages)[internal]})
+
+
+def backbone(edges, limit=BACKBONE_EDGES):
+    """
+    From internal edges (community, source, target, source_pagerank,
+    target_pagerank, passages): the `limit` best of each community, with
+    score and rank, ordered by community and rank.
+    """
+    edges = edges.drop_duplicates(["source", "target"], keep="last")
+    pagerank = (edges.source_pagerank.astype(float).fillna(0).to_numpy()
+                * edges.target_pagerank.astype(float).fillna(0).to_numpy())
+    passages = np.maximum(edges.passages.fillna(0).to_numpy(np.float64), 1)
+    edges = edges.assign(score=passages * np.sqrt(pagerank))
+    edges = edges.sort_values(["community", "score", "source", "target"],
+                              ascending=[True, False, True, True], ignore_index=True)
+    edges["rank"] = edges.groupby("community").cumcount() + 1
+    return edges[edges["rank"] <= limit].reset_index(drop=True)
+
+
+def layouts(backbone_edges, iterations=LAYOUT_ITERATIONS, seed=0):
+    """x, y in [-1, 1] for every song of a backbone, indexed by song id; each community laid out apart."""
+    positions = []
+    for _, group in backbone_edges.groupby("community", sort=True):
+        graph = nx.Graph()
+        graph.add_edges_from(zip(group.source, group.target))
+        # Sorted, so the same backbone always gets the same layout
+        graph = nx.convert_node_labels_to_integers(graph, ordering="sorted", label_attribute="id")
+        layout = nx.spring_layout(graph, iterations=iterations, seed=seed)
+        positions.extend((graph.nodes[n]["id"], float(x), float(y)) for n, (x, y) in layout.items())
+    return pd.DataFrame(positions, columns=["id", "x", "y"]).set_index("id")
+
+
+def compute_layouts(edges, limit=BACKBONE_EDGES, iterations=LAYOUT_ITERATIONS):
+    """The backbone of every community and the positions of its songs."""
+    best = backbone(edges, limit)
+    return best, layouts(best, iterations)
+
+
+def write_community_layouts(session, limit=BACKBONE_EDGES, batch_size=BATCH_SIZE):
+    start = time.perf_counter()
+    edges = pd.DataFrame(session.run(internal_edges_read).data(),
+                         columns=["community", "source", "target", "source_pagerank", "target_pagerank", "passages"])
+    best, positions = compute_layouts(edges, limit)
+    computed = time.perf_counter() - start
+
+    for statement in (backbone_clear, layout_clear):
+        while session.run(statement, limit=CLEAR_BATCH).single()["cleared"]:
+            pass
+    rows = [{"source": r.source, "target": r.target, "rank": int(r.rank), "score": float(r.score)}
+            for r in best.itertuples()]
+    for i in range(0, len(rows), batch_size):
+        write_batch(session, backbone_write, rows[i:i + batch_size])
+    rows = [{"id": song_id, "x": r.x, "y": r.y} for song_id, r in positions.iterrows()]
+    for i in range(0, len(rows), batch_size):
+        write_batch(session, layout_write, rows[i:i + batch_size])
+    print(f"✅ Backbones of {best.community.nunique():,} communities ({len(best):,} samples, {len(positions):,} "
+          f"songs laid out) in {time.perf_counter() - start:.1f}s ({computed:.1f}s computing)")
+    return {"relationshipPropertiesWritten": 2 * len(best), "nodePropertiesWritten": 2 * len(positions)}
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def passage_counts(timestamps):
+    """Passages per relationship from ';'-joined timestamps, as the import splits them."""
+    return pd.Series(timestamps).fillna("").str.split(";").map(lambda parts: sum(1 for p in parts if p)).to_numpy()
+
+
+def csv_internal_edges(import_dir, ids, communities, pagerank):
+    """internal_edges_read over the ETL outputs, given each song's community and pagerank."""
+    from bulk_import import read_import_csv
+
+    rels = read_import_csv("whosampled_relationships_all.csv", import_dir)
+    # MERGE keeps one relationship per pair, with the timestamps of the last row
+    rels = rels.drop_duplicates(["source_id", "target_id"], keep="last")
+    source, target = ids.get_indexer(rels.source_id), ids.get_indexer(rels.target_id)
+    keep = (source >= 0) & (target >= 0)
+    return internal_edges(ids, communities, pagerank, source[keep], target[keep],
+                          passage_counts(rels.timestamp_in_source[keep]))
+
+
+def benchmark(import_dir=IMPORT_DIR, limit=BACKBONE_EDGES):
+    from sparse_engine import load_graph, louvain, pagerank, undirected
+
+    ids, adjacency = load_graph(import_dir)
+    edges = csv_internal_edges(import_dir, ids, louvain(undirected(adjacency)), pagerank(adjacency))
+    start = time.perf_counter()
+    best = backbone(edges, limit)
+    ranked = time.perf_counter() - start
+    start = time.perf_counter()
+    positions = layouts(best)
+    laid_out = time.perf_counter() - start
+
+    sizes = edges.groupby("community").size()
+    kept = best.groupby("community").size()
+    print(f"{len(edges):,} internal samples in {len(sizes):,} communities; backbones of {len(best):,} samples "
+          f"ranked in {ranked * 1e3:.0f}ms, {len(positions):,} songs laid out in {laid_out:.2f}s")
+    print(f"Communities with more than {limit} internal samples: {(sizes > limit).sum()}, "
+          f"largest {sizes.max():,} -> {kept.max():,} shown")
+    largest = sizes.idxmax()
+    shown = best[best.community == largest]
+    everything = backbone(edges[edges.community == largest], limit=len(edges))
+    print(f"Its backbone covers {pd.unique(shown[['source', 'target']].values.ravel()).size:,} songs, "
+          f"mean score {shown.score.mean():.3g} against {everything.score.mean():.3g} over all its samples")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backbone subgraphs and layouts for the community network views.")
+    parser.add_argument("--benchmark", action="store_true", help="time the job on the CSVs, no database")
+    parser.add_argument("--import-dir", default=str(IMPORT_DIR), help="with --benchmark: the *_all.csv directory")
+    parser.add_argument("--limit", type=int, default=BACKBONE_EDGES, help="backbone samples per community")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(Path(args.import_dir), args.limit)
+        return
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        write_community_layouts(session, args.limit)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+One (:Community) node per sampling community, written after community
+detection, so the Communities page and the notebook read a summary instead of
+grouping the whole catalogue by sampling_community on every view:
+
+    id                      the sampling_community value
+    size                    member songs
+    audio_songs             members with audio features
+    <feature>_mean          mean and population variance of every audio feature
+    <feature>_var             (data_import.AUDIO_FEATURES) over the members that have it
+    internal_edges          SAMPLES between two members
+    outgoing_edges          SAMPLES from a member to a song outside (or without a community)
+    incoming_edges          SAMPLES from outside to a member
+    top_artists             the TOP_NAMES artists and genres with the highest summed pagerank
+    top_artist_pagerank       of their member songs, and those sums
+    top_genres
+    top_genre_pagerank
+
+and (c:Community)-[:TOP_SONG {rank}]->(s:Song) to its TOP_SONGS members by
+pagerank (rank 1 first), counting only songs with an artist and a genre, as
+the page always listed. Every run replaces all Community nodes.
+
+    python community_summary.py               # summarise the communities in the database
+    python community_summary.py --benchmark   # time it on the CSVs (sparse_engine.py communities)
+                                              # and check it against a per-community loop
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_import import AUDIO_FEATURES, IMPORT_DIR, write_batch
+
+TOP_SONGS = 50
+TOP_NAMES = 10
+WRITE_BATCH = 100  # communities per transaction
+
+songs_read = """
+MATCH (s:Song)
+WHERE s.sampling_community IS NOT NULL
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+WITH s, collect(DISTINCT a.name) AS artists
+OPTIONAL MATCH (s)-[:BELONGS_TO_GENRE]->(g:Genre)
+RETURN s.id AS id, s.sampling_community AS community, s.pagerank AS pagerank,
+       [prop IN $props | s[prop]] AS audio, artists, collect(DISTINCT g.name) AS genres
+"""
+
+edges_read = """
+MATCH (a:Song)-[:SAMPLES]->(b:Song)
+WHERE a.sampling_community IS NOT NULL OR b.sampling_community IS NOT NULL
+RETURN a.sampling_community AS source, b.sampling_community AS target
+"""
+
+communities_clear = """
+MATCH (c:Community)
+DETACH DELETE c
+"""
+
+communities_write = """
+UNWIND $rows AS row
+CREATE (c:Community)
+SET c = row.properties
+WITH c, row
+UNWIND row.top_songs AS top
+MATCH (s:Song {id: top.id})
+CREATE (c)-[:TOP_SONG {rank: top.rank}]->(s)
+"""
+
+
+def feature_names():
+    return [prop for prop, _ in AUDIO_FEATURES]
+
+
+def _top_names(communities, names, pagerank, top_names):
+    """{community: ([name], [summed pagerank])}, the largest sums first."""
+    pairs = pd.DataFrame({"song": np.arange(len(names)), "community": communities, "name": names,
+                          "pagerank": pagerank}).explode("name")
+    pairs = pairs.dropna(subset=["name"]).drop_duplicates(["song", "name"])
+    sums = pairs.groupby(["community", "name"], as_index=False).pagerank.sum()
+    sums = sums.sort_values(["community", "pagerank", "name"], ascending=[True, False, True])
+    top = sums.groupby("community").head(top_names)
+    return {c: (group.name.tolist(), group.pagerank.tolist()) for c, group in top.groupby("community")}
+
+
+def summarise(song_ids, communities, pagerank, audio, artists, genres, edge_sources, edge_targets,
+              top_songs=TOP_SONGS, top_names=TOP_NAMES):
+    """
+    One summary per community, largest first. Per song: `communities` (NaN
+    without one), `pagerank`, `audio` (songs x AUDIO_FEATURES, NaN where
+    missing) and lists of artist and genre names; `edge_sources` /
+    `edge_targets` are the communities at the two ends of every SAMPLES
+    relationship (NaN without one).
+    """
+    song_ids = np.asarray(song_ids, dtype=object)
+    communities = pd.to_numeric(pd.Series(communities), errors="coerce").to_numpy(np.float64)
+    member = ~np.isnan(communities)
+    labels, label = np.unique(communities[member].astype(np.int64), return_inverse=True)
+    k = len(labels)
+    song_ids, pagerank = song_ids[member], np.asarray(pagerank, dtype=np.float64)[member]
+    audio = np.asarray(audio, dtype=np.float64).reshape(len(member), -1)[member]
+    artists = [a if isinstance(a, (list, tuple, np.ndarray)) else [] for a in np.asarray(artists, dtype=object)[member]]
+    genres = [g if isinstance(g, (list, tuple, np.ndarray)) else [] for g in np.asarray(genres, dtype=object)[member]]
+
+    size = np.bincount(label, minlength=k)
+    present = ~np.isnan(audio)
+    values = np.where(present, audio, 0.0)
+    counts = np.stack([np.bincount(label, weights=present[:, j], minlength=k) for j in range(audio.shape[1])], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.stack([np.bincount(label, weights=values[:, j], minlength=k)
+                          for j in range(audio.shape[1])], axis=1) / counts
+        deviations = np.where(present, audio - means[label], 0.0) ** 2
+        variances = np.stack([np.bincount(label, weights=deviations[:, j], minlength=k)
+                              for j in range(audio.shape[1])], axis=1) / counts
+    audio_songs = np.bincount(label, weights=present.any(axis=1), minlength=k).astype(np.int64)
+
+    def community_index(values):
+        values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(np.float64)
+        index = np.searchsorted(labels, np.nan_to_num(values, nan=-1).astype(np.int64))
+        index[index == k] = 0
+        known = ~np.isnan(values) & (k > 0)
+        known[known] = labels[index[known]] == values[known]
+        return np.where(known, index, -1)
+
+    source, target = community_index(edge_sources), community_index(edge_targets)
+    inside = (source == target) & (source >= 0)
+    internal = np.bincount(source[inside], minlength=k)
+    outgoing = np.bincount(source[(source >= 0) & ~inside], minlength=k)
+    incoming = np.bincount(target[(target >= 0) & ~inside], minlength=k)
+
+    listed = np.flatnonzero(~np.isnan(pagerank) & np.array([len(a) > 0 for a in artists], dtype=bool)
+                            & np.array([len(g) > 0 for g in genres], dtype=bool))
+    order = listed[np.lexsort((song_ids[listed].astype(str), -pagerank[listed], label[listed]))]
+    first = np.searchsorted(label[order], np.arange(k + 1))
+    top_artists = _top_names(label, artists, pagerank, top_names)
+    top_genres = _top_names(label, genres, pagerank, top_names)
+
+    summaries = []
+    names = feature_names()
+    for c in np.argsort(-size, kind="stable"):
+        properties = {"id": int(labels[c]), "size": int(size[c]), "audio_songs": int(audio_songs[c]),
+                      "internal_edges": int(internal[c]), "outgoing_edges": int(outgoing[c]),
+                      "incoming_edges": int(incoming[c])}
+        for j, name in enumerate(names):
+            if counts[c, j]:
+                properties[f"{name}_mean"] = float(means[c, j])
+                properties[f"{name}_var"] = float(variances[c, j])
+        properties["top_artists"], properties["top_artist_pagerank"] = top_artists.get(c, ([], []))
+        properties["top_genres"], properties["top_genre_pagerank"] = top_genres.get(c, ([], []))
+        top = order[first[c]:first[c + 1]][:top_songs]
+        summaries.append({"properties": properties,
+                          "top_songs": [{"id": song_ids[i], "rank": rank} for rank, i in enumerate(top, 1)]})
+    return summaries
+
+
+def write_community_summaries(session, top_songs=TOP_SONGS, top_names=TOP_NAMES):
+    start = time.perf_counter()
+    songs = pd.DataFrame(session.run(songs_read, props=feature_names()).data(),
+                         columns=["id", "community", "pagerank", "audio", "artists", "genres"])
+    edges = pd.DataFrame(session.run(edges_read).data(), columns=["source", "target"])
+    audio = np.array([[np.nan if v is None else v for v in values] for values in songs.audio],
+                     dtype=np.float64).reshape(len(songs), len(AUDIO_FEATURES))
+    summaries = summarise(songs.id, songs.community, songs.pagerank.astype(float), audio, songs.artists,
+                          songs.genres, edges.source, edges.target, top_songs, top_names)
+    computed = time.perf_counter() - start
+
+    session.run(communities_clear).consume()
+    for i in range(0, len(summaries), WRITE_BATCH):
+        write_batch(session, communities_write, summaries[i:i + WRITE_BATCH])
+    print(f"✅ {len(summaries):,} community summaries written in {time.perf_counter() - start:.1f}s "
+          f"({computed:.2f}s computing)")
+    return {"nodesCreated": len(summaries)}
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def _summary_by_loop(members, audio, edges):
+    """size, audio means and edge counts of one community, the way the page's queries computed them."""
+    inside = edges.source.isin(members) & edges.target.isin(members)
+    return {"size": len(members),
+            "means": np.nanmean(audio[members], axis=0) if len(members) else None,
+            "internal_edges": int(inside.sum()),
+            "outgoing_edges": int((edges.source.isin(members) & ~inside).sum()),
+            "incoming_edges": int((edges.target.isin(members) & ~inside).sum())}
+
+
+def benchmark(import_dir=IMPORT_DIR, checked=20):
+    import warnings
+
+    from bulk_import import read_import_csv
+    from sparse_engine import load_graph, louvain, pagerank, undirected
+
+    ids, adjacency = load_graph(import_dir)
+    communities = louvain(undirected(adjacency)).astype(np.float64)
+    scores = pagerank(adjacency)
+    genres = read_import_csv("musicbrainz_genres_all.csv", import_dir).dropna().drop_duplicates()
+    genres = genres.groupby("song_id").genre.agg(list).reindex(ids)
+    tracks = read_import_csv("whosampled_tracks_all.csv", import_dir).dropna(subset=["artist"])
+    artists = tracks.assign(artist=tracks.artist.str.split(";")).explode("artist")
+    artists = artists.groupby("whosampled_id").artist.agg(lambda a: sorted(set(a.str.strip()))).reindex(ids)
+    audio = np.full((len(ids), len(AUDIO_FEATURES)), np.nan)
+    if (import_dir / "acousticbrainz.csv").exists():
+        rows = read_import_csv("acousticbrainz.csv", import_dir).drop_duplicates("whosampled_id", keep="last")
+        index = ids.get_indexer(rows.whosampled_id)
+        audio[index[index >= 0]] = rows[[c for _, c in AUDIO_FEATURES]].astype(float).to_numpy()[index >= 0]
+    coo = adjacency.tocoo()
+
+    start = time.perf_counter()
+    summaries = summarise(ids, communities, scores, audio, artists, genres,
+                          communities[coo.row], communities[coo.col])
+    seconds = time.perf_counter() - start
+    print(f"✅ {len(summaries):,} communities over {len(ids):,} songs / {adjacency.nnz:,} samples "
+          f"summarised in {seconds * 1e3:.0f}ms")
+
+    edges = pd.DataFrame({"source": coo.row, "target": coo.col})
+    names = feature_names()
+    mismatches = []
+    start = time.perf_counter()
+    for summary in summaries[:checked]:
+        p = summary["properties"]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            expected = _summary_by_loop(np.flatnonzero(communities == p["id"]), audio, edges)
+        means = np.array([p.get(f"{name}_mean", np.nan) for name in names])
+        if (any(p[key] != expected[key] for key in ("size", "internal_edges", "outgoing_edges", "incoming_edges"))
+                or not np.allclose(means, expected["means"], equal_nan=True)):
+            mismatches.append(p["id"])
+    print(f"Per-community loop for the {min(checked, len(summaries))} largest: "
+          f"{(time.perf_counter() - start) * 1e3:.0f}ms, {len(mismatches)} mismatches"
+          + (f": {mismatches[:5]}" if mismatches else ""))
+    largest = summaries[0]["properties"]
+    print(f"Largest: community {largest['id']}, {largest['size']:,} songs, {largest['internal_edges']:,} internal / "
+          f"{largest['outgoing_edges']:,} outgoing / {largest['incoming_edges']:,} incoming samples, "
+          f"top genres {largest['top_genres'][:3]}")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a summary node per sampling community.")
+    parser.add_argument("--benchmark", action="store_true", help="time the job on the CSVs, no database")
+    parser.add_argument("--import-dir", default=str(IMPORT_DIR), help="with --benchmark: the *_all.csv directory")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(Path(args.import_dir))
+        return
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        write_community_summaries(session)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
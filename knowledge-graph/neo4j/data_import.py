@@ -1,17 +1,55 @@
+"""
+Load the ETL outputs in data/import/ into Neo4j.
+
+Rows are streamed from the CSV files in batches and written with
+`UNWIND $rows AS row` in one managed transaction per batch, so heap use on
+the server stays flat regardless of file size. Every statement is idempotent
+(MERGE / SET), so a failed batch is simply retried, and progress is saved to
+a checkpoint file after every committed batch: re-running the script after a
+failure resumes where it stopped.
+
+Usage:
+    python data_import.py                    # import (or resume) everything
+    python data_import.py --batch-size 2000
+    python data_import.py --restart          # ignore the checkpoint
+    python data_import.py --profile          # also collect db hits per stage
+
+Every run writes import_report.json (see import_report.py) and compares it
+with the previous run.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
 
-driver = GraphDatabase.driver("bolt://localhost:7687", auth=("neo4j", "testpassword"))
+from analytics import run_analytics
+from import_report import ImportReport, print_report
+from schema import migrate
 
-constraints = [
-    """CREATE CONSTRAINT song_id_unique IF NOT EXISTS FOR (s:Song) REQUIRE s.id IS UNIQUE""",
-    """CREATE CONSTRAINT artist_name_unique IF NOT EXISTS FOR (a:Artist) REQUIRE a.name IS UNIQUE""",
-    """CREATE CONSTRAINT album_title_unique IF NOT EXISTS FOR (al:Album) REQUIRE al.title IS UNIQUE""",
-    """CREATE CONSTRAINT year_value_unique IF NOT EXISTS FOR (y:Year) REQUIRE y.value IS UNIQUE"""
-]
+URI = "bolt://localhost:7687"
+AUTH = ("neo4j", "testpassword")
+
+IMPORT_DIR = Path(__file__).resolve().parent / "data" / "import"
+CHECKPOINT_FILE = Path(__file__).resolve().parent / ".import_checkpoint.json"
+
+BATCH_SIZE = 5000
+MAX_RETRIES = 5
+PROGRESS_EVERY = 10  # batches
+
+csv.field_size_limit(sys.maxsize)
 
 track_import = """
 // Load WhoSampled tracks with proper relationships
-LOAD CSV WITH HEADERS FROM 'file:///whosampled_tracks_all.csv' AS row
+UNWIND $rows AS row
 
 MERGE (s:Song {id: row.whosampled_id})
 SET s.title = row.title,
@@ -36,173 +74,309 @@ MERGE (s)-[:HAS_ARTIST]->(a)
 """
 
 relationship_import = """
-LOAD CSV WITH HEADERS FROM 'file:///whosampled_relationships_all.csv' AS row
+UNWIND $rows AS row
 MATCH (source:Song {id: row.source_id})
 MATCH (target:Song {id: row.target_id})
 MERGE (source)-[r:SAMPLES]->(target)
 SET r.source_timestamps = split(row.timestamp_in_source, ';'),
-    r.target_timestamps = split(row.timestamp_in_target, ';');
+    r.target_timestamps = split(row.timestamp_in_target, ';')
 """
 
 date_import = """
 // Load release dates
-LOAD CSV WITH HEADERS FROM 'file:///musicbrainz_dates_all.csv' AS row
+UNWIND $rows AS row
 MATCH (s:Song {id: row.id})
 SET s.release_date = CASE 
         WHEN row.release_date <> '' THEN date(row.release_date)
         ELSE s.release_date
-    END;
+    END
 """
 
 genre_import = """
 // Load genres
-LOAD CSV WITH HEADERS FROM 'file:///musicbrainz_genres_all.csv' AS row
+UNWIND $rows AS row
 MATCH (s:Song {id: row.song_id})
 MERGE (g:Genre {name: row.genre})
-MERGE (s)-[:BELONGS_TO_GENRE]->(g);
+MERGE (s)-[:BELONGS_TO_GENRE]->(g)
 """
 
 summary_import = """
 // Load artist summaries
-LOAD CSV WITH HEADERS FROM 'file:///musicbrainz_summaries_all.csv' AS row
+UNWIND $rows AS row
 MATCH (a:Artist {name: row.artist_name})
-SET a.wikipedia_summary = row.wikipedia_summary;
+SET a.wikipedia_summary = row.wikipedia_summary
 """
 
+# (Song property, acousticbrainz.csv column)
+AUDIO_FEATURES = [
+    ("danceability_danceable", "danceability_danceable"),
+    ("genre_dortmund_alternative", "genre_dortmund_alternative"),
+    ("genre_dortmund_blues", "genre_dortmund_blues"),
+    ("genre_dortmund_electronic", "genre_dortmund_electronic"),
+    ("genre_dortmund_folkcountry", "genre_dortmund_folkcountry"),
+    ("genre_dortmund_funksoulrnb", "genre_dortmund_funksoulrnb"),
+    ("genre_dortmund_jazz", "genre_dortmund_jazz"),
+    ("genre_dortmund_pop", "genre_dortmund_pop"),
+    ("genre_dortmund_raphiphop", "genre_dortmund_raphiphop"),
+    ("genre_dortmund_rock", "genre_dortmund_rock"),
+    ("genre_electronic_ambient", "genre_electronic_ambient"),
+    ("genre_electronic_dnb", "genre_electronic_dnb"),
+    ("genre_electronic_house", "genre_electronic_house"),
+    ("genre_electronic_techno", "genre_electronic_techno"),
+    ("genre_electronic_trance", "genre_electronic_trance"),
+    ("genre_rosamerica_cla", "genre_rosamerica_cla"),
+    ("genre_rosamerica_dan", "genre_rosamerica_dan"),
+    ("genre_rosamerica_hip", "genre_rosamerica_hip"),
+    ("genre_rosamerica_jaz", "genre_rosamerica_jaz"),
+    ("genre_rosamerica_pop", "genre_rosamerica_pop"),
+    ("genre_rosamerica_rhy", "genre_rosamerica_rhy"),
+    ("genre_rosamerica_roc", "genre_rosamerica_roc"),
+    ("genre_rosamerica_spe", "genre_rosamerica_spe"),
+    ("genre_tzanetakis_blu", "genre_tzanetakis_blu"),
+    ("genre_tzanetakis_cla", "genre_tzanetakis_cla"),
+    ("genre_tzanetakis_cou", "genre_tzanetakis_cou"),
+    ("genre_tzanetakis_dis", "genre_tzanetakis_dis"),
+    ("genre_tzanetakis_hip", "genre_tzanetakis_hip"),
+    ("genre_tzanetakis_jaz", "genre_tzanetakis_jaz"),
+    ("genre_tzanetakis_met", "genre_tzanetakis_met"),
+    ("genre_tzanetakis_pop", "genre_tzanetakis_pop"),
+    ("genre_tzanetakis_reg", "genre_tzanetakis_reg"),
+    ("genre_tzanetakis_roc", "genre_tzanetakis_roc"),
+    ("ismir04_rhythm_ChaChaCha", "ismir04_rhythm_ChaChaCha"),
+    ("ismir04_rhythm_Jive", "ismir04_rhythm_Jive"),
+    ("ismir04_rhythm_Quickstep", "ismir04_rhythm_Quickstep"),
+    ("ismir04_rhythm_Rumba_American", "ismir04_rhythm_Rumba-American"),
+    ("ismir04_rhythm_Rumba_International", "ismir04_rhythm_Rumba-International"),
+    ("ismir04_rhythm_Rumba_Misc", "ismir04_rhythm_Rumba-Misc"),
+    ("ismir04_rhythm_Samba", "ismir04_rhythm_Samba"),
+    ("ismir04_rhythm_Tango", "ismir04_rhythm_Tango"),
+    ("ismir04_rhythm_VienneseWaltz", "ismir04_rhythm_VienneseWaltz"),
+    ("ismir04_rhythm_Waltz", "ismir04_rhythm_Waltz"),
+    ("mood_acoustic_acoustic", "mood_acoustic_acoustic"),
+    ("mood_aggressive_aggressive", "mood_aggressive_aggressive"),
+    ("mood_electronic_electronic", "mood_electronic_electronic"),
+    ("mood_happy_happy", "mood_happy_happy"),
+    ("mood_party", "mood_party_party"),
+    ("mood_relaxed", "mood_relaxed_relaxed"),
+    ("mood_sad", "mood_sad_sad"),
+    ("timbre_bright", "timbre_bright"),
+    ("tonal_atonal_atonal", "tonal_atonal_tonal"),
+    ("voice_instrumental_voice", "voice_instrumental_voice"),
+]
+
 audio_features_import = """
-LOAD CSV WITH HEADERS FROM 'file:///acousticbrainz.csv' AS row
+UNWIND $rows AS row
 MATCH (s:Song {id: row.whosampled_id})
 SET
-  s.danceability_danceable = toFloat(row.danceability_danceable),
-  s.genre_dortmund_alternative = toFloat(row.genre_dortmund_alternative),
-  s.genre_dortmund_blues = toFloat(row.genre_dortmund_blues),
-  s.genre_dortmund_electronic = toFloat(row.genre_dortmund_electronic),
-  s.genre_dortmund_folkcountry = toFloat(row.genre_dortmund_folkcountry),
-  s.genre_dortmund_funksoulrnb = toFloat(row.genre_dortmund_funksoulrnb),
-  s.genre_dortmund_jazz = toFloat(row.genre_dortmund_jazz),
-  s.genre_dortmund_pop = toFloat(row.genre_dortmund_pop),
-  s.genre_dortmund_raphiphop = toFloat(row.genre_dortmund_raphiphop),
-  s.genre_dortmund_rock = toFloat(row.genre_dortmund_rock),
-  s.genre_electronic_ambient = toFloat(row.genre_electronic_ambient),
-  s.genre_electronic_dnb = toFloat(row.genre_electronic_dnb),
-  s.genre_electronic_house = toFloat(row.genre_electronic_house),
-  s.genre_electronic_techno = toFloat(row.genre_electronic_techno),
-  s.genre_electronic_trance = toFloat(row.genre_electronic_trance),
-  s.genre_rosamerica_cla = toFloat(row.genre_rosamerica_cla),
-  s.genre_rosamerica_dan = toFloat(row.genre_rosamerica_dan),
-  s.genre_rosamerica_hip = toFloat(row.genre_rosamerica_hip),
-  s.genre_rosamerica_jaz = toFloat(row.genre_rosamerica_jaz),
-  s.genre_rosamerica_pop = toFloat(row.genre_rosamerica_pop),
-  s.genre_rosamerica_rhy = toFloat(row.genre_rosamerica_rhy),
-  s.genre_rosamerica_roc = toFloat(row.genre_rosamerica_roc),
-  s.genre_rosamerica_spe = toFloat(row.genre_rosamerica_spe),
-  s.genre_tzanetakis_blu = toFloat(row.genre_tzanetakis_blu),
-  s.genre_tzanetakis_cla = toFloat(row.genre_tzanetakis_cla),
-  s.genre_tzanetakis_cou = toFloat(row.genre_tzanetakis_cou),
-  s.genre_tzanetakis_dis = toFloat(row.genre_tzanetakis_dis),
-  s.genre_tzanetakis_hip = toFloat(row.genre_tzanetakis_hip),
-  s.genre_tzanetakis_jaz = toFloat(row.genre_tzanetakis_jaz),
-  s.genre_tzanetakis_met = toFloat(row.genre_tzanetakis_met),
-  s.genre_tzanetakis_pop = toFloat(row.genre_tzanetakis_pop),
-  s.genre_tzanetakis_reg = toFloat(row.genre_tzanetakis_reg),
-  s.genre_tzanetakis_roc = toFloat(row.genre_tzanetakis_roc),
-  s.ismir04_rhythm_ChaChaCha = toFloat(row.ismir04_rhythm_ChaChaCha),
-  s.ismir04_rhythm_Jive = toFloat(row.ismir04_rhythm_Jive),
-  s.ismir04_rhythm_Quickstep = toFloat(row.ismir04_rhythm_Quickstep),
-  s.ismir04_rhythm_Rumba_American = toFloat(row.`ismir04_rhythm_Rumba-American`),
-  s.ismir04_rhythm_Rumba_International = toFloat(row.`ismir04_rhythm_Rumba-International`),
-  s.ismir04_rhythm_Rumba_Misc = toFloat(row.`ismir04_rhythm_Rumba-Misc`),
-  s.ismir04_rhythm_Samba = toFloat(row.ismir04_rhythm_Samba),
-  s.ismir04_rhythm_Tango = toFloat(row.ismir04_rhythm_Tango),
-  s.ismir04_rhythm_VienneseWaltz = toFloat(row.ismir04_rhythm_VienneseWaltz),
-  s.ismir04_rhythm_Waltz = toFloat(row.ismir04_rhythm_Waltz),
-  s.mood_acoustic_acoustic = toFloat(row.mood_acoustic_acoustic),
-  s.mood_aggressive_aggressive = toFloat(row.mood_aggressive_aggressive),
-  s.mood_electronic_electronic = toFloat(row.mood_electronic_electronic),
-  s.mood_happy_happy = toFloat(row.mood_happy_happy),
-  s.mood_party = toFloat(row.mood_party_party),
-  s.mood_relaxed = toFloat(row.mood_relaxed_relaxed),
-  s.mood_sad = toFloat(row.mood_sad_sad),
-  s.timbre_bright = toFloat(row.timbre_bright),
-  s.tonal_atonal_atonal = toFloat(row.tonal_atonal_tonal),
-  s.voice_instrumental_voice = toFloat(row.voice_instrumental_voice);
-"""
+""" + ",\n".join(f"  s.{prop} = toFloat(row.`{column}`)" for prop, column in AUDIO_FEATURES)
 
-pagerank_projection = """
-CALL gds.graph.project(
-  'songGraph',
-  'Song',
-  'SAMPLES'
-)
+# Packed copy of the features for the vector index (see audio_vectors)
+audio_vector_import = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.whosampled_id})
+SET s.audio_vec = row.audio_vec
 """
 
-pagerank_write = """
-CALL gds.pageRank.write('songGraph', {
-  writeProperty: 'pagerank'
-})
-YIELD nodePropertiesWritten, ranIterations
-"""
+# (name, statement, file in data/import/, message)
+IMPORT_STAGES = [
+    ("tracks", track_import, "whosampled_tracks_all.csv", "Track import completed"),
+    ("relationships", relationship_import, "whosampled_relationships_all.csv", "Relationship import completed"),
+    ("dates", date_import, "musicbrainz_dates_all.csv", "Date import completed"),
+    ("genres", genre_import, "musicbrainz_genres_all.csv", "Genre import completed"),
+    ("summaries", summary_import, "musicbrainz_summaries_all.csv", "Summary import completed"),
+    ("audio_features", audio_features_import, "acousticbrainz.csv", "Audio features import completed"),
+]
 
-community_graph = """
-CALL gds.graph.project(
-  'sampling_graph',
-  'Song',
-  {
-    SAMPLES: {
-      orientation: 'UNDIRECTED'
-    }
-  }
-)
-"""
 
-community_detection = """
-CALL gds.leiden.write('sampling_graph', {
-  writeProperty: 'sampling_community'
-})
-"""
+# ──────────────────── BATCHING ────────────────────
 
-node2vec_projection = """
-CALL gds.node2vec.write('songGraph', {
-  embeddingDimension:128,
-  iterations:10,
-  walkLength:80,
-  writeProperty:'n2v'
-});
-"""
+def read_batches(csv_path, batch_size, skip=0):
+    """Yield lists of row dicts. Empty fields become None, as with LOAD CSV."""
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        batch = []
+        for i, row in enumerate(csv.DictReader(f)):
+            if i < skip:
+                continue
+            batch.append({k: (v if v != "" else None) for k, v in row.items()})
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def standardise_audio(values):
+    """
+    (songs x features) -> unit vectors of the features z-scored over all
+    songs, which rows are complete, and the mean and std used.
+    """
+    with warnings.catch_warnings():
+        # A feature no song has (e.g. no audio imported yet) gets a NaN mean
+        warnings.simplefilter("ignore", RuntimeWarning)
+        std = np.nanstd(values, axis=0)
+        mean = np.nanmean(values, axis=0)
+    std[~(std > 0)] = 1.0
+    z = (values - mean) / std
+    norms = np.linalg.norm(z, axis=1, keepdims=True)
+    vectors = np.divide(z, norms, out=np.zeros_like(z), where=norms > 0).astype(np.float32)
+    complete = ~np.isnan(values).any(axis=1)
+    return vectors, complete, mean, std
+
+
+def audio_vectors(df):
+    """
+    One packed vector per song: every feature z-scored over the whole
+    catalogue, then L2-normalised, so cosine (or dot product) on `audio_vec`
+    compares songs on standardised features. Songs missing a feature get None.
+    """
+    values = df[[column for _, column in AUDIO_FEATURES]].apply(pd.to_numeric, errors="coerce").to_numpy(np.float64)
+    vectors, complete, _, _ = standardise_audio(values)
+    return pd.DataFrame({
+        "whosampled_id": df.whosampled_id.to_numpy(),
+        "audio_vec": [v.tolist() if ok else None for v, ok in zip(vectors, complete)],
+    })
+
+
+def import_audio_vectors(session, df, batch_size=BATCH_SIZE, stage=None):
+    """Needs the whole file at once: the standardisation is over all songs."""
+    df = df.drop_duplicates("whosampled_id", keep="last")
+    rows = audio_vectors(df).dropna(subset=["audio_vec"]).to_dict("records")
+    for i in range(0, len(rows), batch_size):
+        summary = write_batch(session, audio_vector_import, rows[i:i + batch_size])
+        if stage is not None:
+            stage.add(summary, len(rows[i:i + batch_size]))
+    print(f"✅ Audio vectors written for {len(rows):,} songs")
+
+
+def count_rows(csv_path):
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+def write_batch(session, statement, rows, profile=False):
+    """
+    Commit one batch, retrying it if the connection or the server fails. The
+    statements are idempotent. Client errors (syntax, constraint violations)
+    fail at once. Returns the ResultSummary.
+    """
+    if profile:
+        statement = "PROFILE " + statement
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            # execute_write already retries transient errors (deadlocks, leader switches) for a while;
+            # this outer loop waits longer, for a restarting server
+            return session.execute_write(lambda tx: tx.run(statement, rows=rows).consume())
+        except (ServiceUnavailable, SessionExpired, TransientError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            wait = 2 ** attempt
+            print(f"   ⚠️  batch failed ({e.__class__.__name__}: {e}), retry {attempt}/{MAX_RETRIES - 1} in {wait}s")
+            time.sleep(wait)
+
+
+# ──────────────────── CHECKPOINT ────────────────────
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint():
+    if CHECKPOINT_FILE.exists():
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_checkpoint(checkpoint):
+    tmp = CHECKPOINT_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+def import_stage(session, name, statement, csv_path, checkpoint, batch_size=BATCH_SIZE, report=None):
+    """Stream one CSV into the graph, resuming from the checkpoint if the file is unchanged."""
+    report = report or ImportReport()
+    stage = report.stage(name)
+    signature = file_signature(csv_path)
+    state = checkpoint.get(name)
+    if state is None or state["file"] != signature:
+        state = {"file": signature, "rows_done": 0, "completed": False}
+    if state["completed"]:
+        stage.status = "skipped"
+        print(f"⏭️  {name}: already imported")
+        return
+
+    total = count_rows(csv_path)
+    done = state["rows_done"]
+    if done:
+        print(f"↩️  {name}: resuming after row {done:,}")
+
+    if done:
+        stage.status = "resumed"
+    start, resumed_at = time.perf_counter(), done
+    for i, rows in enumerate(read_batches(csv_path, batch_size, skip=done), start=1):
+        stage.add(write_batch(session, statement, rows, profile=report.profile), len(rows))
+        stage.seconds = time.perf_counter() - start
+        done += len(rows)
+        state["rows_done"] = done
+        checkpoint[name] = state
+        save_checkpoint(checkpoint)
+        if i % PROGRESS_EVERY == 0:
+            rate = (done - resumed_at) / (time.perf_counter() - start)
+            print(f"   {name}: {done:,}/{total:,} rows ({done / max(total, 1):.0%}), {rate:,.0f} rows/s")
+
+    state["completed"] = True
+    checkpoint[name] = state
+    save_checkpoint(checkpoint)
+
+
+def create_constraints(session):
+    """Bring constraints and indexes up to date (see schema.py)."""
+    version = migrate(session)
+    print(f"✅ Schema at version {version}")
+
+
+def main():
+    # genre_flow, graph_metrics and walk_scores import this module
+    from genre_flow import write_genre_flow
+    from graph_metrics import write_metrics
+    from walk_scores import write_walk_scores
+
+    parser = argparse.ArgumentParser(description="Import the ETL outputs into Neo4j in batches.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and import everything")
+    parser.add_argument("--profile", action="store_true", help="PROFILE every batch and report db hits (slower)")
+    args = parser.parse_args()
+
+    checkpoint = {} if args.restart else load_checkpoint()
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    report = ImportReport(profile=args.profile)
+
+    with driver.session() as session:
+        report.timed("constraints", create_constraints, session)
+
+        for name, statement, filename, message in IMPORT_STAGES:
+            import_stage(session, name, statement, IMPORT_DIR / filename, checkpoint, args.batch_size, report)
+            print(f"✅ {message}")
+
+        audio = pd.read_csv(IMPORT_DIR / "acousticbrainz.csv", dtype=str)
+        report.timed("audio_vectors", import_audio_vectors, session, audio, args.batch_size,
+                     report.stage("audio_vectors"))
+
+        report.timed("analytics", run_analytics, session)
+        report.timed("metrics", write_metrics, session, args.batch_size)
+        report.timed("walk_scores", write_walk_scores, session)
+        report.timed("genre_flow", write_genre_flow, session, args.batch_size)
+
+        print("✅ All imports completed")
+
+    driver.close()
+    print_report(*report.save())
+    # Everything is in: the next run starts from scratch
+    CHECKPOINT_FILE.unlink(missing_ok=True)
 
-with driver.session() as session:
-    try:
-        session.run("CALL gds.graph.drop('songGraph', false) YIELD graphName")
-    except Exception as e:
-        pass
-    
-    for constraint in constraints:
-        session.run(constraint)
-    print("✅ Constraints created")
-    session.run(track_import)
-    print("✅ Track import completed")
-    session.run(relationship_import)
-    print("✅ Relationship import completed")
-    session.run(date_import)
-    print("✅ Date import completed")
-    session.run(genre_import)
-    print("✅ Genre import completed")
-    session.run(summary_import)
-    print("✅ Summary import completed")
-    session.run(audio_features_import)
-    print("✅ Audio features import completed")
-    session.run(pagerank_projection)
-    print("✅ Graph projected")
-    session.run(pagerank_write)
-    print("✅ PageRank scores written")
-    session.run(community_graph)
-    print("✅ Community graph projected")
-    session.run(community_detection)
-    print("✅ Community detection completed")
-    session.run(node2vec_projection)
-    print("✅ Node2Vec embeddings written")
-
-    print("✅ All imports completed")
-
-driver.close()
 
+if __name__ == "__main__":
+    main()
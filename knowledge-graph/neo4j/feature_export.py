@@ -0,0 +1,196 @@
+"""
+Export the recommendation features as memory-mappable matrices for the website
+(see Website/feature_store.py), so the Sample Recommendations page scores
+candidates with a row gather and a matrix-vector product instead of pulling
+every candidate's vectors through Cypher.
+
+Layout of the feature directory:
+
+    manifest.json       version, graph_version, counts, audio feature names
+    node_ids.npy        int64, ascending: row i holds the song with node id node_ids[i]
+    n2v.npy             float32 (songs x 128), L2-normalised, zero rows where missing; from a
+                        quantised graph (n2v_i8 in place of n2v) the decoded int8 vectors
+    audio.npy           float32 (songs x 53), z-scored over all songs then L2-normalised
+                        (what audio_vec holds), zero rows where a feature is missing
+    n2v_f16.npy         float16 copy of n2v.npy
+    n2v_i8.npy          int8 (songs x 128) and float32 scales with n2v ≈ n2v_i8 · n2v_scale
+    n2v_scale.npy         (see quantisation.py)
+    n2v_pq.npy          with pq=True / --pq: uint8 (songs x 16) product-quantisation codes
+    n2v_pq_codebooks.npy  and float32 (16 x 256 x 8) codebooks
+    has_n2v.npy         bool, which rows of n2v.npy are real
+    has_audio.npy       bool, which rows of audio.npy are real
+    audio_mean.npy      float64, the mean and std the audio features were z-scored with,
+    audio_std.npy         to place songs added later in the same space
+    search/             the title / artist search index over the songs with a release year
+                        (Website/search_index.py)
+
+graph_version is a hash of the ids, the full-precision matrices and the search catalogue, so an
+unchanged graph exports the same version and the website keeps its loaded store and search index;
+when it changes, the website reloads them.
+An export is written to a temporary directory next to the target and swapped in whole, so a
+server with the previous files memory-mapped keeps reading a consistent (old) set until it
+reloads, and never sees half-written or shortened files.
+
+    python feature_export.py                 # from the running database
+    python feature_export.py --pq            # also write the product-quantised codes
+    snapshot_export.py also writes one to <snapshot>/features
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from data_import import AUDIO_FEATURES, standardise_audio
+from quantisation import int8_decode, int8_encode, pq_encode, pq_train
+
+FEATURES_VERSION = 1
+WEBSITE_DIR = Path(__file__).resolve().parents[2] / "Website"
+FEATURES_DIR = WEBSITE_DIR / "features"
+
+features_export = """
+MATCH (s:Song)
+RETURN id(s) AS node_id, s.n2v AS n2v, s.n2v_i8 AS n2v_i8, s.n2v_scale AS n2v_scale,
+       [prop IN $props | s[prop]] AS audio
+ORDER BY node_id
+"""
+
+
+def _unit_rows(matrix):
+    """Rows scaled to unit length; NaN or zero rows become zero and are reported missing."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    present = ~np.isnan(matrix).any(axis=1)
+    matrix = np.where(present[:, None], matrix, 0.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    present &= norms[:, 0] > 0
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0).astype(np.float32), present
+
+
+def _swap_into_place(tmp_dir, out_dir):
+    """Replace `out_dir` by `tmp_dir`. Files mapped from the old directory stay readable until unmapped."""
+    old = None
+    if out_dir.exists():
+        old = Path(tempfile.mkdtemp(prefix=f".{out_dir.name}.old-", dir=out_dir.parent))
+        os.replace(out_dir, old)
+    os.replace(tmp_dir, out_dir)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def website_module(name):
+    """A module of the website (search_index, queries), which shares the export's file layouts."""
+    if str(WEBSITE_DIR) not in sys.path:
+        sys.path.append(str(WEBSITE_DIR))
+    return importlib.import_module(name)
+
+
+def write_features(out_dir, node_ids, n2v, audio_features, source, pq=False, catalogue=None):
+    """
+    `n2v` and `audio_features` (raw values) have one row per node id, NaN where
+    missing; `catalogue` holds the SEARCH_CATALOGUE rows the search index is built from.
+    """
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{out_dir.name}.new-", dir=out_dir.parent))
+    # mkdtemp makes it private; the export is read by the web server
+    tmp_dir.chmod(0o755)
+    try:
+        manifest = _write_features(tmp_dir, node_ids, n2v, audio_features, source, pq, catalogue)
+        _swap_into_place(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    print(f"✅ Features for {manifest['songs']:,} songs ({manifest['n2v']:,} n2v, {manifest['audio']:,} audio) "
+          f"written to {out_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def _write_features(out_dir, node_ids, n2v, audio_features, source, pq, catalogue):
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    order = np.argsort(node_ids, kind="stable")
+    node_ids = node_ids[order]
+    n2v, has_n2v = _unit_rows(np.asarray(n2v)[order])
+    audio, has_audio, mean, std = standardise_audio(np.asarray(audio_features, dtype=np.float64)[order])
+    audio[~has_audio] = 0.0
+
+    arrays = {"node_ids": node_ids, "n2v": n2v, "audio": audio, "has_n2v": has_n2v, "has_audio": has_audio,
+              "audio_mean": mean, "audio_std": std}
+    digest = hashlib.blake2b(digest_size=8)
+    for name, array in arrays.items():
+        np.save(out_dir / f"{name}.npy", array)
+        digest.update(np.ascontiguousarray(array).tobytes())
+
+    encodings = {"float32": "n2v", "float16": "n2v_f16", "int8": "n2v_i8"}
+    codes, scales = int8_encode(n2v)
+    quantised = {"n2v_f16": n2v.astype(np.float16), "n2v_i8": codes, "n2v_scale": scales}
+    if pq and has_n2v.any():
+        codebooks = pq_train(n2v[has_n2v])
+        quantised.update(n2v_pq=pq_encode(n2v, codebooks), n2v_pq_codebooks=codebooks)
+        encodings["pq"] = "n2v_pq"
+    for name, array in quantised.items():
+        np.save(out_dir / f"{name}.npy", array)
+
+    if catalogue is not None:
+        search = website_module("search_index")
+        index = search.SearchIndex.from_records(catalogue)
+        index.save(out_dir / search.SEARCH_DIR)
+        digest.update((out_dir / search.SEARCH_DIR / "songs.arrow").read_bytes())
+
+    manifest = {
+        "version": FEATURES_VERSION,
+        "graph_version": digest.hexdigest(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "songs": len(node_ids),
+        "n2v": int(has_n2v.sum()),
+        "audio": int(has_audio.sum()),
+        "search": None if catalogue is None else len(catalogue),
+        "n2v_encodings": encodings,
+        "audio_features": [prop for prop, _ in AUDIO_FEATURES],
+    }
+    with open(out_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def from_database(driver, out_dir=FEATURES_DIR, dimension=128, pq=False):
+    with driver.session() as session:
+        rows = session.run(features_export, props=[prop for prop, _ in AUDIO_FEATURES]).data()
+        catalogue = session.run(website_module("queries").SEARCH_CATALOGUE).data()
+    # Songs only have n2v until quantisation.py replaces it by n2v_i8
+    n2v = int8_decode([r["n2v_i8"] for r in rows], [r["n2v_scale"] for r in rows], dimension).astype(np.float64)
+    for i, r in enumerate(rows):
+        if r["n2v"] is not None and len(r["n2v"]) == dimension:
+            n2v[i] = r["n2v"]
+    audio = np.array([[np.nan if v is None else v for v in r["audio"]] for r in rows],
+                     dtype=np.float64).reshape(-1, len(AUDIO_FEATURES))
+    return write_features(out_dir, [r["node_id"] for r in rows], n2v, audio, source="neo4j", pq=pq,
+                          catalogue=catalogue)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the recommendation features for the website.")
+    parser.add_argument("--out", default=str(FEATURES_DIR))
+    parser.add_argument("--pq", action="store_true", help="also write product-quantised n2v codes")
+    args = parser.parse_args()
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    from_database(driver, Path(args.out), pq=args.pq)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+The genre-to-genre sampling flow behind the Sampling Flow page, computed once
+for the whole graph and stored as (:Genre)-[:GENRE_FLOW {count}]->(:Genre),
+so the page reads a table of genre pairs instead of aggregating every
+SAMPLES relationship on a cold start.
+
+count is what the page's live query returned,
+
+    MATCH (original:Song)-[:BELONGS_TO_GENRE]->(g1:Genre)
+    MATCH (sampled:Song)-[:SAMPLES]->(original)
+    MATCH (sampled)-[:BELONGS_TO_GENRE]->(g2:Genre)
+    RETURN g1, g2, count(*)
+
+i.e. with A the directed SAMPLES adjacency (sampler -> original) and G the
+song x genre incidence matrix, flow = Gᵀ Aᵀ G: one sparse product whatever
+the size of the graph, and a matrix of genres² entries at most.
+
+New samples need no recomputation of the flow: `add_samples` imports
+relationship rows and adds each new edge's genre pairs to their GENRE_FLOW
+counts in the same transaction. Edges that already exist are left uncounted,
+so rerunning a file (or a retried batch) changes nothing. The other stored
+results that depend on SAMPLES are brought up to date afterwards: the
+graph_metrics.py properties are recomputed and the walk candidates of the
+songs whose walks reach a new sample are rescored. Community summaries and
+backbones wait for the next analytics run.
+
+    python genre_flow.py                               # recompute and store the whole matrix
+    python genre_flow.py --add relationships.csv       # import new SAMPLES rows (the ETL's
+                                                       # whosampled_relationships_all.inserts.csv)
+    python genre_flow.py --benchmark                   # time it on the CSVs against the live
+                                                       # aggregation, no database
+"""
+import argparse
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_import import BATCH_SIZE, IMPORT_DIR, read_batches, write_batch
+from graph_metrics import clear_metrics, read_graph, write_metrics
+from walk_scores import invalidate_walk_scores, write_walk_scores
+
+DELETE_BATCH = 50_000
+
+genres_read = """
+MATCH (s:Song)-[:BELONGS_TO_GENRE]->(g:Genre)
+RETURN s.id AS id, g.name AS genre
+"""
+
+genre_flow_clear = """
+MATCH (:Genre)-[f:GENRE_FLOW]->(:Genre)
+WITH f LIMIT $limit
+DELETE f
+RETURN count(*) AS deleted
+"""
+
+genre_flow_write = """
+UNWIND $rows AS row
+MATCH (g1:Genre {name: row.source_genre})
+MATCH (g2:Genre {name: row.target_genre})
+MERGE (g1)-[f:GENRE_FLOW]->(g2)
+SET f.count = row.count
+"""
+
+# relationship_import, plus the flow of the edges it creates
+samples_add = """
+UNWIND $rows AS row
+MATCH (source:Song {id: row.source_id})
+MATCH (target:Song {id: row.target_id})
+OPTIONAL MATCH (source)-[existing:SAMPLES]->(target)
+WITH source, target, row, existing IS NULL AS added
+MERGE (source)-[r:SAMPLES]->(target)
+SET r.source_timestamps = split(row.timestamp_in_source, ';'),
+    r.target_timestamps = split(row.timestamp_in_target, ';')
+WITH source, target
+WHERE added
+MATCH (target)-[:BELONGS_TO_GENRE]->(g1:Genre)
+MATCH (source)-[:BELONGS_TO_GENRE]->(g2:Genre)
+MERGE (g1)-[f:GENRE_FLOW]->(g2)
+ON CREATE SET f.count = 0
+SET f.count = f.count + 1
+"""
+
+
+def incidence(ids, song_genres):
+    """Genre names (sorted) and the binary song x genre matrix, from (song id, genre) pairs."""
+    song_genres = pd.DataFrame(song_genres, columns=["id", "genre"]).dropna().drop_duplicates()
+    rows = ids.get_indexer(song_genres.id)
+    song_genres = song_genres[rows >= 0]
+    genres = pd.Index(sorted(song_genres.genre.unique()))
+    matrix = sparse.csr_matrix((np.ones(len(song_genres), dtype=np.int64),
+                                (rows[rows >= 0], genres.get_indexer(song_genres.genre))),
+                               shape=(len(ids), len(genres)))
+    return genres, matrix
+
+
+def genre_flow(adjacency, genres, song_genre):
+    """source_genre (of the sampled song), target_genre (of the sampler), count; largest first."""
+    adjacency = adjacency.tocsr().astype(np.int64)
+    adjacency.data[:] = 1  # MERGE: one relationship per pair
+    flow = (song_genre.T @ adjacency.T @ song_genre).tocoo()
+    table = pd.DataFrame({"source_genre": genres[flow.row], "target_genre": genres[flow.col],
+                          "count": flow.data.astype(np.int64)})
+    table = table[table["count"] > 0]
+    return table.sort_values(["count", "source_genre", "target_genre"], ascending=[False, True, True],
+                             ignore_index=True)
+
+
+def write_genre_flow(session, batch_size=BATCH_SIZE):
+    start = time.perf_counter()
+    ids, adjacency = read_graph(session)
+    genres, song_genre = incidence(ids, session.run(genres_read).data())
+    table = genre_flow(adjacency, genres, song_genre)
+    computed = time.perf_counter() - start
+
+    while session.run(genre_flow_clear, limit=DELETE_BATCH).single()["deleted"]:
+        pass
+    rows = table.to_dict("records")
+    for i in range(0, len(rows), batch_size):
+        write_batch(session, genre_flow_write, rows[i:i + batch_size])
+    print(f"✅ Genre flow: {len(rows):,} genre pairs over {len(genres):,} genres in "
+          f"{time.perf_counter() - start:.1f}s ({computed:.2f}s computing)")
+    return table
+
+
+def add_samples(session, path, batch_size=BATCH_SIZE):
+    """
+    Import SAMPLES rows (relationship CSV columns), count the new ones into
+    GENRE_FLOW and refresh the song metrics and walk candidates they affect.
+    """
+    start = time.perf_counter()
+    created = 0
+    sources = set()
+    for batch in read_batches(path, batch_size):
+        # A pair twice in one batch would be counted twice
+        batch = list({(row["source_id"], row["target_id"]): row for row in batch}.values())
+        summary = write_batch(session, samples_add, batch)
+        created += summary.counters.relationships_created
+        if summary.counters.relationships_created:
+            # Stored degrees, chains and reach of these songs (and their neighbours) are now stale
+            clear_metrics(session, {song for row in batch for song in (row["source_id"], row["target_id"])})
+            sources.update(row["source_id"] for row in batch)
+    print(f"✅ {path.name} imported, {created:,} relationships created (new samples and genre pairs) "
+          f"in {time.perf_counter() - start:.1f}s")
+    if not sources:
+        return
+    write_metrics(session, batch_size)
+    invalidate_walk_scores(session, sources)
+    write_walk_scores(session, missing_only=True)
+    print("⚠️  Community summaries and backbones still count the previous samples; rerun analytics.py "
+          "(or sparse_engine.py) to refresh them")
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def _flow_by_paths(adjacency, genres_by_song):
+    """The live query's count(*), by expanding every SAMPLES relationship."""
+    counts = Counter()
+    coo = adjacency.tocoo()
+    for sampled, original in zip(coo.row.tolist(), coo.col.tolist()):
+        for g1 in genres_by_song.get(original, ()):
+            for g2 in genres_by_song.get(sampled, ()):
+                counts[g1, g2] += 1
+    return counts
+
+
+def benchmark(import_dir=IMPORT_DIR):
+    from bulk_import import read_import_csv
+    from sparse_engine import load_graph
+
+    ids, adjacency = load_graph(import_dir)
+    pairs = read_import_csv("musicbrainz_genres_all.csv", import_dir)[["song_id", "genre"]]
+    start = time.perf_counter()
+    genres, song_genre = incidence(ids, pairs.to_numpy())
+    table = genre_flow(adjacency, genres, song_genre)
+    product = time.perf_counter() - start
+    print(f"Sparse product: {len(table):,} genre pairs from {adjacency.nnz:,} samples and "
+          f"{song_genre.nnz:,} song genres in {product * 1e3:.1f}ms")
+
+    coo = song_genre.tocoo()
+    genres_by_song = {}
+    for song, genre in zip(coo.row.tolist(), coo.col.tolist()):
+        genres_by_song.setdefault(song, []).append(genres[genre])
+    start = time.perf_counter()
+    expected = _flow_by_paths(adjacency.tocsr(), genres_by_song)
+    expanded = time.perf_counter() - start
+    found = {(r.source_genre, r.target_genre): r.count for r in table.itertuples()}
+    print(f"Expanding every relationship: {expanded * 1e3:.1f}ms, "
+          f"{'same counts' if found == dict(expected) else 'DIFFERENT counts'}")
+    print()
+    print(table.head(10).to_string(index=False))
+    return found == dict(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the genre-to-genre sampling flow.")
+    parser.add_argument("--add", metavar="CSV", help="import these SAMPLES rows and update the flow")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--benchmark", action="store_true", help="time the job on the CSVs, no database")
+    parser.add_argument("--import-dir", default=str(IMPORT_DIR), help="with --benchmark: the *_all.csv directory")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(Path(args.import_dir))
+        return
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        if args.add:
+            add_samples(session, Path(args.add), args.batch_size)
+        else:
+            write_genre_flow(session, args.batch_size)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Per-song neighbourhood metrics, computed for the whole graph at once with
+sparse matrix products and stored as Song properties, so the song page reads
+sample_chains instead of expanding variable-length paths on every view (it
+counts degrees live, which Neo4j answers from the node itself):
+
+    out_degree      songs it samples
+    in_degree       songs that sample it
+    sample_chains   distinct songs two SAMPLES hops away, ignoring direction; exactly what
+                    MATCH (o:Song)-[:SAMPLES*2]-(s) RETURN count(DISTINCT o) returns,
+                    including s itself when it and a neighbour sample each other
+    reach_<k>       distinct other songs within k hops, ignoring direction (REACH_HOPS)
+
+With U = A + Aᵀ (A the directed adjacency, so a mutual pair counts 2), o ≠ s is
+two hops from s iff (U·U)[s, o] > 0, and s is two hops from itself iff some
+U[s, m] ≥ 2. Reach is a breadth-first expansion R ← R + R·U, binarised after
+each product. Rows are processed in blocks so the products of hub rows never
+have to be held for the whole graph.
+
+Anything that adds SAMPLES relationships without running the job again must
+call clear_metrics on their songs, so the page falls back to counting live.
+
+    python graph_metrics.py               # read the graph from Neo4j, compute, write back
+    python graph_metrics.py --benchmark   # time the job on the ETL outputs (no database) and
+                                          # check sample_chains against path enumeration
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_import import BATCH_SIZE, IMPORT_DIR, write_batch
+
+REACH_HOPS = (2, 3)
+ROW_BLOCK = 1024
+
+METRICS = ["out_degree", "in_degree", "sample_chains"] + [f"reach_{k}" for k in REACH_HOPS]
+
+graph_read = """
+MATCH (a:Song)-[:SAMPLES]->(b:Song)
+RETURN a.id AS source, b.id AS target
+"""
+
+metrics_write = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.id})
+SET s += row.metrics
+"""
+
+# A new relationship changes the reach_k of songs up to k - 1 hops from its ends
+metrics_clear = f"""
+UNWIND $rows AS row
+MATCH (:Song {{id: row.id}})-[:SAMPLES*0..{max(REACH_HOPS) - 1}]-(o:Song)
+WITH DISTINCT o
+REMOVE {", ".join(f"o.{name}" for name in METRICS)}
+"""
+
+
+def read_graph(session):
+    """Song ids and the directed SAMPLES adjacency, from the database."""
+    ids = pd.Index([r["id"] for r in session.run("MATCH (s:Song) RETURN s.id AS id")])
+    edges = pd.DataFrame(session.run(graph_read).data(), columns=["source", "target"])
+    n = len(ids)
+    adjacency = sparse.csr_matrix((np.ones(len(edges)), (ids.get_indexer(edges.source),
+                                                         ids.get_indexer(edges.target))), shape=(n, n))
+    adjacency.data[:] = 1.0
+    return ids, adjacency
+
+
+def _binary(matrix):
+    matrix = matrix.tocsr()
+    matrix.data[:] = 1
+    return matrix
+
+
+def _off_diagonal_nnz(block, offset):
+    """Non-zeros per row of a block of rows starting at row `offset`, not counting the diagonal."""
+    coo = block.tocoo()
+    keep = coo.row + offset != coo.col
+    return np.bincount(coo.row[keep], minlength=block.shape[0])
+
+
+def sample_chains(adjacency, row_block=ROW_BLOCK):
+    n = adjacency.shape[0]
+    adjacency = _binary(adjacency).astype(np.int32)
+    both = (adjacency + adjacency.T).tocsr()
+    off_diagonal = both.copy()
+    off_diagonal.setdiag(0)
+    off_diagonal.eliminate_zeros()
+    mutual = np.asarray(off_diagonal.max(axis=1).todense()).ravel() >= 2
+    chains = np.empty(n, dtype=np.int64)
+    for start in range(0, n, row_block):
+        block = both[start:start + row_block] @ both
+        chains[start:start + row_block] = _off_diagonal_nnz(block, start)
+    return chains + mutual
+
+
+def reach(adjacency, hops=REACH_HOPS, row_block=ROW_BLOCK):
+    """{k: distinct songs within k undirected hops} for each k in `hops`."""
+    n = adjacency.shape[0]
+    both = _binary(adjacency + adjacency.T).astype(np.int32)
+    counts = {k: np.empty(n, dtype=np.int64) for k in hops}
+    for start in range(0, n, row_block):
+        stop = min(start + row_block, n)
+        frontier = sparse.identity(n, dtype=np.int32, format="csr")[start:stop]
+        for k in range(1, max(hops) + 1):
+            frontier = _binary(frontier + frontier @ both)
+            if k in counts:
+                counts[k][start:stop] = _off_diagonal_nnz(frontier, start)
+    return counts
+
+
+def compute_metrics(ids, adjacency, hops=REACH_HOPS):
+    """DataFrame of METRICS indexed by song id, and the seconds each step took."""
+    timings = {}
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    binary = _binary(adjacency)
+    metrics = pd.DataFrame(index=ids)
+    metrics["out_degree"] = timed("degree", lambda: np.diff(binary.indptr))
+    metrics["in_degree"] = np.bincount(binary.indices, minlength=len(ids))
+    metrics["sample_chains"] = timed("sample_chains", sample_chains, binary)
+    for k, counts in timed("reach", reach, binary, hops).items():
+        metrics[f"reach_{k}"] = counts
+    return metrics, timings
+
+
+def write_metrics(session, batch_size=BATCH_SIZE, hops=REACH_HOPS):
+    """Compute the metrics for the graph in the database and store them on the songs."""
+    ids, adjacency = read_graph(session)
+    metrics, timings = compute_metrics(ids, adjacency, hops)
+    rows = [{"id": song_id, "metrics": {name: int(value) for name, value in values.items()}}
+            for song_id, values in zip(metrics.index, metrics.to_dict("records"))]
+    for i in range(0, len(rows), batch_size):
+        write_batch(session, metrics_write, rows[i:i + batch_size])
+    print(f"✅ Metrics written for {len(rows):,} songs (computed in {sum(timings.values()):.2f}s)")
+    return metrics
+
+
+def clear_metrics(session, song_ids, batch_size=BATCH_SIZE):
+    """Remove the stored metrics that new SAMPLES relationships between `song_ids` made stale."""
+    song_ids = list(song_ids)
+    for i in range(0, len(song_ids), batch_size):
+        write_batch(session, metrics_clear, [{"id": song_id} for song_id in song_ids[i:i + batch_size]])
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def _incidence(adjacency):
+    """Song -> [(relationship number, other song)], both directions."""
+    coo = adjacency.tocoo()
+    incident = {}
+    for rel, (a, b) in enumerate(zip(coo.row.tolist(), coo.col.tolist())):
+        incident.setdefault(a, []).append((rel, b))
+        incident.setdefault(b, []).append((rel, a))
+    return incident
+
+
+def _chains_by_paths(incident, node):
+    """count(DISTINCT o) over (o)-[:SAMPLES*2]-(s), by enumerating the paths like Cypher does."""
+    found = set()
+    for r2, middle in incident.get(node, []):
+        for r1, other in incident.get(middle, []):
+            if r1 != r2:
+                found.add(other)
+    return len(found)
+
+
+def benchmark(import_dir=IMPORT_DIR, sample=200, seed=0):
+    from sparse_engine import load_graph
+
+    ids, adjacency = load_graph(import_dir)
+    metrics, timings = compute_metrics(ids, adjacency)
+    for name, seconds in timings.items():
+        print(f"   {name:<16} {seconds:8.3f}s")
+    print(f"✅ {len(METRICS)} metrics for {len(ids):,} songs / {adjacency.nnz:,} samples "
+          f"in {sum(timings.values()):.2f}s")
+
+    print()
+    print(metrics.describe().loc[["mean", "50%", "max"]].round(1).to_string())
+    print()
+    print("Largest sample_chains:")
+    print(metrics.nlargest(5, "sample_chains").to_string())
+
+    rng = np.random.default_rng(seed)
+    hubs = np.argsort(-metrics.sample_chains.to_numpy())[:20]
+    nodes = np.unique(np.concatenate([hubs, rng.choice(len(ids), size=min(sample, len(ids)), replace=False)]))
+    incident = _incidence(adjacency)
+    start = time.perf_counter()
+    mismatches = [ids[i] for i in nodes if _chains_by_paths(incident, i) != metrics.sample_chains.iloc[i]]
+    print()
+    print(f"Path enumeration for {len(nodes)} songs took {time.perf_counter() - start:.2f}s, "
+          f"{len(mismatches)} mismatches" + (f": {mismatches[:5]}" if mismatches else ""))
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute degree, sample-chain and k-hop reach metrics.")
+    parser.add_argument("--benchmark", action="store_true", help="time the job on the CSVs, no database")
+    parser.add_argument("--import-dir", default=str(IMPORT_DIR), help="with --benchmark: the *_all.csv directory")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(Path(args.import_dir))
+        return
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        write_metrics(session)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
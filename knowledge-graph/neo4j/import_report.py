@@ -0,0 +1,139 @@
+"""
+Per-stage instrumentation for the import.
+
+Every stage records its wall time, the rows it read, and the summary counters
+Neo4j returns for each batch (nodes/relationships created, properties set, ...).
+With profiling on it also records the db hits of the profiled plans. The report
+is saved as JSON next to this file and compared with the previous run's
+report, flagging any stage whose throughput dropped.
+
+    python import_report.py     # print the last report
+"""
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPORT_FILE = Path(__file__).resolve().parent / "import_report.json"
+
+# A stage this much slower (rows/s) than in the previous run is reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+COUNTERS = (
+    "nodes_created", "nodes_deleted",
+    "relationships_created", "relationships_deleted",
+    "properties_set", "labels_added",
+)
+
+
+def total_db_hits(plan):
+    """Sum of dbHits over a profiled plan tree (summary.profile)."""
+    return plan.get("dbHits", 0) + sum(total_db_hits(child) for child in plan.get("children", []))
+
+
+@dataclass
+class StageReport:
+    name: str
+    rows_read: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    counters: dict = field(default_factory=lambda: dict.fromkeys(COUNTERS, 0))
+    db_hits: int = None
+    status: str = "ran"
+
+    @property
+    def rows_per_s(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def add(self, summary, rows):
+        """Account for one committed batch (its ResultSummary)."""
+        self.rows_read += rows
+        self.batches += 1
+        for counter in COUNTERS:
+            self.counters[counter] += getattr(summary.counters, counter)
+        if summary.profile is not None:
+            self.db_hits = (self.db_hits or 0) + total_db_hits(summary.profile)
+
+    def to_dict(self):
+        return {**asdict(self), "rows_per_s": self.rows_per_s}
+
+
+class ImportReport:
+    def __init__(self, profile=False):
+        self.profile = profile
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        return self.stages.setdefault(name, StageReport(name))
+
+    def timed(self, name, func, *args, **kwargs):
+        """Run a step that isn't batched (vectors, analytics) and record only its wall time."""
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stage(name).seconds += time.perf_counter() - start
+        return result
+
+    def to_dict(self):
+        return {
+            "started_at": self.started_at,
+            "total_seconds": time.perf_counter() - self._start,
+            "profile": self.profile,
+            "stages": [stage.to_dict() for stage in self.stages.values()],
+        }
+
+    def save(self, path=REPORT_FILE):
+        """Write the report; returns the previous one (or None) for comparison."""
+        previous = load_report(path)
+        data = self.to_dict()
+        tmp = Path(path).with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        tmp.replace(path)
+        return data, previous
+
+
+def load_report(path=REPORT_FILE):
+    if not Path(path).exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_report(report, previous=None, threshold=REGRESSION_THRESHOLD):
+    """Table of the stages, with the change in throughput against `previous`. Returns the regressed stages."""
+    before = {s["name"]: s for s in previous["stages"]} if previous else {}
+    regressions = []
+
+    print()
+    print(f"{'stage':<16}{'rows':>10}{'seconds':>10}{'rows/s':>10}{'vs last':>9}"
+          f"{'+nodes':>9}{'+rels':>9}{'props set':>11}{'db hits':>13}")
+    for stage in report["stages"]:
+        change = ""
+        last = before.get(stage["name"])
+        if stage["status"] == "ran" and last and last["status"] == "ran" and last["rows_per_s"] and stage["rows_read"]:
+            ratio = stage["rows_per_s"] / last["rows_per_s"] - 1
+            change = f"{ratio:+.0%}"
+            if ratio < -threshold:
+                regressions.append(stage["name"])
+                change += " ⚠️"
+        counters = stage["counters"]
+        db_hits = f"{stage['db_hits']:,}" if stage["db_hits"] is not None else "-"
+        print(f"{stage['name']:<16}{stage['rows_read']:>10,}{stage['seconds']:>10.1f}{stage['rows_per_s']:>10,.0f}"
+              f"{change:>9}{counters['nodes_created']:>9,}{counters['relationships_created']:>9,}"
+              f"{counters['properties_set']:>11,}{db_hits:>13}")
+    print(f"Total {report['total_seconds']:.1f}s"
+          + (f" (previous run {previous['total_seconds']:.1f}s)" if previous else ""))
+    if regressions:
+        print(f"⚠️  Throughput regressed more than {threshold:.0%} in: {', '.join(regressions)}")
+    return regressions
+
+
+if __name__ == "__main__":
+    last = load_report()
+    if last is None:
+        print(f"No report yet ({REPORT_FILE.name} is written by data_import.py)")
+    else:
+        print_report(last)
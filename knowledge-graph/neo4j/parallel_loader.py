@@ -0,0 +1,251 @@
+"""
+Parallel driver-side loader: stream the ETL outputs straight into Neo4j.
+
+Unlike LOAD CSV this does not need the files inside the container: it reads
+CSV, JSONL or Parquet files in chunks from any directory and sends
+`UNWIND $rows` batches over several sessions at once.
+
+Parallel writers deadlock when two transactions MERGE the same node, which
+for this graph means the shared Artist, Album, Year and Genre nodes (and hub
+songs for SAMPLES). Every stage therefore names the key of its contended node,
+rows are hash-partitioned on that key, and each worker owns one partition:
+a given Artist (Genre, Year, ...) is only ever written by a single worker.
+The tracks statement touches several shared labels at once, so it is split
+into one stage per label. Lock conflicts that remain (a song with artists in
+two partitions) are transient errors that execute_write retries.
+
+Usage:
+    python parallel_loader.py --workers 8
+    python parallel_loader.py --source-dir /path/to/etl/output --stages songs samples
+"""
+import argparse
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from neo4j import GraphDatabase
+
+from analytics import run_analytics
+from data_import import (AUTH, BATCH_SIZE, IMPORT_DIR, URI, audio_features_import, create_constraints,
+                         date_import, genre_import, import_audio_vectors, relationship_import,
+                         summary_import, write_batch)
+from genre_flow import write_genre_flow
+from graph_metrics import write_metrics
+from walk_scores import write_walk_scores
+
+CHUNK_SIZE = 50_000
+QUEUE_DEPTH = 4  # batches buffered per worker, keeps memory bounded
+
+# Raw WhoSampled JSONL uses different names than the CSVs
+COLUMN_ALIASES = {"source_track_id": "source_id", "target_track_id": "target_id"}
+
+song_import = """
+UNWIND $rows AS row
+MERGE (s:Song {id: row.whosampled_id})
+SET s.title = row.title,
+    s.url = row.url,
+    s.record_label = row.record_label
+"""
+
+album_import = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.whosampled_id})
+MERGE (al:Album {title: row.album})
+MERGE (s)-[:PART_OF_ALBUM]->(al)
+"""
+
+year_import = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.whosampled_id})
+MERGE (y:Year {value: toInteger(row.release_year)})
+MERGE (s)-[:RELEASED_IN]->(y)
+"""
+
+artist_import = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.whosampled_id})
+MERGE (a:Artist {name: row.artist})
+MERGE (s)-[:HAS_ARTIST]->(a)
+"""
+
+
+def with_album(df):
+    # Same rule as track_import: album, year and artists are only linked for rows with an album
+    return df[df.album.notna() & (df.album.astype(str).str.strip() != "")]
+
+
+def song_artists(df):
+    df = with_album(df)[["whosampled_id", "artist"]].dropna()
+    df = df.assign(artist=df.artist.str.split(";")).explode("artist")
+    return df.assign(artist=df.artist.str.strip())
+
+
+@dataclass
+class Stage:
+    name: str
+    statement: str
+    source: str          # file name without extension
+    partition_key: str   # column whose node is contended between writers
+    prepare: object = None
+
+
+STAGES = [
+    Stage("songs", song_import, "whosampled_tracks_all", "whosampled_id"),
+    Stage("albums", album_import, "whosampled_tracks_all", "album", with_album),
+    Stage("years", year_import, "whosampled_tracks_all", "release_year", with_album),
+    Stage("artists", artist_import, "whosampled_tracks_all", "artist", song_artists),
+    # Hub songs are sampled thousands of times: keep all edges into one song on one worker
+    Stage("samples", relationship_import, "whosampled_relationships_all", "target_id"),
+    Stage("dates", date_import, "musicbrainz_dates_all", "id"),
+    Stage("genres", genre_import, "musicbrainz_genres_all", "genre"),
+    Stage("summaries", summary_import, "musicbrainz_summaries_all", "artist_name"),
+    Stage("audio_features", audio_features_import, "acousticbrainz", "whosampled_id"),
+]
+
+
+# ──────────────────── READING ────────────────────
+
+def find_source(source_dir, stem):
+    """Prefer the columnar/streamable formats when several exist."""
+    for suffix in (".parquet", ".jsonl", ".csv"):
+        path = Path(source_dir) / f"{stem}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif path.suffix == ".jsonl":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+    else:
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            yield chunk.replace("", None)
+
+
+def normalise(df):
+    """Make JSONL/Parquet chunks look like the CSV rows the statements expect."""
+    df = df.rename(columns=COLUMN_ALIASES)
+    for column in df.columns:
+        if df[column].dtype == object and df[column].map(lambda v: isinstance(v, (list, np.ndarray))).any():
+            df[column] = df[column].map(lambda v: ";".join(map(str, v)) if isinstance(v, (list, np.ndarray)) else v)
+    return df.astype(object).where(df.notna(), None)
+
+
+def partitions(df, key, workers):
+    part = pd.util.hash_pandas_object(df[key].astype(str), index=False).to_numpy() % workers
+    return [df[part == w] for w in range(workers)]
+
+
+# ──────────────────── WRITING ────────────────────
+
+_DONE = object()
+
+
+def worker(driver, statement, batches, stats, lock, errors):
+    try:
+        with driver.session() as session:
+            while True:
+                rows = batches.get()
+                if rows is _DONE:
+                    return
+                write_batch(session, statement, rows)
+                with lock:
+                    stats["rows"] += len(rows)
+                    stats["batches"] += 1
+    except Exception as e:
+        errors.append(e)
+        # Keep draining so the reader never blocks on a full queue
+        while batches.get() is not _DONE:
+            pass
+
+
+def load_stage(driver, stage, path, workers, batch_size=BATCH_SIZE):
+    queues = [queue.Queue(maxsize=QUEUE_DEPTH) for _ in range(workers)]
+    stats, lock, errors = {"rows": 0, "batches": 0}, threading.Lock(), []
+    threads = [threading.Thread(target=worker, args=(driver, stage.statement, q, stats, lock, errors))
+               for q in queues]
+    for t in threads:
+        t.start()
+
+    start = time.perf_counter()
+    try:
+        for chunk in read_chunks(path):
+            chunk = normalise(chunk)
+            if stage.prepare is not None:
+                chunk = stage.prepare(chunk)
+            for q, part in zip(queues, partitions(chunk, stage.partition_key, workers)):
+                records = part.to_dict("records")
+                for i in range(0, len(records), batch_size):
+                    q.put(records[i:i + batch_size])
+            if errors:
+                break
+    finally:
+        for q in queues:
+            q.put(_DONE)
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    seconds = time.perf_counter() - start
+    return {"rows": stats["rows"], "batches": stats["batches"], "seconds": seconds,
+            "rows_per_s": stats["rows"] / seconds if seconds else 0.0}
+
+
+def print_report(report, workers):
+    print()
+    print(f"{'stage':<16}{'rows':>12}{'batches':>9}{'seconds':>10}{'rows/s':>12}   ({workers} workers)")
+    for name, r in report.items():
+        print(f"{name:<16}{r['rows']:>12,}{r['batches']:>9,}{r['seconds']:>10.1f}{r['rows_per_s']:>12,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load ETL outputs into Neo4j with parallel UNWIND batches.")
+    parser.add_argument("--source-dir", default=str(IMPORT_DIR), help="directory with the ETL outputs")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--stages", nargs="*", choices=[s.name for s in STAGES], help="default: all")
+    parser.add_argument("--analytics", action="store_true", help="run PageRank / Leiden / node2vec afterwards")
+    args = parser.parse_args()
+
+    driver = GraphDatabase.driver(URI, auth=AUTH, max_connection_pool_size=max(args.workers + 2, 10))
+    with driver.session() as session:
+        create_constraints(session)
+
+    report = {}
+    for stage in STAGES:
+        if args.stages and stage.name not in args.stages:
+            continue
+        path = find_source(args.source_dir, stage.source)
+        if path is None:
+            print(f"⚠️  {stage.name}: no {stage.source}.parquet/.jsonl/.csv in {args.source_dir}, skipped")
+            continue
+        report[stage.name] = load_stage(driver, stage, path, args.workers, args.batch_size)
+        r = report[stage.name]
+        print(f"✅ {stage.name}: {r['rows']:,} rows from {path.name} ({r['rows_per_s']:,.0f} rows/s)")
+        if stage.name == "audio_features":
+            # Standardised over the whole catalogue, so written after the full file is read
+            with driver.session() as session:
+                import_audio_vectors(session, pd.concat(map(normalise, read_chunks(path))), args.batch_size)
+
+    with driver.session() as session:
+        write_metrics(session, args.batch_size)
+        write_walk_scores(session)
+        write_genre_flow(session, args.batch_size)
+        if args.analytics:
+            run_analytics(session)
+
+    driver.close()
+    print_report(report, args.workers)
+
+
+if __name__ == "__main__":
+    main()
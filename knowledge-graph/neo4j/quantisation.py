@@ -0,0 +1,186 @@
+"""
+Compact encodings of the node2vec embeddings, for the graph and the feature
+store (feature_export.py) and scored directly on the codes by
+Website/feature_store.py. All of them encode the unit-length vector, so a
+score is an approximate cosine:
+
+    float16   2 bytes per dimension
+    int8      1 byte per dimension and a float32 scale per song: v ≈ scale · code,
+              scale = max|v| / 127, so code_a · q · scale_a ≈ v_a · q
+    pq        product quantisation: the 128 dimensions split into PQ_SUBSPACES blocks, each
+              replaced by the index of its nearest of 256 k-means centroids (1 byte per block);
+              a query scores a song by summing PQ_SUBSPACES entries of a per-query lookup table
+
+In the graph, songs get n2v_i8 (a byte array) and n2v_scale in place of n2v,
+so the store holds, and readers fetch, 132 bytes per song instead of 128
+floats as a list. The full-precision vectors only live in the GDS projection
+(or sparse_engine.py's memory) until they are encoded; readers decode the
+codes with int8_decode.
+
+    python quantisation.py                      # replace n2v by n2v_i8 / n2v_scale in the database
+    python quantisation.py --benchmark DIR      # size and recall@10 of every encoding on a feature store
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data_import import BATCH_SIZE, write_batch
+
+PQ_SUBSPACES = 16
+PQ_CENTROIDS = 256
+PQ_ITERATIONS = 20
+
+n2v_read = """
+MATCH (s:Song) WHERE s.n2v IS NOT NULL
+RETURN s.id AS id, s.n2v AS n2v
+"""
+
+int8_write = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.id})
+SET s.n2v_i8 = row.codes, s.n2v_scale = row.scale
+REMOVE s.n2v
+"""
+
+
+def unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def int8_encode(vectors):
+    """(codes int8, scales float32) with vectors ≈ codes · scales[:, None]."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    codes = np.divide(vectors, scales[:, None], out=np.zeros_like(vectors), where=scales[:, None] > 0)
+    return np.rint(codes).astype(np.int8), scales.astype(np.float32)
+
+
+def int8_decode(codes, scales, dimension=128):
+    """float32 rows from n2v_i8 byte arrays and n2v_scale values; NaN rows where either is None."""
+    out = np.full((len(codes), dimension), np.nan, dtype=np.float32)
+    for i, (code, scale) in enumerate(zip(codes, scales)):
+        if code is not None and scale is not None:
+            out[i] = np.frombuffer(bytes(code), dtype=np.int8) * np.float32(scale)
+    return out
+
+
+def _kmeans(vectors, k, iterations, rng):
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    squared = (vectors ** 2).sum(axis=1)
+    for _ in range(iterations):
+        nearest = np.argmin(squared[:, None] - 2 * vectors @ centroids.T + (centroids ** 2).sum(axis=1), axis=1)
+        counts = np.bincount(nearest, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, nearest, vectors)
+        # Centroids left without vectors stay where they are
+        centroids[counts > 0] = sums[counts > 0] / counts[counts > 0, None]
+    return centroids
+
+
+def pq_train(vectors, subspaces=PQ_SUBSPACES, centroids=PQ_CENTROIDS, iterations=PQ_ITERATIONS, seed=0):
+    """Codebooks, (subspaces x centroids x dimension / subspaces) float32."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    blocks = np.split(vectors, subspaces, axis=1)
+    k = min(centroids, len(vectors))
+    return np.stack([_kmeans(block, k, iterations, rng) for block in blocks])
+
+
+def pq_encode(vectors, codebooks):
+    """uint8 codes, one per subspace: the nearest centroid of each block."""
+    blocks = np.split(np.asarray(vectors, dtype=np.float32), len(codebooks), axis=1)
+    return np.stack([np.argmin((block ** 2).sum(axis=1)[:, None] - 2 * block @ book.T + (book ** 2).sum(axis=1),
+                               axis=1) for block, book in zip(blocks, codebooks)], axis=1).astype(np.uint8)
+
+
+def write_quantised_n2v(session, batch_size=BATCH_SIZE):
+    """Replace every song's n2v by the int8 encoding of its unit vector."""
+    records = session.run(n2v_read).data()
+    if not records:
+        return {"nodePropertiesWritten": 0}
+    codes, scales = int8_encode(unit_rows([r["n2v"] for r in records]))
+    rows = [{"id": r["id"], "codes": bytearray(c.tobytes()), "scale": float(s)}
+            for r, c, s in zip(records, codes, scales)]
+    for i in range(0, len(rows), batch_size):
+        write_batch(session, int8_write, rows[i:i + batch_size])
+    print(f"✅ int8 n2v written for {len(rows):,} songs")
+    return {"nodePropertiesWritten": 2 * len(rows)}
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def _bolt_bytes(dimension, encoding):
+    """PackStream size of one song's vector as returned by a query."""
+    if encoding == "float64 list":
+        return 3 + 9 * dimension  # list header, then a marker and 8 bytes per float
+    return 3 + dimension + 9  # byte array header and bytes, plus the float scale
+
+
+def benchmark(features_dir, queries=500, k=10, seed=0):
+    features_dir = Path(features_dir)
+    has_n2v = np.load(features_dir / "has_n2v.npy")
+    vectors = np.load(features_dir / "n2v.npy")[has_n2v]
+    n, dimension = vectors.shape
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(n, size=min(queries, n), replace=False)
+
+    start = time.perf_counter()
+    codebooks = pq_train(vectors, seed=seed)
+    pq_codes = pq_encode(vectors, codebooks)
+    pq_seconds = time.perf_counter() - start
+    codes, scales = int8_encode(vectors)
+    half = vectors.astype(np.float16)
+
+    def pq_scores(query):
+        table = np.einsum("mkd,md->mk", codebooks, query.reshape(len(codebooks), -1))
+        return table[np.arange(len(codebooks)), pq_codes].sum(axis=1)
+
+    encodings = {
+        "float32": (vectors.nbytes, lambda q: vectors @ q),
+        "float16": (half.nbytes, lambda q: half @ q.astype(np.float16)),
+        "int8": (codes.nbytes + scales.nbytes, lambda q: (codes @ q) * scales),
+        f"pq{len(codebooks)}": (pq_codes.nbytes + codebooks.nbytes, pq_scores),
+    }
+    print(f"{n:,} vectors of {dimension} dimensions; PQ trained in {pq_seconds:.1f}s")
+    print(f"Over Bolt: {_bolt_bytes(dimension, 'float64 list'):,} bytes per song as a float list, "
+          f"{_bolt_bytes(dimension, 'int8'):,} as n2v_i8 + n2v_scale")
+    print(f"{'encoding':<10}{'bytes':>12}{'ratio':>8}{'recall@' + str(k):>11}{'cos error':>11}{'ms / scan':>11}")
+    # Many songs share a vector, so a neighbour counts as found if it is as close as the exact k-th
+    exact = [vectors @ vectors[i] for i in sample]
+    kth = [np.partition(-scores, k)[k] for scores in exact]  # k + 1: the song itself comes first
+    for name, (size, score) in encodings.items():
+        start = time.perf_counter()
+        approximate = [score(vectors[i]) for i in sample]
+        found = [np.argpartition(-scores, k)[:k + 1] for scores in approximate]
+        latency = (time.perf_counter() - start) / len(sample) * 1e3
+        recall = np.mean([np.mean(-e[f] <= t + 1e-6) for e, f, t in zip(exact, found, kth)])
+        error = np.mean([np.abs(a - e).mean() for a, e in zip(approximate, exact)])
+        print(f"{name:<10}{size:>12,}{vectors.nbytes / size:>7.1f}x{recall:>11.3f}{error:>11.4f}{latency:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantise the node2vec embeddings.")
+    parser.add_argument("--benchmark", metavar="FEATURES_DIR",
+                        help="compare the encodings on an exported feature store, no database")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        write_quantised_n2v(session)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Versioned schema for the knowledge graph: constraints and the indexes behind
+the website's access paths.
+
+Each migration is applied once and recorded as a (:SchemaMigration) node, so
+running this against an existing database only adds what is new. Index
+creation is online (the database stays writable while they populate); we
+then wait for population and check with EXPLAIN that every page query in
+Website/queries.py starts from an index instead of a label scan.
+
+    python schema.py            # migrate, wait for indexes, verify the page queries
+    python schema.py --verify   # only verify
+
+Title and artist search does not query the database: Website/search_index.py
+answers it from an in-memory index exported with the features. Migration 4
+drops the full-text indexes search used to go through.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+AUDIO_DIMENSIONS = 53  # len(data_import.AUDIO_FEATURES)
+
+# (version, description, statements)
+MIGRATIONS = [
+    (1, "Uniqueness constraints for the MERGE keys", [
+        "CREATE CONSTRAINT song_id_unique IF NOT EXISTS FOR (s:Song) REQUIRE s.id IS UNIQUE",
+        "CREATE CONSTRAINT artist_name_unique IF NOT EXISTS FOR (a:Artist) REQUIRE a.name IS UNIQUE",
+        "CREATE CONSTRAINT album_title_unique IF NOT EXISTS FOR (al:Album) REQUIRE al.title IS UNIQUE",
+        "CREATE CONSTRAINT year_value_unique IF NOT EXISTS FOR (y:Year) REQUIRE y.value IS UNIQUE",
+    ]),
+    (2, "Genre key and indexes for the website lookups", [
+        "CREATE CONSTRAINT genre_name_unique IF NOT EXISTS FOR (g:Genre) REQUIRE g.name IS UNIQUE",
+        # Song {title: $title} on the search page
+        "CREATE INDEX song_title IF NOT EXISTS FOR (s:Song) ON (s.title)",
+        # Community page filters, Impactful Songs sorts
+        "CREATE INDEX song_sampling_community IF NOT EXISTS FOR (s:Song) ON (s.sampling_community)",
+        "CREATE INDEX song_pagerank IF NOT EXISTS FOR (s:Song) ON (s.pagerank)",
+        # Free-text song / sample search
+        "CREATE FULLTEXT INDEX song_title_fulltext IF NOT EXISTS FOR (s:Song) ON EACH [s.title]",
+        "CREATE FULLTEXT INDEX artist_name_fulltext IF NOT EXISTS FOR (a:Artist) ON EACH [a.name]",
+    ]),
+    (3, "Vector index on the packed audio features", [
+        f"""CREATE VECTOR INDEX song_audio_vec IF NOT EXISTS FOR (s:Song) ON (s.audio_vec)
+        OPTIONS {{indexConfig: {{`vector.dimensions`: {AUDIO_DIMENSIONS}, `vector.similarity_function`: 'cosine'}}}}""",
+    ]),
+    (4, "Drop the full-text indexes replaced by the search index", [
+        # Website/search_index.py serves title / artist search
+        "DROP INDEX song_title_fulltext IF EXISTS",
+        "DROP INDEX artist_name_fulltext IF EXISTS",
+    ]),
+    (5, "Index on the materialised genre flow counts", [
+        # Sampling Flow reads the largest GENRE_FLOW counts in index order (genre_flow.py)
+        "CREATE INDEX genre_flow_count IF NOT EXISTS FOR ()-[f:GENRE_FLOW]-() ON (f.count)",
+    ]),
+    (6, "Community summary nodes", [
+        # Communities page: one node per community (community_summary.py), listed by size
+        "CREATE CONSTRAINT community_id_unique IF NOT EXISTS FOR (c:Community) REQUIRE c.id IS UNIQUE",
+        "CREATE INDEX community_size IF NOT EXISTS FOR (c:Community) ON (c.size)",
+    ]),
+]
+
+INDEX_TIMEOUT = 600  # seconds
+
+# Operators that mean a query reads every node of a label (or every node)
+SCAN_OPERATORS = {"NodeByLabelScan", "AllNodesScan"}
+
+WEBSITE_DIR = Path(__file__).resolve().parents[2] / "Website"
+
+# Example parameters for every query constant in Website/queries.py that the pages run
+# against a lookup; a constant missing here (and from WHOLE_GRAPH_QUERIES) fails verification.
+PAGE_QUERY_PARAMS = {
+    "ARTIST_SUMMARY": {"artist": "Future"},
+    "ARTIST_TOP_GENRES": {"artist": "Future"},
+    "ARTIST_SONGS": {"artist": "Future"},
+    "ARTIST_SAMPLED_BY": {"artist": "Future"},
+    "ARTIST_SAMPLES": {"artist": "Future"},
+    "ARTIST_TOP_SAMPLING_SONGS": {"artist": "Future"},
+    "ARTIST_GENRES_SAMPLED": {"artist": "Future"},
+    "ARTIST_SAMPLED_BY_GENRES": {"artist": "Future"},
+    "ARTIST_NETWORK": {"artist": "Future"},
+    "SONG_PROFILE": {"title": "Like That", "artist_filters": None},
+    "EGO_ROOTS": {"title": "Like That", "artist_filters": None},
+    "EGO_EXPAND": {"frontier": [0], "per_node": 25},
+    "TOP_PAGERANK": {},
+    "GENRE_FLOW": {"limit": 100},
+    "COMMUNITY_LIST": {},
+    "COMMUNITY_PROFILE": {"community": 0},
+    "COMMUNITY_TOP_SONGS": {"community": 0, "limit": 20},
+    "COMMUNITY_BACKBONE": {"community": 0, "limit": 200},
+    "COMMUNITY_EDGES": {"community": 0, "limit": 200},
+    "CO_SAMPLERS": {"title": "Like That", "artist_names": ["future"]},
+    "WALK_NEIGHBOURS": {"stem": 0},
+    "CANDIDATE_METADATA": {"ids": [0]},
+    "SOUND_ALIKES": {"id": 0, "k": 20},
+    "SAMPLING_TREE": {"id": 0},
+}
+
+# Query constants that read the whole graph by design, and why
+WHOLE_GRAPH_QUERIES = {
+    "SEARCH_CATALOGUE": "every song, for the search index (exported offline)",
+    "SONG_FEATURES": "every song's vectors, when there is no feature export",
+    "GENRE_FLOW_LIVE": "fallback for databases without GENRE_FLOW",
+    "RANDOM_WALKS": "GDS procedure over the in-memory projection",
+}
+
+
+def page_queries():
+    """(name, query, example parameters) for the query constants of Website/queries.py."""
+    if str(WEBSITE_DIR) not in sys.path:
+        sys.path.append(str(WEBSITE_DIR))
+    import queries
+
+    names = {name for name, value in vars(queries).items() if name.isupper() and isinstance(value, str)}
+    unknown = sorted(names - set(PAGE_QUERY_PARAMS) - set(WHOLE_GRAPH_QUERIES))
+    if unknown:
+        raise ValueError(f"no example parameters in schema.PAGE_QUERY_PARAMS for {', '.join(unknown)}")
+    stale = sorted(set(PAGE_QUERY_PARAMS) - names)
+    if stale:
+        raise ValueError(f"schema.PAGE_QUERY_PARAMS lists queries no longer in queries.py: {', '.join(stale)}")
+    return [(name, getattr(queries, name), params) for name, params in PAGE_QUERY_PARAMS.items()]
+
+
+def applied_version(session):
+    record = session.run("MATCH (m:SchemaMigration) RETURN max(m.version) AS version").single()
+    return record["version"] or 0
+
+
+def migrate(session):
+    """Apply the migrations newer than the database's schema version."""
+    current = applied_version(session)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for statement in statements:
+            session.run(statement).consume()
+        session.run("""
+            MERGE (m:SchemaMigration {version: $version})
+            SET m.description = $description, m.applied_at = datetime()
+        """, version=version, description=description).consume()
+        print(f"✅ Schema migration {version}: {description}")
+    return MIGRATIONS[-1][0]
+
+
+def await_indexes(session, timeout=INDEX_TIMEOUT):
+    session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+    rows = session.run("SHOW INDEXES YIELD name, state, populationPercent WHERE state <> 'ONLINE' "
+                       "RETURN name, state, populationPercent").data()
+    for row in rows:
+        print(f"⚠️  Index {row['name']} is {row['state']} ({row['populationPercent']:.0f}%)")
+    return not rows
+
+
+def plan_operators(plan):
+    """Operator names in an EXPLAIN plan tree, without the runtime suffix ('NodeIndexSeek@neo4j')."""
+    operators = [plan["operatorType"].split("@")[0]]
+    for child in plan.get("children", []):
+        operators.extend(plan_operators(child))
+    return operators
+
+
+def verify_page_queries(session):
+    """EXPLAIN every page query (page_queries()); returns the ones that still scan a label."""
+    failures = []
+    for page, query, params in page_queries():
+        plan = session.run("EXPLAIN " + query, params).consume().plan
+        operators = plan_operators(plan)
+        scans = sorted(SCAN_OPERATORS.intersection(operators))
+        if scans:
+            failures.append(page)
+            print(f"❌ {page}: {', '.join(scans)}")
+        else:
+            anchors = [op for op in operators if "Index" in op or "Seek" in op or op == "ProcedureCall"]
+            print(f"✅ {page}: {', '.join(sorted(set(anchors)))}")
+    return failures
+
+
+def main():
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations and verify page queries use indexes.")
+    parser.add_argument("--verify", action="store_true", help="skip migrating, only EXPLAIN the page queries")
+    args = parser.parse_args()
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        if not args.verify:
+            migrate(session)
+            await_indexes(session)
+        failures = verify_page_queries(session)
+    driver.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Export the graph as a read-only snapshot the website can serve without Neo4j
+(see Website/snapshot_backend.py).
+
+Layout of the snapshot directory:
+
+    manifest.json                 version, counts, source, audio feature names
+    songs.arrow                   one row per Song (row number = song index): node_id, id, title, url,
+                                  record_label, release_date, year, album, pagerank,
+                                  sampling_community, sample_chains, spotify_popularity,
+                                  artists[], genres[]
+    artists.arrow                 node_id, name, wikipedia_summary
+    genre_flow.arrow              source_genre, target_genre, count: the Sampling Flow matrix
+                                  (genre_flow.py), largest count first
+    communities.arrow             one row per community, largest first: the Community node
+                                  properties (community_summary.py) and top_songs[], song ids by rank
+    community_backbone.arrow      community, rank, score, source, target (song indices) and the
+                                  layout x / y of both songs: every community's backbone samples
+                                  (community_layout.py), by community and rank
+    samples_out.indptr.npy        CSR of SAMPLES by source song,
+    samples_out.indices.npy         target song indices sorted per row
+    samples_in.indptr.npy         the same by target song
+    samples_in.indices.npy
+    n2v.npy                       float32 (songs x 128), NaN rows where missing
+    audio_vec.npy                 float32 (songs x 53)
+    audio_features.npy            float32 (songs x 53), in manifest["audio_features"] order
+    features/                     the recommendation feature store and search index (feature_export.py)
+
+Arrow files are written uncompressed and the matrices as plain .npy, so the
+website memory-maps all of them instead of reading them.
+
+    python snapshot_export.py                  # from the running database
+    python snapshot_export.py --from-csv       # from the ETL outputs + sparse_engine.py, no database
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from scipy import sparse
+
+from community_layout import compute_layouts, internal_edges, passage_counts
+from community_summary import summarise
+from data_import import AUDIO_FEATURES, IMPORT_DIR
+from feature_export import write_features
+from genre_flow import genre_flow, incidence
+from graph_metrics import sample_chains
+from quantisation import int8_decode
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = Path(__file__).resolve().parents[2] / "Website" / "snapshot"
+N2V_DIMENSION = 128
+
+SONG_COLUMNS = ["node_id", "id", "title", "url", "record_label", "release_date", "year", "album",
+                "pagerank", "sampling_community", "spotify_popularity", "artists", "genres"]
+
+songs_export = """
+MATCH (s:Song)
+OPTIONAL MATCH (s)-[:HAS_ARTIST]->(a:Artist)
+WITH s, collect(a.name) AS artists
+OPTIONAL MATCH (s)-[:BELONGS_TO_GENRE]->(g:Genre)
+WITH s, artists, collect(g.name) AS genres
+OPTIONAL MATCH (s)-[:PART_OF_ALBUM]->(al:Album)
+OPTIONAL MATCH (s)-[:RELEASED_IN]->(y:Year)
+RETURN id(s) AS node_id, properties(s) AS props, artists, genres,
+       collect(al.title)[0] AS album, collect(y.value)[0] AS year
+ORDER BY node_id
+"""
+
+artists_export = """
+MATCH (a:Artist)
+RETURN id(a) AS node_id, a.name AS name, a.wikipedia_summary AS wikipedia_summary
+ORDER BY node_id
+"""
+
+samples_export = """
+MATCH (a:Song)-[r:SAMPLES]->(b:Song)
+RETURN id(a) AS source, id(b) AS target, size(coalesce(r.source_timestamps, [])) AS passages
+"""
+
+
+def _n2v_matrix(props):
+    """n2v rows of the songs' properties: the floats where present, else the decoded n2v_i8."""
+    decoded = int8_decode([p.get("n2v_i8") for p in props], [p.get("n2v_scale") for p in props], N2V_DIMENSION)
+    floats = _matrix([p.get("n2v") for p in props], N2V_DIMENSION)
+    return np.where(np.isnan(floats).all(axis=1, keepdims=True), decoded, floats)
+
+
+def _matrix(values, dimension):
+    """List of vectors (or None) -> float32 matrix with NaN rows for the missing ones."""
+    out = np.full((len(values), dimension), np.nan, dtype=np.float32)
+    for i, v in enumerate(values):
+        if v is not None and len(v) == dimension:
+            out[i] = v
+    return out
+
+
+def _list_column(values):
+    return pa.array([list(v) if isinstance(v, (list, tuple, np.ndarray)) else [] for v in values],
+                    type=pa.list_(pa.string()))
+
+
+def _write_communities(summaries, path):
+    names = [prop for prop, _ in AUDIO_FEATURES]
+    columns = (["id", "size", "audio_songs", "internal_edges", "outgoing_edges", "incoming_edges"]
+               + [f"{name}_{stat}" for name in names for stat in ("mean", "var")]
+               + ["top_artists", "top_artist_pagerank", "top_genres", "top_genre_pagerank"])
+    rows = [{**{c: summary["properties"].get(c) for c in columns},
+             "top_songs": [top["id"] for top in summary["top_songs"]]} for summary in summaries]
+    schema = pa.schema([(c, pa.int64()) for c in columns[:6]]
+                       + [(c, pa.float64()) for c in columns[6:-4]]
+                       + [("top_artists", pa.list_(pa.string())), ("top_artist_pagerank", pa.list_(pa.float64())),
+                          ("top_genres", pa.list_(pa.string())), ("top_genre_pagerank", pa.list_(pa.float64())),
+                          ("top_songs", pa.list_(pa.string()))])
+    feather.write_feather(pa.Table.from_pylist(rows, schema=schema), path, compression="uncompressed")
+
+
+def _write_backbone(backbone, positions, ids, path):
+    xy = {side: positions.reindex(backbone[side]) for side in ("source", "target")}
+    feather.write_feather(pa.table({
+        "community": pa.array(backbone.community.to_numpy(np.int64)),
+        "rank": pa.array(backbone["rank"].to_numpy(np.int64)),
+        "score": pa.array(backbone.score.to_numpy(np.float64)),
+        "source": pa.array(ids.get_indexer(backbone.source).astype(np.int32)),
+        "target": pa.array(ids.get_indexer(backbone.target).astype(np.int32)),
+        "source_x": pa.array(xy["source"].x.to_numpy(np.float64)),
+        "source_y": pa.array(xy["source"].y.to_numpy(np.float64)),
+        "target_x": pa.array(xy["target"].x.to_numpy(np.float64)),
+        "target_y": pa.array(xy["target"].y.to_numpy(np.float64)),
+    }), path, compression="uncompressed")
+
+
+def write_snapshot(out_dir, songs, artists, sources, targets, n2v, audio_vec, audio_features, source,
+                   passages=None):
+    """`sources`/`targets` are song row indices of the SAMPLES relationships, `passages` their timestamp counts."""
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    n = len(songs)
+    out = sparse.csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n, n))
+    out.sum_duplicates()
+    out.sort_indices()
+    into = out.T.tocsr()
+    into.sort_indices()
+
+    songs = songs[SONG_COLUMNS].reset_index(drop=True)
+    table = pa.table({
+        **{c: pa.array(songs[c].astype(object).where(songs[c].notna(), None), type=pa.string())
+           for c in ["id", "title", "url", "record_label", "release_date", "album"]},
+        "node_id": pa.array(songs.node_id.to_numpy(np.int64)),
+        "year": pa.array(songs.year.astype("Int64")),
+        "pagerank": pa.array(songs.pagerank.astype(float)),
+        "sampling_community": pa.array(songs.sampling_community.astype("Int64")),
+        "spotify_popularity": pa.array(songs.spotify_popularity.astype("Int64")),
+        "sample_chains": pa.array(sample_chains(out)),
+        "artists": _list_column(songs.artists),
+        "genres": _list_column(songs.genres),
+    }).select(SONG_COLUMNS + ["sample_chains"])
+    feather.write_feather(table, out_dir / "songs.arrow", compression="uncompressed")
+
+    artists = artists.reset_index(drop=True)
+    feather.write_feather(pa.table({
+        "node_id": pa.array(artists.node_id.to_numpy(np.int64)),
+        "name": pa.array(artists.name.astype(object), type=pa.string()),
+        "wikipedia_summary": pa.array(artists.wikipedia_summary.astype(object)
+                                      .where(artists.wikipedia_summary.notna(), None), type=pa.string()),
+    }), out_dir / "artists.arrow", compression="uncompressed")
+
+    song_genres = songs.genres.explode().dropna()
+    genres, song_genre = incidence(pd.RangeIndex(n), list(zip(song_genres.index, song_genres)))
+    flow = genre_flow(out, genres, song_genre)
+    feather.write_feather(pa.table({
+        "source_genre": pa.array(flow.source_genre.astype(object), type=pa.string()),
+        "target_genre": pa.array(flow.target_genre.astype(object), type=pa.string()),
+        "count": pa.array(flow["count"].to_numpy(np.int64)),
+    }), out_dir / "genre_flow.arrow", compression="uncompressed")
+
+    communities = songs.sampling_community.astype(float).to_numpy()
+    coo = out.tocoo()
+    summaries = summarise(songs.id, communities, songs.pagerank.astype(float), audio_features,
+                          songs.artists, songs.genres, communities[coo.row], communities[coo.col])
+    _write_communities(summaries, out_dir / "communities.arrow")
+
+    edges = internal_edges(songs.id, communities, songs.pagerank.astype(float), sources, targets,
+                           np.ones(len(sources)) if passages is None else passages)
+    backbone, positions = compute_layouts(edges)
+    _write_backbone(backbone, positions, pd.Index(songs.id), out_dir / "community_backbone.arrow")
+
+    for name, matrix in (("samples_out", out), ("samples_in", into)):
+        np.save(out_dir / f"{name}.indptr.npy", matrix.indptr.astype(np.int64))
+        np.save(out_dir / f"{name}.indices.npy", matrix.indices.astype(np.int32))
+
+    np.save(out_dir / "n2v.npy", n2v.astype(np.float32))
+    np.save(out_dir / "audio_vec.npy", audio_vec.astype(np.float32))
+    np.save(out_dir / "audio_features.npy", audio_features.astype(np.float32))
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "songs": n,
+        "artists": len(artists),
+        "samples": int(out.nnz),
+        "genre_flows": len(flow),
+        "communities": len(summaries),
+        "audio_features": [prop for prop, _ in AUDIO_FEATURES],
+    }
+    with open(out_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    catalogue = (table.select(["node_id", "title", "artists", "year", "pagerank", "spotify_popularity"])
+                 .rename_columns(["id", "title", "artists", "year", "pagerank", "spotify_popularity"])
+                 .filter(pc.is_valid(table.column("year"))).to_pylist())
+    write_features(out_dir / "features", songs.node_id.to_numpy(), n2v, audio_features, source,
+                   catalogue=catalogue)
+    print(f"✅ Snapshot of {n:,} songs / {out.nnz:,} samples written to {out_dir} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+def from_database(driver, out_dir=SNAPSHOT_DIR):
+    with driver.session() as session:
+        rows = session.run(songs_export).data()
+        artists = pd.DataFrame(session.run(artists_export).data(), columns=["node_id", "name", "wikipedia_summary"])
+        edges = pd.DataFrame(session.run(samples_export).data(), columns=["source", "target", "passages"])
+
+    props = [r["props"] for r in rows]
+    songs = pd.DataFrame({
+        "node_id": [r["node_id"] for r in rows],
+        "id": [p.get("id") for p in props],
+        "title": [p.get("title") for p in props],
+        "url": [p.get("url") for p in props],
+        "record_label": [p.get("record_label") for p in props],
+        "release_date": [str(p["release_date"]) if p.get("release_date") is not None else None for p in props],
+        "year": [r["year"] for r in rows],
+        "album": [r["album"] for r in rows],
+        "pagerank": [p.get("pagerank") for p in props],
+        "sampling_community": [p.get("sampling_community") for p in props],
+        "spotify_popularity": [p.get("spotify_popularity") for p in props],
+        "artists": [r["artists"] for r in rows],
+        "genres": [r["genres"] for r in rows],
+    })
+    features = np.array([[p[prop] if p.get(prop) is not None else np.nan
+                          for prop, _ in AUDIO_FEATURES] for p in props], dtype=np.float32).reshape(-1, len(AUDIO_FEATURES))
+
+    row = pd.Series(np.arange(len(songs)), index=songs.node_id)
+    write_snapshot(out_dir, songs, artists,
+                   row[edges.source].to_numpy(), row[edges.target].to_numpy(),
+                   _n2v_matrix(props),
+                   _matrix([p.get("audio_vec") for p in props], len(AUDIO_FEATURES)),
+                   features, source="neo4j", passages=edges.passages.to_numpy())
+
+
+def from_csv(import_dir=IMPORT_DIR, out_dir=SNAPSHOT_DIR):
+    """The same snapshot built from the ETL outputs, with the analytics from sparse_engine.py."""
+    from bulk_import import read_import_csv
+    from data_import import audio_vectors
+    from sparse_engine import compute, load_graph
+
+    results, _ = compute(import_dir)
+    ids, adjacency = load_graph(import_dir)
+
+    tracks = read_import_csv("whosampled_tracks_all.csv", import_dir)
+    last = tracks.drop_duplicates("whosampled_id", keep="last").set_index("whosampled_id").reindex(ids)
+    # Same rule as track_import: album, year and artists are only linked for rows with an album
+    linked = tracks[tracks.album.notna() & (tracks.album.str.strip() != "")]
+    linked_last = linked.drop_duplicates("whosampled_id", keep="last").set_index("whosampled_id").reindex(ids)
+    song_artists = linked[["whosampled_id", "artist"]].dropna()
+    song_artists = song_artists.assign(artist=song_artists.artist.str.split(";")).explode("artist")
+    song_artists["artist"] = song_artists.artist.str.strip()
+    artists_by_song = song_artists.drop_duplicates().groupby("whosampled_id").artist.agg(list).reindex(ids)
+
+    dates = read_import_csv("musicbrainz_dates_all.csv", import_dir).dropna(subset=["release_date"])
+    dates = dates.drop_duplicates("id", keep="last").set_index("id").release_date.reindex(ids)
+    genres = read_import_csv("musicbrainz_genres_all.csv", import_dir).dropna().drop_duplicates()
+    genres_by_song = genres.groupby("song_id").genre.agg(list).reindex(ids)
+
+    songs = pd.DataFrame({
+        "node_id": np.arange(len(ids)),
+        "id": ids,
+        "title": last.title.to_numpy(),
+        "url": last.url.to_numpy(),
+        "record_label": last.record_label.to_numpy(),
+        "release_date": dates.to_numpy(),
+        "year": linked_last.release_year.astype(float).to_numpy(),
+        "album": linked_last.album.to_numpy(),
+        "pagerank": results.pagerank.reindex(ids).to_numpy(),
+        "sampling_community": results.sampling_community.reindex(ids).to_numpy(),
+        # Only the database has it (Website/spotify_popularity.py --backfill)
+        "spotify_popularity": np.full(len(ids), np.nan),
+        "artists": artists_by_song.to_numpy(),
+        "genres": genres_by_song.to_numpy(),
+    })
+
+    names = sorted(song_artists.artist.unique())
+    summaries = read_import_csv("musicbrainz_summaries_all.csv", import_dir)
+    summaries = summaries.drop_duplicates("artist_name", keep="last").set_index("artist_name").wikipedia_summary
+    artists = pd.DataFrame({
+        "node_id": np.arange(len(ids), len(ids) + len(names)),
+        "name": names,
+        "wikipedia_summary": summaries.reindex(names).to_numpy(),
+    })
+
+    audio_features = np.full((len(ids), len(AUDIO_FEATURES)), np.nan, dtype=np.float32)
+    audio_vec = audio_features.copy()
+    audio_path = import_dir / "acousticbrainz.csv"
+    if audio_path.exists():
+        audio = read_import_csv("acousticbrainz.csv", import_dir).drop_duplicates("whosampled_id", keep="last")
+        rows = ids.get_indexer(audio.whosampled_id)
+        known = rows >= 0
+        audio_features[rows[known]] = audio[[c for _, c in AUDIO_FEATURES]].astype(float).to_numpy()[known]
+        vectors = audio_vectors(audio).audio_vec.to_numpy()
+        audio_vec[rows[known]] = _matrix(vectors[known], len(AUDIO_FEATURES))
+
+    # MERGE keeps one relationship per pair, with the timestamps of the last row
+    rels = read_import_csv("whosampled_relationships_all.csv", import_dir)
+    rels = rels.drop_duplicates(["source_id", "target_id"], keep="last").set_index(["source_id", "target_id"])
+    coo = adjacency.tocoo()
+    timestamps = rels.timestamp_in_source.reindex(pd.MultiIndex.from_arrays([ids[coo.row], ids[coo.col]]))
+    write_snapshot(out_dir, songs, artists, coo.row, coo.col,
+                   np.stack(results.n2v.reindex(ids).to_numpy()), audio_vec, audio_features, source="csv",
+                   passages=passage_counts(timestamps.to_numpy()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a memory-mappable snapshot for the website.")
+    parser.add_argument("--out", default=str(SNAPSHOT_DIR))
+    parser.add_argument("--from-csv", action="store_true", help="build from the ETL outputs instead of Neo4j")
+    parser.add_argument("--import-dir", default=str(IMPORT_DIR), help="with --from-csv: the *_all.csv directory")
+    args = parser.parse_args()
+
+    if args.from_csv:
+        from_csv(Path(args.import_dir), Path(args.out))
+        return
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    from_database(driver, Path(args.out))
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
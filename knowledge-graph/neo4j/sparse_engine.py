@@ -0,0 +1,358 @@
+"""
+GDS-free graph analytics on SciPy sparse matrices.
+
+Computes the same three Song properties as analytics.py, straight from the
+ETL outputs, so they can be produced in CI or on a Neo4j without the Graph
+Data Science plugin:
+
+    pagerank            power iteration with GDS's defaults (damping 0.85, 20 iterations,
+                        tolerance 1e-7, unnormalised scores, no dangling redistribution)
+    sampling_community  Louvain (local moving + aggregation) on the undirected graph
+    n2v                 uniform random walks (node2vec with p = q = 1), generated in
+                        vectorised batches, embedded by factorising the shifted PPMI matrix
+                        of their skip-gram co-occurrences (what word2vec's SGNS approximates)
+
+Usage:
+    python sparse_engine.py                      # compute and write to Neo4j
+    python sparse_engine.py --output results.csv # compute only, no database needed
+    python sparse_engine.py --benchmark          # run both this and GDS, compare speed and results
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+from community_layout import write_community_layouts
+from community_summary import write_community_summaries
+from data_import import BATCH_SIZE, IMPORT_DIR, write_batch
+from quantisation import int8_decode, int8_encode, unit_rows
+
+DAMPING = 0.85
+MAX_ITERATIONS = 20
+TOLERANCE = 1e-7
+
+RESOLUTION = 1.0
+
+# Same settings as the node2vec step in analytics.py, plus GDS's defaults for the rest
+EMBEDDING_DIMENSION = 128
+WALK_LENGTH = 80
+WALKS_PER_NODE = 10
+WINDOW_SIZE = 10
+NEGATIVE_SAMPLES = 5
+WALK_BATCH = 100_000  # walks generated (and counted) at a time
+
+results_write = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.id})
+SET s.pagerank = row.pagerank,
+    s.sampling_community = row.sampling_community,
+    s.n2v_i8 = row.n2v_i8,
+    s.n2v_scale = row.n2v_scale
+REMOVE s.n2v
+"""
+
+
+# ──────────────────── GRAPH ────────────────────
+
+def load_graph(import_dir=IMPORT_DIR):
+    """
+    Song ids and the directed SAMPLES adjacency (source -> target) as CSR.
+    Like the import, edges to songs that aren't in the tracks file are dropped.
+    """
+    tracks = pd.read_csv(import_dir / "whosampled_tracks_all.csv", usecols=["whosampled_id"], dtype=str)
+    ids = pd.Index(pd.unique(tracks.whosampled_id.dropna()))
+    rels = pd.read_csv(import_dir / "whosampled_relationships_all.csv",
+                       usecols=["source_id", "target_id"], dtype=str)
+    source, target = ids.get_indexer(rels.source_id), ids.get_indexer(rels.target_id)
+    keep = (source >= 0) & (target >= 0)
+    n = len(ids)
+    adjacency = sparse.csr_matrix((np.ones(keep.sum()), (source[keep], target[keep])), shape=(n, n))
+    adjacency.data[:] = 1.0  # MERGE: one relationship per pair
+    return ids, adjacency
+
+
+def undirected(adjacency):
+    return (adjacency + adjacency.T).tocsr()
+
+
+# ──────────────────── PAGERANK ────────────────────
+
+def pagerank(adjacency, damping=DAMPING, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    out_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    inverse_degree = np.divide(1.0, out_degree, out=np.zeros_like(out_degree), where=out_degree > 0)
+    transposed = adjacency.T.tocsr()
+    scores = np.full(adjacency.shape[0], 1.0 - damping)
+    for _ in range(max_iterations):
+        updated = (1.0 - damping) + damping * (transposed @ (scores * inverse_degree))
+        converged = np.abs(updated - scores).max() < tolerance
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+# ──────────────────── COMMUNITIES ────────────────────
+
+def modularity(graph, membership, resolution=RESOLUTION):
+    membership = pd.factorize(membership)[0]
+    assign = sparse.csr_matrix((np.ones(len(membership)), (np.arange(len(membership)), membership)))
+    two_m = graph.sum()
+    internal = (assign.T @ graph @ assign).diagonal()
+    totals = np.asarray(assign.T @ graph.sum(axis=1)).ravel()
+    return float((internal / two_m - resolution * (totals / two_m) ** 2).sum())
+
+
+def _local_moving(graph, resolution, rng):
+    """One Louvain level: move nodes to the neighbouring community with the best modularity gain."""
+    n = graph.shape[0]
+    degree = np.asarray(graph.sum(axis=1)).ravel().tolist()
+    if not sum(degree):
+        # No edges: every node stays in its own community
+        return np.arange(n), False
+    scale = resolution / sum(degree)
+    community = list(range(n))
+    totals = list(degree)
+    # Per-node work is a handful of neighbours: plain lists beat numpy's per-call overhead here
+    indptr, indices, weights = graph.indptr.tolist(), graph.indices.tolist(), graph.data.tolist()
+    order = rng.permutation(n).tolist()
+    improved, moved = False, True
+    while moved:
+        moved = False
+        for node in order:
+            current = community[node]
+            links = {current: 0.0}
+            for j in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[j]
+                if neighbour != node:
+                    c = community[neighbour]
+                    links[c] = links.get(c, 0.0) + weights[j]
+            if len(links) == 1 and links[current] == 0.0:
+                continue
+            k = degree[node] * scale
+            totals[current] -= degree[node]
+            best, best_gain = current, links[current] - totals[current] * k
+            for c, weight in links.items():
+                gain = weight - totals[c] * k
+                if gain > best_gain + 1e-12:
+                    best, best_gain = c, gain
+            totals[best] += degree[node]
+            if best != current:
+                community[node] = best
+                moved = improved = True
+    return pd.factorize(np.array(community))[0], improved
+
+
+def louvain(graph, resolution=RESOLUTION, seed=0):
+    """Community per node, numbered by size (0 = largest)."""
+    rng = np.random.default_rng(seed)
+    membership = np.arange(graph.shape[0])
+    level = graph
+    while True:
+        community, improved = _local_moving(level, resolution, rng)
+        if not improved:
+            break
+        membership = community[membership]
+        assign = sparse.csr_matrix((np.ones(level.shape[0]), (np.arange(level.shape[0]), community)))
+        level = (assign.T @ level @ assign).tocsr()
+    sizes = np.bincount(membership)
+    rank = np.empty_like(sizes)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return rank[membership]
+
+
+# ──────────────────── EMBEDDINGS ────────────────────
+
+def random_walks(adjacency, starts, walk_length, rng):
+    """Uniform walks from every start node; -1 once a walk hits a song that samples nothing."""
+    indptr, indices = adjacency.indptr, adjacency.indices
+    degree = np.diff(indptr)
+    walks = np.full((len(starts), walk_length), -1, dtype=np.int64)
+    walks[:, 0] = current = starts
+    alive = np.arange(len(starts))
+    for step in range(1, walk_length):
+        alive = alive[degree[current[alive]] > 0]
+        if not len(alive):
+            break
+        at = current[alive]
+        nxt = indices[indptr[at] + (rng.random(len(alive)) * degree[at]).astype(np.int64)]
+        walks[alive, step] = nxt
+        current = current.copy()
+        current[alive] = nxt
+    return walks
+
+
+def cooccurrences(walks, window, n):
+    counts = sparse.csr_matrix((n, n))
+    for offset in range(1, min(window, walks.shape[1] - 1) + 1):
+        a, b = walks[:, :-offset].ravel(), walks[:, offset:].ravel()
+        keep = (a >= 0) & (b >= 0)
+        counts = counts + sparse.csr_matrix((np.ones(keep.sum()), (a[keep], b[keep])), shape=(n, n))
+    return counts + counts.T
+
+
+def node2vec(adjacency, dimension=EMBEDDING_DIMENSION, walk_length=WALK_LENGTH, walks_per_node=WALKS_PER_NODE,
+             window=WINDOW_SIZE, negative=NEGATIVE_SAMPLES, seed=0):
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    starts = np.repeat(np.arange(n), walks_per_node)
+    counts = sparse.csr_matrix((n, n))
+    for i in range(0, len(starts), WALK_BATCH):
+        counts = counts + cooccurrences(random_walks(adjacency, starts[i:i + WALK_BATCH], walk_length, rng),
+                                        window, n)
+
+    # Shifted positive PMI: log(#(w,c) * D / (#w * #c)) - log(k)
+    counts = counts.tocoo()
+    rows, columns = np.asarray(counts.sum(axis=1)).ravel(), np.asarray(counts.sum(axis=0)).ravel()
+    pmi = np.log(counts.data * counts.data.sum() / (rows[counts.row] * columns[counts.col])) - np.log(negative)
+    positive = pmi > 0
+    ppmi = sparse.csr_matrix((pmi[positive], (counts.row[positive], counts.col[positive])), shape=(n, n))
+
+    k = min(dimension, n - 1)
+    u, s, _ = svds(ppmi, k=k, random_state=seed)
+    embedding = np.zeros((n, dimension), dtype=np.float32)
+    order = np.argsort(-s)
+    embedding[:, :k] = u[:, order] * np.sqrt(s[order])
+    return embedding
+
+
+# ──────────────────── JOB ────────────────────
+
+def compute(import_dir=IMPORT_DIR, seed=0):
+    """All three results as a DataFrame indexed by song id, plus per-step timings."""
+    timings = {}
+
+    def timed(name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[name] = time.perf_counter() - start
+        print(f"✅ {name} ({timings[name]:.1f}s)")
+        return result
+
+    ids, adjacency = timed("Load graph", load_graph, import_dir)
+    scores = timed("PageRank", pagerank, adjacency)
+    communities = timed("Louvain", louvain, undirected(adjacency), seed=seed)
+    embedding = timed("node2vec", node2vec, adjacency, seed=seed)
+
+    results = pd.DataFrame({"pagerank": scores, "sampling_community": communities}, index=ids)
+    results["n2v"] = list(embedding)
+    return results, timings
+
+
+def write_results(session, results, batch_size=BATCH_SIZE):
+    # Only the int8 codes go into the graph (see quantisation.py)
+    codes, scales = int8_encode(unit_rows(np.stack(results.n2v)))
+    rows = [{"id": song_id, "pagerank": float(pr), "sampling_community": int(c),
+             "n2v_i8": bytearray(code.tobytes()), "n2v_scale": float(scale)}
+            for (song_id, pr, c), code, scale
+            in zip(results[["pagerank", "sampling_community"]].itertuples(), codes, scales)]
+    for i in range(0, len(rows), batch_size):
+        write_batch(session, results_write, rows[i:i + batch_size])
+    print(f"✅ Results written for {len(rows):,} songs")
+
+
+def save_results(results, path):
+    out = results.assign(n2v=results.n2v.map(lambda v: ";".join(f"{x:.6g}" for x in v)))
+    out.rename_axis("whosampled_id").to_csv(path)
+    print(f"✅ Results saved to {path}")
+
+
+# ──────────────────── BENCHMARK ────────────────────
+
+def neighbour_agreement(a, b, sample=500, k=10, seed=0):
+    """Mean overlap of the k nearest (cosine) neighbours in two embeddings of the same nodes."""
+    def normalise(m):
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        return np.divide(m, norms, out=np.zeros_like(m), where=norms > 0)
+
+    a, b = normalise(a), normalise(b)
+    nodes = np.random.default_rng(seed).choice(len(a), size=min(sample, len(a)), replace=False)
+    overlaps = []
+    for sims_a, sims_b, node in zip(a[nodes] @ a.T, b[nodes] @ b.T, nodes):
+        sims_a[node] = sims_b[node] = -np.inf
+        top_a, top_b = np.argpartition(-sims_a, k)[:k], np.argpartition(-sims_b, k)[:k]
+        overlaps.append(len(np.intersect1d(top_a, top_b)) / k)
+    return float(np.mean(overlaps))
+
+
+def benchmark(driver, import_dir=IMPORT_DIR):
+    from analytics import run_analytics
+
+    results, timings = compute(import_dir)
+    with driver.session() as session:
+        start = time.perf_counter()
+        report = run_analytics(session)
+        gds_total = time.perf_counter() - start
+        gds = pd.DataFrame(session.run("""
+            MATCH (s:Song)
+            RETURN s.id AS id, s.pagerank AS pagerank, s.sampling_community AS sampling_community,
+                   s.n2v_i8 AS n2v_i8, s.n2v_scale AS n2v_scale
+        """).data()).set_index("id").reindex(results.index)
+    # Songs GDS left out come back from reindex as NaN
+    quantised = gds.n2v_scale.notna()
+    gds_n2v = int8_decode(gds.n2v_i8.where(quantised, None).tolist(),
+                          gds.n2v_scale.astype(object).where(quantised, None).tolist(), EMBEDDING_DIMENSION)
+
+    graph = undirected(load_graph(import_dir)[1])
+    top = 50
+    ours_top = set(results.pagerank.nlargest(top).index)
+    gds_top = set(gds.pagerank.nlargest(top).index)
+    has_n2v = ~np.isnan(gds_n2v).any(axis=1)
+
+    print()
+    print(f"{'':<22}{'sparse engine':>16}{'GDS':>16}")
+    print(f"{'PageRank s':<22}{timings['PageRank']:>16.2f}{_step_seconds(report, 'PageRank'):>16.2f}")
+    print(f"{'communities s':<22}{timings['Louvain']:>16.2f}{_step_seconds(report, 'Leiden'):>16.2f}")
+    print(f"{'node2vec s':<22}{timings['node2vec']:>16.2f}{_step_seconds(report, 'node2vec'):>16.2f}")
+    print(f"{'total s':<22}{sum(timings.values()):>16.2f}{gds_total:>16.2f}")
+    print(f"{'communities':<22}{results.sampling_community.nunique():>16,}{gds.sampling_community.nunique():>16,}")
+    print(f"{'modularity':<22}{modularity(graph, results.sampling_community.to_numpy()):>16.3f}"
+          f"{modularity(graph, gds.sampling_community.fillna(-1).to_numpy()):>16.3f}")
+    print()
+    print(f"PageRank correlation:          {results.pagerank.corr(gds.pagerank):.4f}")
+    print(f"PageRank top-{top} overlap:       {len(ours_top & gds_top) / top:.0%}")
+    if has_n2v.any():
+        agreement = neighbour_agreement(np.stack(results.n2v[has_n2v]), gds_n2v[has_n2v])
+        print(f"node2vec top-10 neighbour overlap: {agreement:.0%}")
+
+
+def _step_seconds(report, name):
+    return next(row["seconds"] for row in report if row["step"] == name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PageRank, communities and node2vec without GDS.")
+    parser.add_argument("--import-dir", default=str(IMPORT_DIR), help="directory with the *_all.csv files")
+    parser.add_argument("--output", help="save the results to this CSV instead of writing them to Neo4j")
+    parser.add_argument("--benchmark", action="store_true", help="also run the GDS job and compare")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import_dir = Path(args.import_dir)
+
+    if args.output and not args.benchmark:
+        results, _ = compute(import_dir, args.seed)
+        save_results(results, args.output)
+        return
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    if args.benchmark:
+        benchmark(driver, import_dir)
+    else:
+        results, _ = compute(import_dir, args.seed)
+        with driver.session() as session:
+            write_results(session, results)
+            write_community_summaries(session)
+            write_community_layouts(session)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Precomputed random-walk recommendations for the Sample Recommendations page.
+
+The page used to run gds.randomWalk.stream from the selected song (800 walks
+of 4 nodes along SAMPLES, stopping at dead ends) and rank the songs by how
+often the walks visited them. That count is a noisy estimate of
+
+    score(s, t) = Σ_{k=1..3} P^k[s, t]        P = D_out⁻¹ A (a dead end stops the walk)
+
+so this job computes it exactly for every song at once with three sparse
+products per block of rows, keeps the TOP_K best targets of each song and
+stores them as (:Song)-[:WALK_NEIGHBOUR {score}]->(:Song). Scored songs get
+walk_scored = true; the page falls back to a seeded live walk for songs
+without it (added since the last run, or whose walks reach samples added
+since, see invalidate_walk_scores).
+
+    python walk_scores.py               # all songs
+    python walk_scores.py --missing     # only songs without walk_scored
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from data_import import write_batch
+from graph_metrics import ROW_BLOCK, read_graph
+
+WALK_LENGTH = 4  # nodes per walk, the start included, as in gds.randomWalk
+TOP_K = 200
+WRITE_BATCH = 500  # songs per transaction
+DELETE_BATCH = 50_000
+
+walk_scores_clear = """
+MATCH ()-[r:WALK_NEIGHBOUR]->()
+WITH r LIMIT $limit
+DELETE r
+RETURN count(*) AS deleted
+"""
+
+# Walks of WALK_LENGTH nodes from s cross a new relationship u -> v iff u is at most WALK_LENGTH - 2 steps from s
+walk_scores_invalidate = f"""
+UNWIND $rows AS row
+MATCH (s:Song)-[:SAMPLES*0..{WALK_LENGTH - 2}]->(:Song {{id: row.id}})
+WITH DISTINCT s
+REMOVE s.walk_scored
+"""
+
+walk_scores_write = """
+UNWIND $rows AS row
+MATCH (s:Song {id: row.id})
+SET s.walk_scored = true
+WITH s, row
+OPTIONAL MATCH (s)-[old:WALK_NEIGHBOUR]->()
+DELETE old
+WITH DISTINCT s, row
+UNWIND row.neighbours AS n
+MATCH (t:Song {id: n.id})
+MERGE (s)-[r:WALK_NEIGHBOUR]->(t)
+SET r.score = n.score
+"""
+
+
+def transition(adjacency):
+    """Row-stochastic SAMPLES matrix; rows of dead ends stay empty."""
+    adjacency = adjacency.tocsr().astype(np.float64)
+    adjacency.data[:] = 1.0
+    out_degree = np.diff(adjacency.indptr)
+    inverse = np.divide(1.0, out_degree, out=np.zeros(len(out_degree)), where=out_degree > 0)
+    return sparse.diags(inverse) @ adjacency
+
+
+def walk_scores(adjacency, sources=None, walk_length=WALK_LENGTH, top_k=TOP_K, row_block=ROW_BLOCK):
+    """
+    {source row: (target rows, scores)} with the top_k expected visits of a
+    walk from each source (all songs by default), best first.
+    """
+    step = transition(adjacency).tocsr()
+    sources = np.arange(adjacency.shape[0]) if sources is None else np.asarray(sources)
+    results = {}
+    for start in range(0, len(sources), row_block):
+        rows = sources[start:start + row_block]
+        visits = step[rows]
+        total = visits.copy()
+        for _ in range(walk_length - 2):
+            visits = visits @ step
+            total = total + visits
+        total = total.tocsr()
+        for source, (lo, hi) in zip(rows.tolist(), zip(total.indptr[:-1], total.indptr[1:])):
+            targets, scores = total.indices[lo:hi], total.data[lo:hi]
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k - 1)[:top_k]
+                targets, scores = targets[keep], scores[keep]
+            order = np.argsort(-scores, kind="stable")
+            results[source] = (targets[order], scores[order])
+    return results
+
+
+def invalidate_walk_scores(session, source_ids, batch_size=WRITE_BATCH):
+    """Mark the songs whose walks can reach new relationships from `source_ids` for rescoring (--missing)."""
+    source_ids = list(source_ids)
+    for i in range(0, len(source_ids), batch_size):
+        write_batch(session, walk_scores_invalidate, [{"id": song_id} for song_id in source_ids[i:i + batch_size]])
+
+
+def write_walk_scores(session, missing_only=False, top_k=TOP_K):
+    start = time.perf_counter()
+    ids, adjacency = read_graph(session)
+    sources = None
+    if missing_only:
+        scored = {r["id"] for r in session.run("MATCH (s:Song) WHERE s.walk_scored RETURN s.id AS id")}
+        sources = np.flatnonzero(~ids.isin(scored))
+    else:
+        while session.run(walk_scores_clear, limit=DELETE_BATCH).single()["deleted"]:
+            pass
+    scores = walk_scores(adjacency, sources, top_k=top_k)
+    computed = time.perf_counter() - start
+
+    rows = [{"id": ids[source],
+             "neighbours": [{"id": ids[t], "score": float(s)} for t, s in zip(targets.tolist(), values.tolist())]}
+            for source, (targets, values) in scores.items()]
+    for i in range(0, len(rows), WRITE_BATCH):
+        write_batch(session, walk_scores_write, rows[i:i + WRITE_BATCH])
+    pairs = sum(len(row["neighbours"]) for row in rows)
+    print(f"✅ Walk scores for {len(rows):,} songs ({pairs:,} neighbours) in {time.perf_counter() - start:.1f}s "
+          f"({computed:.1f}s computing)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute random-walk recommendation scores.")
+    parser.add_argument("--missing", action="store_true", help="only score songs without walk_scored")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    from neo4j import GraphDatabase
+
+    from data_import import AUTH, URI
+
+    driver = GraphDatabase.driver(URI, auth=AUTH)
+    with driver.session() as session:
+        write_walk_scores(session, args.missing, args.top_k)
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()